@@ -0,0 +1,73 @@
+# accounts/authentication.py
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def token_version(password_hash):
+    """
+    The version a token is issued for: a digest of the user's password hash (the `hash_password`
+    claim with `CHECK_REVOKE_TOKEN`), so changing the password moves every token to a new version.
+    """
+    return get_md5_hash_password(password_hash) if jwt_settings.CHECK_REVOKE_TOKEN else ''
+
+
+# What requests read off `request.user`; the password hash and the rest stay out of the shared cache.
+CACHED_USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+def cached_field_names():
+    # `Model.from_db` takes the loaded fields in model order.
+    return [field.attname for field in get_user_model()._meta.concrete_fields if field.attname in CACHED_USER_FIELDS]
+
+
+def dump_user(user):
+    return [getattr(user, name) for name in cached_field_names()]
+
+
+def load_user(values):
+    """
+    Rebuilds a cached user; fields not cached are deferred, so reading one loads it, and `save()`
+    only writes the loaded fields.
+    """
+    return get_user_model().from_db('default', cached_field_names(), values)
+
+
+def user_cache_key(user_id, version):
+    return f"auth:user:{user_id}:{version}"
+
+
+def forget_user(user_id, password_hash):
+    cache.delete(user_cache_key(user_id, token_version(password_hash)))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    `JWTAuthentication` that resolves the user from the cache rather than a query per request.
+    - Entries are keyed by user id and token version and live `AUTH_USER_CACHE_TIMEOUT` seconds.
+    - Entries hold only `CACHED_USER_FIELDS`, never the password hash.
+    - A miss runs the regular lookup, including the inactive-user and revoked-token checks, and
+      only users that pass them are cached.
+    - Saving or deleting a user drops its entry (see accounts/signals.py); a password change
+      also drops the entry for the old password, so older tokens fail the revoke check at once.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        version = validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM, '') if jwt_settings.CHECK_REVOKE_TOKEN else ''
+        key = user_cache_key(user_id, version)
+        values = cache.get(key)
+        if values is not None:
+            return load_user(values)
+        user = super().get_user(validated_token)
+        cache.set(key, dump_user(user), timeout=getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+        return user
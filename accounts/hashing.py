@@ -0,0 +1,124 @@
+# accounts/hashing.py
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.exceptions import APIException
+
+HASHING_SETTINGS = {
+    'PASSWORD_HASHERS',
+    'PASSWORD_HASHING_EXECUTOR',
+    'PASSWORD_HASHING_WORKERS',
+    'PASSWORD_HASHING_QUEUE',
+    'PASSWORD_HASHING_QUEUE_TIMEOUT',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class HashingBusy(APIException):
+    """
+    Every hashing slot is taken: the login or registration is turned away rather than queued.
+    """
+    status_code = 503
+    default_detail = "Too many logins in progress, please retry."
+    default_code = 'hashing_busy'
+    wait = 1  # Sent as Retry-After by DRF's exception handler
+
+
+def setup_worker(settings_module):
+    # Spawned hashing processes only need the settings (PASSWORD_HASHERS), not the apps.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+
+class HashingExecutor:
+    """
+    Runs password hashing in a bounded pool so a login or registration burst cannot take every
+    request worker and CPU with it.
+    - `workers` hashes run at once, in threads (PBKDF2, scrypt, argon2 and bcrypt release the GIL)
+      or processes; `queue_size` more may wait for one.
+    - A request that cannot get a slot within `timeout` seconds gets a 503 (`HashingBusy`).
+    - The `inline` kind hashes in the calling thread without limits, as Django does by default.
+    """
+
+    def __init__(self, kind='thread', workers=2, queue_size=8, timeout=1.0):
+        self.kind = kind
+        self.timeout = timeout
+        if kind == 'inline':
+            self.pool = self.slots = None
+        elif kind == 'process':
+            self.pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=setup_worker, initargs=(settings.SETTINGS_MODULE,),
+            )
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        if self.pool is not None:
+            self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def run(self, function, *args):
+        if self.pool is None:
+            return function(*args)
+        if not self.slots.acquire(timeout=self.timeout):
+            raise HashingBusy()
+        try:
+            return self.pool.submit(function, *args).result()
+        finally:
+            self.slots.release()
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = HashingExecutor(
+                    kind=getattr(settings, 'PASSWORD_HASHING_EXECUTOR', 'thread'),
+                    workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', os.cpu_count() or 2),
+                    queue_size=getattr(settings, 'PASSWORD_HASHING_QUEUE', 8),
+                    timeout=getattr(settings, 'PASSWORD_HASHING_QUEUE_TIMEOUT', 1.0),
+                )
+    return _executor
+
+
+@receiver(setting_changed)
+def reset_executor(setting, **kwargs):
+    global _executor
+    if setting in HASHING_SETTINGS and _executor is not None:
+        with _executor_lock:
+            _executor.shutdown()
+            _executor = None
+
+
+# ----------------- Hashing API -----------------
+#
+# Drop-in counterparts of django.contrib.auth.hashers' functions, used by `User.set_password`
+# and `User.check_password`.
+
+def make_password(raw_password):
+    if raw_password is None:
+        # An unusable password: no hashing involved.
+        return hashers.make_password(None)
+    return get_executor().run(hashers.make_password, raw_password)
+
+
+def check_password(raw_password, encoded, setter=None):
+    """
+    Verifies in the pool; the `setter` (which rehashes to the preferred hasher and saves the user)
+    runs in the caller, so an outdated hash is upgraded on the next successful login.
+    """
+    is_correct, must_update = get_executor().run(hashers.verify_password, raw_password, encoded)
+    if setter and is_correct and must_update:
+        setter(raw_password)
+    return is_correct
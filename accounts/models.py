@@ -3,6 +3,8 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser # Import AbstractUser
 from django.utils import timezone
 
+from . import hashing
+
 class User(AbstractUser):
     """
     Custom User model extending Django's AbstractUser.
@@ -11,6 +13,24 @@ class User(AbstractUser):
     """
     # Example of adding a custom field (uncomment if you need it)
     # phone_number = models.CharField(max_length=20, blank=True, null=True)
-    pass # No custom fields added for now, just using AbstractUser's fields
+    # No custom fields added for now, just using AbstractUser's fields
+
+    def set_password(self, raw_password):
+        # Hashed in the bounded hashing pool (see accounts/hashing.py).
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """
+        Verifies in the bounded hashing pool; a correct password stored with an outdated hasher
+        or work factor is rehashed to the preferred one and saved.
+        """
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return hashing.check_password(raw_password, self.password, setter)
 
 # --- Category Model ---
\ No newline at end of file
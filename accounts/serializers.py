@@ -1,6 +1,10 @@
 # accounts/serializers.py
 
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
 from .models import User
 
 class UserSerializer(serializers.ModelSerializer):
@@ -26,3 +30,58 @@ class UserSerializer(serializers.ModelSerializer):
             password=validated_data['password']
         )
         return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Issues token pairs carrying `username` and `is_staff` claims, so views can authenticate from the
+    token alone (`JWT_STATELESS_PERMISSIONS`). The claims are as of login, and are re-read from the
+    user on every refresh (see `ClaimsTokenRefreshSerializer`).
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        set_claims(token, user)
+        return token
+
+
+def set_claims(token, user):
+    token['username'] = user.username
+    token['is_staff'] = user.is_staff
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refreshes token pairs with claims reloaded from the user, instead of copied from the old token,
+    so a demoted admin loses `is_staff` by the next refresh (at most ACCESS_TOKEN_LIFETIME).
+    - Users that are gone, inactive, or whose password changed since the token was issued
+      (`CHECK_REVOKE_TOKEN`) are refused.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(
+            **{jwt_settings.USER_ID_FIELD: refresh.payload.get(jwt_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user) or (
+            jwt_settings.CHECK_REVOKE_TOKEN
+            and refresh.payload.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        set_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # The token_blacklist app is not installed.
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
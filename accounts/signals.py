@@ -0,0 +1,34 @@
+# accounts/signals.py
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import forget_user
+from .models import User
+
+
+@receiver(pre_save, sender=User)
+def forget_old_password_version(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    The cached entry for the old password's token version has to go before the hash is replaced:
+    on a password change (`set_password` leaves the raw password in `_password` until the save)
+    or a rehash on login (saved with `update_fields=['password']`).
+    """
+    changing = getattr(instance, '_password', None) is not None or (update_fields and 'password' in update_fields)
+    if raw or instance.pk is None or not changing:
+        return
+    old_hash = User.objects.filter(pk=instance.pk).values_list('password', flat=True).first()
+    if old_hash is not None:
+        forget_user(instance.pk, old_hash)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, update_fields=None, **kwargs):
+    """
+    Drops the cached user after any change (profile, `is_staff`, `is_active`, password), except the
+    `last_login` stamp written when a token is obtained.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    forget_user(instance.pk, instance.password)
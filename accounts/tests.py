@@ -1,3 +1,171 @@
-from django.test import TestCase
+from django.contrib.auth import hashers
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
-# Create your tests here.
+from .authentication import token_version, user_cache_key
+from .hashing import HashingExecutor, get_executor
+from .models import User
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    """
+    Bearer tokens resolve their user from the cache until the user changes.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='shopper', password='secret-pass-123', email='old@example.com')
+        self.login(self.user)
+
+    def login(self, user, password='secret-pass-123'):
+        response = self.client.post('/api/token/', {'username': user.username, 'password': password}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data['access']
+
+    def test_user_is_loaded_once(self):
+        self.assertEqual(self.client.get('/api/accounts/profile/').data['username'], 'shopper')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.data['email'], 'old@example.com')
+
+    def test_user_changes_invalidate(self):
+        self.client.get('/api/accounts/profile/')
+        user = User.objects.get(pk=self.user.pk)
+        user.email = 'new@example.com'
+        user.save()
+        self.assertEqual(self.client.get('/api/accounts/profile/').data['email'], 'new@example.com')
+
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, 401)
+
+    def test_password_change_revokes_cached_tokens(self):
+        self.client.get('/api/accounts/profile/')
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('another-pass-456')
+        user.save()
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, 401)
+
+        self.login(user, password='another-pass-456')
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, 200)
+
+    def test_cache_holds_no_password_hash(self):
+        self.client.get('/api/accounts/profile/')
+        entry = cache.get(user_cache_key(self.user.pk, token_version(self.user.password)))
+        self.assertIn('shopper', entry)
+        self.assertNotIn(self.user.password, entry)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/accounts/profile/').data['username'], 'shopper')
+
+    def test_last_login_does_not_invalidate(self):
+        self.client.get('/api/accounts/profile/')
+        self.login(self.user)  # Stamps last_login
+        with self.assertNumQueries(0):
+            self.client.get('/api/accounts/profile/')
+
+
+class StatelessPermissionTests(APITestCase):
+    """
+    With `JWT_STATELESS_PERMISSIONS`, catalog writes are authorized from the token's claims.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='secret-pass-123', is_staff=True)
+        self.shopper = User.objects.create_user(username='shopper', password='secret-pass-123')
+
+    def test_tokens_carry_claims(self):
+        response = self.client.post('/api/token/', {'username': 'admin', 'password': 'secret-pass-123'}, format='json')
+        token = AccessToken(response.data['access'])
+        self.assertEqual((token['username'], token['is_staff']), ('admin', True))
+
+    def refresh(self, refresh_token):
+        return self.client.post('/api/token/refresh/', {'refresh': refresh_token}, format='json')
+
+    def test_refresh_reloads_claims(self):
+        refresh_token = self.client.post(
+            '/api/token/', {'username': 'admin', 'password': 'secret-pass-123'}, format='json'
+        ).data['refresh']
+        self.admin.is_staff = False
+        self.admin.save()
+        response = self.refresh(refresh_token)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(AccessToken(response.data['access'])['is_staff'])
+        self.assertFalse(RefreshToken(response.data['refresh'])['is_staff'])
+
+    def test_refresh_refuses_inactive_users(self):
+        refresh_token = self.client.post(
+            '/api/token/', {'username': 'admin', 'password': 'secret-pass-123'}, format='json'
+        ).data['refresh']
+        self.admin.is_active = False
+        self.admin.save()
+        self.assertEqual(self.refresh(refresh_token).status_code, 401)
+
+    @override_settings(JWT_STATELESS_PERMISSIONS=True)
+    def test_catalog_writes_skip_the_user_lookup(self):
+        for user, expected in ((self.admin, 201), (self.shopper, 403)):
+            token = self.client.post(
+                '/api/token/', {'username': user.username, 'password': 'secret-pass-123'}, format='json'
+            ).data['access']
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/categories/', {'name': f'Garden {user.pk}'}, format='json')
+            self.assertEqual(response.status_code, expected, response.content)
+            self.assertFalse([query for query in queries.captured_queries if 'accounts_user' in query['sql']])
+
+
+class PasswordHashingTests(APITestCase):
+    """
+    Passwords are hashed in the bounded pool, with the configured hasher, and upgraded on login.
+    """
+
+    def login(self, username='shopper', password='secret-pass-123'):
+        return self.client.post('/api/token/', {'username': username, 'password': password}, format='json')
+
+    def test_login_rehashes_to_the_preferred_hasher(self):
+        user = User.objects.create_user(username='shopper')
+        User.objects.filter(pk=user.pk).update(password=hashers.make_password('secret-pass-123', hasher='pbkdf2_sha1'))
+
+        response = self.login()
+        self.assertEqual(response.status_code, 200, response.content)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('secret-pass-123'))
+        # The token is issued for the upgraded hash.
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get('/api/accounts/profile/').status_code, 200)
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher',
+                                         'django.contrib.auth.hashers.PBKDF2PasswordHasher'])
+    def test_configured_hasher(self):
+        response = self.client.post('/api/accounts/register/', {'username': 'shopper', 'password': 'secret-pass-123'},
+                                    format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(User.objects.get(username='shopper').password.startswith('md5$'))
+        self.assertEqual(self.login().status_code, 200)
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE=0, PASSWORD_HASHING_QUEUE_TIMEOUT=0.01)
+    def test_full_pool_turns_logins_away(self):
+        User.objects.create_user(username='shopper', password='secret-pass-123')
+        executor = get_executor()
+        executor.slots.acquire()
+        try:
+            response = self.login()
+        finally:
+            executor.slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_process_executor(self):
+        executor = HashingExecutor('process', workers=1)
+        try:
+            encoded = executor.run(hashers.make_password, 'secret-pass-123')
+            self.assertEqual(executor.run(hashers.verify_password, 'secret-pass-123', encoded), (True, False))
+        finally:
+            executor.shutdown()
@@ -298,10 +298,10 @@ function App() {
                 throw new Error('You must be logged in to checkout.');
             }
 
+            // Prices are resolved server-side from the catalog, so only ids and quantities are sent.
             const order_items_data = cartItems.map(item => ({
                 product: item.id,
                 quantity: item.quantity,
-                price: item.price,
             }));
 
             const response = await authFetch(`${API_BASE_URL}/checkout/`, {
@@ -311,7 +311,10 @@ function App() {
 
             if (!response.ok) {
                 const errorData = await response.json();
-                const messages = Object.values(errorData).flat().join(' ');
+                const lineMessages = (errorData.lines || [])
+                    .filter(line => line.detail)
+                    .map(line => line.detail);
+                const messages = lineMessages.length > 0 ? lineMessages.join(' ') : errorData.error;
                 throw new Error(messages || 'Checkout failed.');
             }
 
@@ -0,0 +1,78 @@
+# ecommerce_backend/databases.py
+
+import importlib.util
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+def env_flag(name, default):
+    return os.getenv(name, str(default)) == 'True'
+
+
+def conn_max_age(value):
+    """
+    Parses `DB_CONN_MAX_AGE`: seconds, or 'None' for connections that are never recycled.
+    """
+    return None if value == 'None' else int(value)
+
+
+def pool_available():
+    # Django's built-in pool needs psycopg 3 and psycopg-pool; psycopg2 has no pool support.
+    return all(importlib.util.find_spec(name) is not None for name in ('psycopg', 'psycopg_pool'))
+
+
+def database_config(prefix='POSTGRES', fallback=None, host=None):
+    """
+    Builds a `DATABASES` entry from `<prefix>_DB`, `<prefix>_USER`, `<prefix>_PASSWORD`,
+    `<prefix>_HOST` and `<prefix>_PORT`, plus the shared connection-management settings.
+    - Values missing under `prefix` are read from `fallback` (e.g. a replica sharing the primary's credentials).
+    - `host` overrides `<prefix>_HOST`, for several servers configured under one prefix.
+    - With `DB_POOL=True` connections come from a per-process pool (psycopg 3 and psycopg-pool,
+      both in requirements.txt; ImproperlyConfigured if they are missing). Otherwise they persist
+      for `DB_CONN_MAX_AGE` seconds, 0 (closed after each request) by default. Only raise it for
+      WSGI-only deployments: under ASGI (the async endpoints in products/async_views.py) every
+      request runs in its own context with its own connection, so persistent connections are
+      never reused and pile up. The pool is safe under both.
+    - `DB_CONN_HEALTH_CHECKS` makes reused connections verify themselves before serving a request.
+    - `SEARCH_TRIGRAM_THRESHOLD` becomes the session's `pg_trgm.word_similarity_threshold`, used by the
+      indexed `%>` operator in the product search fallback; set at connect time, it costs no query.
+    """
+    defaults = {'DB': 'ecommerce_db', 'USER': 'ecommerce_user', 'PASSWORD': 'your_secure_password',
+                'HOST': 'localhost', 'PORT': '5432'}
+
+    def read(key):
+        value = os.getenv(f'{prefix}_{key}')
+        if value is None and fallback:
+            value = os.getenv(f'{fallback}_{key}')
+        return defaults[key] if value is None else value
+
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': read('DB'),
+        'USER': read('USER'),
+        'PASSWORD': read('PASSWORD'),
+        'HOST': host or read('HOST'),
+        'PORT': read('PORT'),
+        'CONN_MAX_AGE': conn_max_age(os.getenv('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': env_flag('DB_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),  # Seconds
+            'options': f"-c pg_trgm.word_similarity_threshold={float(os.getenv('SEARCH_TRIGRAM_THRESHOLD', '0.3'))}",
+        },
+    }
+
+    if env_flag('DB_POOL', False):
+        if not pool_available():
+            raise ImproperlyConfigured("DB_POOL=True needs the 'psycopg' and 'psycopg-pool' packages.")
+        pool = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),  # Seconds to wait for a free connection
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '600')),  # Seconds before idle extras are closed
+        }
+        # Django passes CONN_HEALTH_CHECKS to the pool as its checkout `check`.
+        config['OPTIONS']['pool'] = pool
+        # Pooled connections go back to the pool after each request; Django rejects both at once.
+        config['CONN_MAX_AGE'] = 0
+    return config
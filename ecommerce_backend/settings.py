@@ -5,6 +5,8 @@ from pathlib import Path
 from dotenv import load_dotenv
 from datetime import timedelta
 
+from .databases import database_config
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -29,6 +31,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Full-text and trigram search on products
 
     # Third-party apps
     'rest_framework',  # Django REST Framework
@@ -45,11 +48,13 @@ INSTALLED_APPS = [
 # --- Middleware, Templates, etc. (keep existing Django defaults) ---
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'products.middleware.CompressionMiddleware',  # Inactive unless RESPONSE_COMPRESSION is on
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'products.middleware.ReplicaRoutingMiddleware',  # Inactive unless DATABASE_REPLICAS is set
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,18 +79,117 @@ TEMPLATES = [
 WSGI_APPLICATION = 'ecommerce_backend.wsgi.application'
 
 # --- Database Configuration ---
-# Uses os.getenv() to retrieve database credentials from environment variables for security.
+# Uses os.getenv() to retrieve database credentials from environment variables for security
+# (see ecommerce_backend/databases.py for the connection-management variables):
+# - DB_CONN_MAX_AGE: seconds a connection is reused across requests ('0', the default, closes it
+#   after every request, 'None' never recycles it); DB_CONN_HEALTH_CHECKS pings reused connections
+#   first. Keep it at 0 when serving over ASGI, where persistent connections leak; use DB_POOL instead.
+# - DB_POOL=True switches to a per-process psycopg 3 pool (the `psycopg` and `psycopg-pool` packages
+#   in requirements.txt; startup fails without them) sized by DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE, waiting up to DB_POOL_TIMEOUT seconds.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('POSTGRES_DB', 'ecommerce_db'),
-        'USER': os.getenv('POSTGRES_USER', 'ecommerce_user'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'your_secure_password'),
-        'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
-        'PORT': os.getenv('POSTGRES_PORT', '5432'),
-    }
+    'default': database_config('POSTGRES'),
 }
 
+# Optional read replicas, enabled by POSTGRES_REPLICA_HOST (a comma-separated list for several,
+# aliased 'replica', 'replica_2', ...); other POSTGRES_REPLICA_* values default to the primary's.
+# Test runs point them at the test copy of the primary.
+REPLICA_HOSTS = [host.strip() for host in os.getenv('POSTGRES_REPLICA_HOST', '').split(',') if host.strip()]
+for index, host in enumerate(REPLICA_HOSTS, start=1):
+    alias = 'replica' if index == 1 else f'replica_{index}'
+    DATABASES[alias] = database_config('POSTGRES_REPLICA', fallback='POSTGRES', host=host)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+
+# Read-replica routing (see products/routers.py): reads in safe requests go to one of
+# DATABASE_REPLICAS, everything else to the primary; a client that wrote keeps reading from the
+# primary for REPLICA_PIN_SECONDS, so it sees its own writes despite replication lag.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['products.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
+# --- Cache Configuration ---
+# Uses Redis (or any Redis-compatible server) when REDIS_URL is set, otherwise a per-process
+# local-memory cache, which is enough for development and tests.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ecommerce-backend',
+        }
+    }
+
+# Read-through cache for product and category listings (see products/cache.py)
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))  # Seconds
+
+# How long a user's cart id stays cached (see products/carts.py)
+CART_CACHE_TIMEOUT = int(os.getenv('CART_CACHE_TIMEOUT', '3600'))  # Seconds
+
+# Rows per batch for product import/export (see products/bulk.py)
+PRODUCT_BULK_CHUNK_SIZE = int(os.getenv('PRODUCT_BULK_CHUNK_SIZE', '1000'))
+
+# Async catalog endpoints (see products/async_views.py): concurrent database-bound requests
+# per worker, and how long a request may wait for a slot before getting a 503
+ASYNC_DB_CONCURRENCY = int(os.getenv('ASYNC_DB_CONCURRENCY', '20'))
+ASYNC_DB_QUEUE_TIMEOUT = float(os.getenv('ASYNC_DB_QUEUE_TIMEOUT', '5'))  # Seconds
+
+# Opt-in gzip/brotli compression of large responses (see products/middleware.py);
+# brotli is used when the optional `brotli` package is installed.
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'False') == 'True'
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', '1024'))  # Bytes
+RESPONSE_COMPRESSION_GZIP_LEVEL = int(os.getenv('RESPONSE_COMPRESSION_GZIP_LEVEL', '6'))
+RESPONSE_COMPRESSION_BROTLI_QUALITY = int(os.getenv('RESPONSE_COMPRESSION_BROTLI_QUALITY', '5'))
+
+# Serve product and order listings through compiled `.values()` mappers (see products/fastpath.py)
+FAST_LIST_SERIALIZERS = os.getenv('FAST_LIST_SERIALIZERS', 'True') == 'True'
+
+# Order post-processing (see products/pipeline.py): checkout queues each committed order, and
+# ORDER_PIPELINE_WORKERS threads per process work the queue in batches of ORDER_PIPELINE_BATCH_SIZE.
+# ORDER_QUEUE_BROKER is 'local' (in memory, per process) or 'sqlite' (a file at ORDER_QUEUE_PATH
+# shared by the host's processes; set ORDER_PIPELINE_WORKERS=0 in the web processes and run
+# `manage.py process_orders` to keep the work out of them entirely). Orders whose queueing failed
+# (or that were lost with an in-memory queue) stay pending: run
+# `manage.py process_orders --once --requeue-pending --pending-for 600` from cron to pick them up.
+ORDER_QUEUE_BROKER = os.getenv('ORDER_QUEUE_BROKER', 'local')
+ORDER_QUEUE_PATH = os.getenv('ORDER_QUEUE_PATH', str(BASE_DIR / 'order_queue.sqlite3'))
+ORDER_PIPELINE_WORKERS = int(os.getenv('ORDER_PIPELINE_WORKERS', '1'))
+ORDER_PIPELINE_BATCH_SIZE = int(os.getenv('ORDER_PIPELINE_BATCH_SIZE', '100'))
+ORDER_PIPELINE_MAX_ATTEMPTS = int(os.getenv('ORDER_PIPELINE_MAX_ATTEMPTS', '3'))
+
+# Inventory reservations (see products/inventory.py), off by default: with INVENTORY_RESERVATIONS=True
+# adding to cart holds the units for INVENTORY_RESERVATION_TTL seconds and checkout turns the holds
+# into the order, so checkouts do not queue on the product rows. Held units are taken off
+# `Product.stock`, which then counts the units still free to add to a cart rather than those not
+# yet sold; enable it once clients read it that way. Each process sweeps expired holds back into
+# stock every INVENTORY_SWEEP_INTERVAL seconds (0: only via `manage.py sweep_reservations`).
+# Off, carts only check stock and checkout locks the product rows.
+INVENTORY_RESERVATIONS = os.getenv('INVENTORY_RESERVATIONS', 'False') == 'True'
+INVENTORY_RESERVATION_TTL = int(os.getenv('INVENTORY_RESERVATION_TTL', '900'))  # Seconds
+INVENTORY_SWEEP_INTERVAL = int(os.getenv('INVENTORY_SWEEP_INTERVAL', '30'))  # Seconds
+INVENTORY_SWEEP_BATCH_SIZE = int(os.getenv('INVENTORY_SWEEP_BATCH_SIZE', '1000'))
+
+# Checkout and cart writes sent with an Idempotency-Key header (see products/idempotency.py) keep
+# their response for IDEMPOTENCY_KEY_TTL seconds, replayed to retries with the same key. Expired
+# keys are ignored, and deleted in bulk by `manage.py purge_idempotency_keys` (e.g. hourly from cron).
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', '86400'))  # Seconds
+
+# Order confirmation emails go out over SMTP (EMAIL_HOST and friends). Only DEBUG prints them to the
+# console instead, since they carry order details; the test runner swaps in the locmem backend.
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', f"django.core.mail.backends.{'console' if DEBUG else 'smtp'}.EmailBackend")
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'orders@localhost')
+
 # --- Password Validation ---
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -102,6 +206,31 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# --- Password Hashing ---
+# PASSWORD_HASHER picks the hasher new passwords use: 'pbkdf2_sha256' (default), 'scrypt',
+# 'argon2' (needs argon2-cffi) or 'bcrypt_sha256' (needs bcrypt). The others stay listed so existing
+# hashes still verify; they are upgraded to the preferred hasher on the user's next login.
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2_sha256': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'pbkdf2_sha1': 'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'bcrypt_sha256': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+}
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2_sha256')
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+]
+
+# Hashing runs in a bounded pool (see accounts/hashing.py): PASSWORD_HASHING_WORKERS hashes at once
+# in a 'thread' or 'process' executor ('inline' hashes in the request thread, unbounded), with up to
+# PASSWORD_HASHING_QUEUE more waiting; beyond that a login or registration waits
+# PASSWORD_HASHING_QUEUE_TIMEOUT seconds for a slot, then gets a 503.
+PASSWORD_HASHING_EXECUTOR = os.getenv('PASSWORD_HASHING_EXECUTOR', 'thread')
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', str(os.cpu_count() or 2)))
+PASSWORD_HASHING_QUEUE = int(os.getenv('PASSWORD_HASHING_QUEUE', '8'))
+PASSWORD_HASHING_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASHING_QUEUE_TIMEOUT', '1'))  # Seconds
+
 # --- Internationalization ---
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -114,14 +243,32 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # --- Django REST Framework Settings ---
 # This configures how DRF will handle authentication, permissions, and pagination.
+
+# JSON encoding for API requests and responses: 'orjson' (products/renderers.py and products/parsers.py,
+# which fall back to the stdlib when orjson is not installed) or 'stdlib' (DRF's own classes).
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'orjson')
+if JSON_BACKEND == 'orjson':
+    JSON_RENDERER_CLASS, JSON_PARSER_CLASS = 'products.renderers.FastJSONRenderer', 'products.parsers.FastJSONParser'
+else:
+    JSON_RENDERER_CLASS, JSON_PARSER_CLASS = 'rest_framework.renderers.JSONRenderer', 'rest_framework.parsers.JSONParser'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',  # JWTAuthentication with cached user lookups
         'rest_framework.authentication.SessionAuthentication',  # Allows login via browsable API for development
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        JSON_RENDERER_CLASS,
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        JSON_PARSER_CLASS,
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
@@ -144,8 +291,20 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
     'JTI_CLAIM': 'jti',
+    # Tokens carry a digest of the password hash: a password change revokes them (and versions the user cache)
+    'CHECK_REVOKE_TOKEN': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.ClaimsTokenRefreshSerializer',
 }
 
+# How long an authenticated user stays cached per token version (see accounts/authentication.py)
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', '60'))  # Seconds
+
+# Catalog writes and the admin stats views authenticate from the token's `is_staff` claim alone,
+# without loading the user; role changes then apply from the user's next token refresh, since
+# refreshes re-read the claims (at most ACCESS_TOKEN_LIFETIME).
+JWT_STATELESS_PERMISSIONS = os.getenv('JWT_STATELESS_PERMISSIONS', 'False') == 'True'
+
 # --- Custom User Model Configuration ---
 AUTH_USER_MODEL = 'accounts.User'
 CORS_ALLOWED_ORIGINS = [
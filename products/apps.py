@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # Register signal handlers (catalog cache invalidation, connection counters)
+        from . import dbstats, signals  # noqa: F401
@@ -0,0 +1,213 @@
+# products/async_views.py
+
+import asyncio
+from functools import wraps
+from weakref import WeakKeyDictionary
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import cache as catalog_cache
+from .fastpath import compile_serializer
+from .filters import ProductFilter
+from .models import Category, Product
+from .serializers import CategorySerializer, ProductSerializer
+from .suggest import suggestion_index
+from .views import CatalogCacheMixin, CategoryViewSet, ProductViewSet, make_validators, validator_aggregates
+
+# One semaphore per event loop (asyncio primitives are bound to the loop they are used on).
+_query_slots = WeakKeyDictionary()
+
+
+# ----------------- Helpers -----------------
+
+def json_response(data, status=200, headers=None):
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return HttpResponse(renderer.render(data), status=status, headers=headers, content_type='application/json')
+
+
+def get_query_slots():
+    loop = asyncio.get_running_loop()
+    slots = _query_slots.get(loop)
+    if slots is None:
+        slots = _query_slots[loop] = asyncio.Semaphore(getattr(settings, 'ASYNC_DB_CONCURRENCY', 20))
+    return slots
+
+
+def bounded(view):
+    """
+    Caps how many async catalog requests touch the database at once (`ASYNC_DB_CONCURRENCY`).
+    - The async ORM runs each query through `sync_to_async(thread_sensitive=True)`, so a request's
+      queries run one after another on a single thread. Under Django's ASGI handler each request
+      gets its own such thread and database connection; elsewhere all requests share one thread.
+      The cap bounds how many request threads and connections are open at once; it does not make
+      one request's queries run in parallel.
+    - Requests that wait longer than `ASYNC_DB_QUEUE_TIMEOUT` seconds for a slot get a 503
+      with `Retry-After` instead of piling up.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        slots = get_query_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=getattr(settings, 'ASYNC_DB_QUEUE_TIMEOUT', 5))
+        except asyncio.TimeoutError:
+            return json_response({"error": "The catalog is busy, please retry."}, status=503,
+                                 headers={'Retry-After': '1'})
+        try:
+            return await view(request, *args, **kwargs)
+        finally:
+            slots.release()
+    return wrapper
+
+
+async def paginate(request, queryset, serializer_class):
+    """
+    Page-number pagination with the same `count`/`next`/`previous`/`results` shape as the DRF views;
+    returns the page data, or a 404 response for a page out of range.
+    - For serializers without nested `many=True` lists, which the fast serializer would fetch synchronously.
+    """
+    page_size = api_settings.PAGE_SIZE
+    try:
+        page = int(request.GET.get('page', 1))
+        if page < 1:
+            raise ValueError
+    except ValueError:
+        return json_response({"detail": "Invalid page."}, status=404)
+
+    count = await queryset.acount()
+    if page > 1 and (page - 1) * page_size >= count:
+        return json_response({"detail": "Invalid page."}, status=404)
+
+    fast_serializer = compile_serializer(serializer_class)
+    offset = (page - 1) * page_size
+    rows = [row async for row in fast_serializer.values(queryset)[offset:offset + page_size].aiterator()]
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page + 1) if offset + page_size < count else None
+    if page == 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, 'page')
+    else:
+        previous_url = replace_query_param(url, 'page', page - 1)
+    return {
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': fast_serializer.represent(rows),
+    }
+
+
+async def catalog_response(request, scope, queryset, last_modified_fields, render, detail=False):
+    """
+    Serves `render()`'s data through the same layers as the sync catalog views (`CatalogCacheMixin`
+    over `ConditionalGetMixin`), so both routes of a resource answer alike.
+    - Responses are cached under the catalog generation, validators included; keys cover the path,
+      so the sync and async routes keep separate entries.
+    - ETag/Last-Modified come from the same `COUNT`/`MAX(updated_at)` aggregate as the sync view's,
+      before anything is serialized, so a matching conditional request gets a 304.
+    - `render` may return an error response instead of data; it is neither cached nor given validators.
+    """
+    key = await sync_to_async(catalog_cache.make_key)(scope, request)
+    entry = await sync_to_async(catalog_cache.lookup)(key)
+    if entry is None:
+        values = await queryset.aaggregate(**validator_aggregates(last_modified_fields))
+        if detail and not values['count']:
+            return await render()
+        etag, last_modified = make_validators(values)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = await render()
+        if isinstance(data, HttpResponse):
+            return data
+        entry = {'data': data, 'etag': etag, 'last_modified': last_modified}
+        if await sync_to_async(CatalogCacheMixin.may_store)():
+            await sync_to_async(catalog_cache.store)(key, entry)
+    else:
+        not_modified = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+        if not_modified is not None:
+            return not_modified
+
+    headers = {'ETag': entry['etag']}
+    if entry['last_modified'] is not None:
+        headers['Last-Modified'] = http_date(entry['last_modified'])
+    return json_response(entry['data'], headers=headers)
+
+
+# ----------------- Views -----------------
+
+@require_safe
+@bounded
+async def product_list(request):
+    """
+    Async product listing: the filters of `ProductViewSet` (category, availability, price, stock)
+    and `?ordering=`, paginated, cached and validated like the sync endpoint. Search, facets,
+    sparse fieldsets and keyset pages stay on the sync endpoint.
+    """
+    filterset = ProductFilter(request.GET, queryset=Product.objects.select_related('category'))
+    # Validation may look up the category, which is a blocking query.
+    if not await sync_to_async(filterset.is_valid)():
+        return json_response({field: list(errors) for field, errors in filterset.errors.items()}, status=400)
+
+    queryset = filterset.qs
+    ordering = [
+        field for field in request.GET.get('ordering', '').split(',')
+        if field.strip().lstrip('-') in ProductViewSet.ordering_fields
+    ]
+    if ordering:
+        queryset = queryset.order_by(*(field.strip() for field in ordering))
+    return await catalog_response(
+        request, 'async-product-list', queryset, ProductViewSet.last_modified_fields,
+        lambda: paginate(request, queryset, ProductSerializer),
+    )
+
+
+@require_safe
+@bounded
+async def product_detail(request, pk):
+    fast_serializer = compile_serializer(ProductSerializer)
+    queryset = Product.objects.filter(pk=pk)
+
+    async def render():
+        try:
+            row = await fast_serializer.values(queryset).aget()
+        except Product.DoesNotExist:
+            return json_response({"detail": "No Product matches the given query."}, status=404)
+        return fast_serializer.represent([row])[0]
+
+    return await catalog_response(
+        request, 'async-product-detail', queryset, ProductViewSet.last_modified_fields, render, detail=True,
+    )
+
+
+@require_safe
+@bounded
+async def category_list(request):
+    queryset = Category.objects.order_by('name')
+    return await catalog_response(
+        request, 'async-category-list', queryset, CategoryViewSet.last_modified_fields,
+        lambda: paginate(request, queryset, CategorySerializer),
+    )
+
+
+@require_safe
+@bounded
+async def product_suggestions(request):
+    """
+    Typeahead completions, like `/api/products/suggest/`; the index loads from the database on first use.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    query = request.GET.get('q', '')
+    suggestions = await sync_to_async(suggestion_index.suggest)(query, limit=limit)
+    return json_response({'query': query, **suggestions})
@@ -0,0 +1,234 @@
+# products/bulk.py
+
+import csv
+import io
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.text import slugify
+
+from . import cache as catalog_cache
+from .inventory import set_sharded_stock
+from .models import Category, Product
+from .serializers import ProductImportSerializer
+from .suggest import suggestion_index
+
+FORMATS = ('csv', 'ndjson')
+EXPORT_FIELDS = ['id', 'name', 'description', 'price', 'stock', 'available', 'category']
+UPSERT_FIELDS = ['name', 'description', 'price', 'stock', 'available', 'category', 'updated_at']
+# Rejected rows reported back in full; the rest are only counted.
+MAX_REPORTED_ERRORS = 100
+# Raised while reading the file itself (bad encoding, malformed CSV), rather than by a row's values.
+READ_ERRORS = (UnicodeDecodeError, csv.Error)
+
+
+def get_chunk_size():
+    return getattr(settings, 'PRODUCT_BULK_CHUNK_SIZE', 1000)
+
+
+def batched(iterable, size):
+    """
+    Yields lists of up to `size` items (`itertools.batched` from Python 3.12).
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def guess_format(filename, default='csv'):
+    extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    if extension == 'csv':
+        return 'csv'
+    return default
+
+
+def read_rows(stream, file_format):
+    """
+    Lazily yields row dicts from a binary or text stream, one line at a time.
+    """
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif file_format == 'ndjson':
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Passed through so the serializer rejects it with the row number.
+                    yield line
+    else:
+        raise ValueError(f"Unsupported format '{file_format}'. Use one of: {', '.join(FORMATS)}.")
+
+
+class ProductImporter:
+    """
+    Streams product rows into the catalog in fixed-size chunks.
+    - Each chunk is validated with `ProductImportSerializer(many=True)` and upserted with one
+      `bulk_create(update_conflicts=True)` keyed on `id`, so memory stays constant for any file size.
+    - Categories are resolved from a name -> id map loaded once; unknown names are created in bulk,
+      or resolve to the existing category with the same slug. Rows whose category cannot be
+      resolved are rejected rather than imported without one.
+    - Bulk writes bypass model signals, so the catalog cache and typeahead index are reset at the end,
+      even when the import stops early.
+    - Each chunk commits on its own. If the file becomes unreadable part-way, the import stops and
+      the report's `failed` entry gives the first row not imported and the error; `imported`
+      counts the rows already committed.
+    """
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or get_chunk_size()
+        self.category_ids = dict(Category.objects.values_list('name', 'id'))
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.explicit_ids = False
+        self.failure = None
+
+    def run(self, rows):
+        row_number = 0
+        try:
+            try:
+                for chunk in batched(rows, self.chunk_size):
+                    self.import_chunk(chunk, first_row=row_number + 1)
+                    row_number += len(chunk)
+            except READ_ERRORS as e:
+                # The file turned unreadable part-way: the chunks before it stay committed.
+                self.failure = {'row': row_number + 1, 'error': str(e)}
+
+            if self.explicit_ids:
+                # Rows inserted with explicit ids do not advance the id sequence.
+                with connection.cursor() as cursor:
+                    for sql in connection.ops.sequence_reset_sql(no_style(), [Product]):
+                        cursor.execute(sql)
+        finally:
+            # Whatever stopped the import, committed chunks must not be served stale.
+            transaction.on_commit(catalog_cache.invalidate_catalog)
+            transaction.on_commit(suggestion_index.clear)
+        return self.report()
+
+    def reject(self, row_number, errors):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def validate_chunk(self, chunk, first_row):
+        """
+        Returns `(row number, validated row)` pairs, rejecting the invalid rows.
+        """
+        serializer = ProductImportSerializer(data=chunk, many=True)
+        if serializer.is_valid():
+            return list(enumerate(serializer.validated_data, start=first_row))
+
+        valid_rows = []
+        for offset, (row, errors) in enumerate(zip(chunk, serializer.errors)):
+            if errors:
+                self.reject(first_row + offset, errors)
+            else:
+                valid_rows.append((first_row + offset, ProductImportSerializer().run_validation(row)))
+        return valid_rows
+
+    def import_chunk(self, chunk, first_row):
+        numbered_rows = self.validate_chunk(chunk, first_row)
+        self.resolve_categories([row for _, row in numbered_rows])
+
+        # A row is never imported without the category it names.
+        valid_rows = []
+        for row_number, row in numbered_rows:
+            if row.get('category') and row['category'] not in self.category_ids:
+                self.reject(row_number, {'category': [f"Category '{row['category']}' could not be created."]})
+            else:
+                valid_rows.append(row)
+
+        # ON CONFLICT cannot touch the same row twice in one statement: the last row for an id wins.
+        with_id = {row['id']: row for row in valid_rows if row.get('id')}
+        without_id = [row for row in valid_rows if not row.get('id')]
+        self.explicit_ids = self.explicit_ids or bool(with_id)
+
+        products = [
+            Product(
+                id=row.get('id'),
+                name=row['name'],
+                description=row.get('description') or '',
+                price=row['price'],
+                stock=row['stock'],
+                available=row['available'],
+                category_id=self.category_ids.get(row['category']) if row.get('category') else None,
+            )
+            for row in [*with_id.values(), *without_id]
+        ]
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=UPSERT_FIELDS,
+            )
+            if with_id:
+                # The upsert bypasses signals: imported stock for sharded products goes to their shards.
+                sharded = Product.objects.filter(pk__in=with_id, stock_shards__gt=0)
+                for product_id, shards, stock in sharded.values_list('pk', 'stock_shards', 'stock'):
+                    set_sharded_stock(product_id, shards, stock)
+        self.imported += len(valid_rows)
+
+    def resolve_categories(self, rows):
+        missing = {row['category'] for row in rows if row.get('category')} - self.category_ids.keys()
+        if not missing:
+            return
+        Category.objects.bulk_create(
+            [Category(name=name, slug=slugify(name)) for name in missing],
+            ignore_conflicts=True,
+        )
+        self.category_ids.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+
+        # A name whose slug another category already has ('Home Garden' vs 'Home & Garden') was not
+        # created: it resolves to the category owning that slug.
+        slugs = {name: slugify(name) for name in missing - self.category_ids.keys()}
+        if slugs:
+            slug_ids = dict(Category.objects.filter(slug__in=slugs.values()).values_list('slug', 'id'))
+            self.category_ids.update((name, slug_ids[slug]) for name, slug in slugs.items() if slug in slug_ids)
+
+    def report(self):
+        report = {'imported': self.imported, 'rejected': self.rejected, 'errors': self.errors}
+        if self.failure:
+            report['failed'] = self.failure
+        return report
+
+
+class _Echo:
+    """
+    File-like object whose `write` returns the value, so `csv.writer` can feed a generator.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_rows(file_format, chunk_size=None):
+    """
+    Yields the whole catalog as CSV or NDJSON text, reading rows through a server-side cursor.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unsupported format '{file_format}'. Use one of: {', '.join(FORMATS)}.")
+
+    queryset = Product.objects.order_by('id').values_list(
+        'id', 'name', 'description', 'price', 'stock', 'available', 'category__name'
+    ).iterator(chunk_size=chunk_size or get_chunk_size())
+
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in queryset:
+            yield writer.writerow(row)
+    else:
+        for row in queryset:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record['price'] = str(record['price'])
+            yield json.dumps(record) + '\n'
@@ -0,0 +1,95 @@
+# products/cache.py
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Keys are namespaced by a generation number; bumping it orphans every cached entry at once,
+# so invalidation never has to scan or delete keys.
+GENERATION_KEY = 'catalog:generation'
+INVALIDATED_AT_KEY = 'catalog:invalidated-at'
+HITS_KEY = 'catalog:stats:hits'
+MISSES_KEY = 'catalog:stats:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def _increment(key):
+    """
+    Atomically increments a counter, creating it first if it does not exist yet.
+    """
+    cache = get_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key was evicted between `add` and `incr`; start it again.
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def get_generation():
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def invalidate_catalog():
+    """
+    Invalidates every cached catalog response by moving to a new generation.
+    """
+    get_cache().set(INVALIDATED_AT_KEY, time.time(), timeout=None)
+    return _increment(GENERATION_KEY)
+
+
+def seconds_since_invalidation():
+    invalidated_at = get_cache().get(INVALIDATED_AT_KEY)
+    return float('inf') if invalidated_at is None else time.time() - invalidated_at
+
+
+def make_key(scope, request):
+    """
+    Builds a key covering the request path and every query parameter
+    (filters, search, ordering, pagination), independent of parameter order.
+    """
+    params = sorted((name, sorted(values)) for name, values in request.GET.lists())
+    digest = hashlib.md5(f"{request.path}?{params}".encode()).hexdigest()
+    return f"catalog:{get_generation()}:{scope}:{digest}"
+
+
+def lookup(key):
+    data = get_cache().get(key)
+    _increment(HITS_KEY if data is not None else MISSES_KEY)
+    return data
+
+
+def store(key, data):
+    get_cache().set(key, data, timeout=get_timeout())
+
+
+def get_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'generation': get_generation(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
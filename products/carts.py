@@ -0,0 +1,29 @@
+# products/carts.py
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Cart
+
+
+def cart_cache_key(user_id):
+    return f"cart:user:{user_id}"
+
+
+def get_cart_id(user):
+    """
+    Returns the id of the user's cart, normally straight from the cache.
+    - Carts are created on registration, so the fallback `get_or_create` only runs
+      for users that predate that (or after a cache eviction).
+    """
+    key = cart_cache_key(user.pk)
+    cart_id = cache.get(key)
+    if cart_id is None:
+        cart, _ = Cart.objects.get_or_create(user=user)
+        cart_id = cart.pk
+        cache.set(key, cart_id, timeout=getattr(settings, 'CART_CACHE_TIMEOUT', 3600))
+    return cart_id
+
+
+def forget_cart(user_id):
+    cache.delete(cart_cache_key(user_id))
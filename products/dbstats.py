@@ -0,0 +1,81 @@
+# products/dbstats.py
+
+import threading
+from collections import Counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Connections Django set up per alias in this process. Without a pool each one is a new physical
+# connection, so with persistent connections the count should level off after warm-up; with a pool
+# each checkout counts, and the pool's own `connections_opened` counts the physical ones.
+_opened = Counter()
+_lock = threading.Lock()
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    with _lock:
+        _opened[connection.alias] += 1
+
+
+def is_pooled(alias):
+    return bool(connections.settings[alias].get('OPTIONS', {}).get('pool'))
+
+
+def pool_stats(alias):
+    """
+    Utilization of an alias's psycopg pool, or None when the alias is not pooled.
+    - `in_use` and `utilization` are connections checked out, against the pool's maximum size.
+    - `requests_waiting` and `requests_wait_ms` show requests queueing for a free connection.
+    """
+    if not is_pooled(alias):
+        return None
+    pool = connections[alias].pool
+    stats = pool.get_stats()
+    in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+    return {
+        'min_size': pool.min_size,
+        'max_size': pool.max_size,
+        'size': stats.get('pool_size', 0),
+        'available': stats.get('pool_available', 0),
+        'in_use': in_use,
+        'utilization': round(in_use / pool.max_size, 4) if pool.max_size else 0.0,
+        'requests_waiting': stats.get('requests_waiting', 0),
+        'requests': stats.get('requests_num', 0),
+        'requests_queued': stats.get('requests_queued', 0),
+        'requests_wait_ms': stats.get('requests_wait_ms', 0),
+        'requests_errors': stats.get('requests_errors', 0),
+        'connections_opened': stats.get('connections_num', 0),
+        'connections_ms': stats.get('connections_ms', 0),
+    }
+
+
+def get_stats():
+    """
+    Connection-management settings and counters for every configured database alias, in this process.
+    """
+    report = {}
+    for alias in connections.settings:
+        settings_dict = connections.settings[alias]
+        with _lock:
+            opened = _opened[alias]
+        report[alias] = {
+            'host': settings_dict.get('HOST') or 'localhost',
+            'pooled': is_pooled(alias),
+            'conn_max_age': settings_dict.get('CONN_MAX_AGE'),
+            'health_checks': settings_dict.get('CONN_HEALTH_CHECKS'),
+            'connects': opened,
+            'pool': pool_stats(alias),
+        }
+    return report
+
+
+def reset_stats():
+    with _lock:
+        _opened.clear()
+    for alias in connections.settings:
+        if is_pooled(alias):
+            # Pops the pool's counters; the sizes are gauges and stay.
+            connections[alias].pool.pop_stats()
@@ -0,0 +1,272 @@
+# products/fastpath.py
+
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from decimal import Decimal, getcontext
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+
+class Unsupported(Exception):
+    """
+    Raised while compiling a serializer whose output the fast path cannot reproduce exactly.
+    """
+
+
+# ----------------- Field formatters -----------------
+#
+# Each builder returns `make_formatter`, which is called once per batch of rows (so request-scoped
+# settings like the active timezone are read once) and returns a `value -> primitive` function
+# matching the DRF field's `to_representation`.
+
+def identity(value):
+    return value
+
+
+def integer_formatter(field):
+    return lambda: int
+
+
+def char_formatter(field):
+    return lambda: str
+
+
+def boolean_formatter(field):
+    return lambda: bool
+
+
+def choice_formatter(field):
+    choices = field.choice_strings_to_values
+
+    def format_choice(value):
+        return choices.get(str(value), value)
+    return lambda: format_choice
+
+
+def decimal_formatter(field):
+    if field.localize or field.normalize_output:
+        raise Unsupported(f"{field.field_name}: localized or normalized decimals")
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.decimal_places is None:
+        quantize = identity
+    else:
+        context = getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        exponent = Decimal('.1') ** field.decimal_places
+
+        def quantize(value):
+            return value.quantize(exponent, rounding=field.rounding, context=context)
+
+    def format_decimal(value):
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        value = quantize(value)
+        return '{:f}'.format(value) if coerce_to_string else value
+    return lambda: format_decimal
+
+
+UTC_ZONE_NAMES = {'UTC', 'Etc/UTC'}
+
+
+def datetime_formatter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None:
+        return lambda: identity
+
+    iso_8601 = output_format.lower() == ISO_8601
+
+    def make_formatter():
+        tz = field.timezone if hasattr(field, 'timezone') else (
+            timezone.get_current_timezone() if settings.USE_TZ else None
+        )
+        if getattr(tz, 'key', None) in UTC_ZONE_NAMES:
+            # Same offsets, but rows from the database already carry it and `isoformat` is cheaper.
+            tz = dt_timezone.utc
+
+        def format_datetime(value):
+            if tz is not None and value.tzinfo is not tz:
+                value = timezone.make_aware(value, tz) if value.tzinfo is None else value.astimezone(tz)
+            if iso_8601:
+                value = value.isoformat()
+                return value[:-6] + 'Z' if value.endswith('+00:00') else value
+            return value.strftime(output_format)
+        return format_datetime
+    return make_formatter
+
+
+# A field only matches if its class keeps the base class's `to_representation`.
+FIELD_FORMATTERS = (
+    (serializers.BooleanField, boolean_formatter),
+    (serializers.ChoiceField, choice_formatter),
+    (serializers.DecimalField, decimal_formatter),
+    (serializers.DateTimeField, datetime_formatter),
+    (serializers.IntegerField, integer_formatter),
+    (serializers.CharField, char_formatter),
+)
+
+
+def display_formatter(model_field):
+    """
+    Formatter for a `get_<field>_display` source, matching Django's choice display lookup.
+    """
+    choices = dict(model_field.flatchoices)
+
+    def format_display(value):
+        display = choices.get(value, value)
+        return None if display is None else str(display)
+    return lambda: format_display
+
+
+# ----------------- Compiled serializers -----------------
+
+class FastSerializer:
+    """
+    A `ModelSerializer` compiled into a `.values()` column list and a row -> dict mapper.
+    - Fields are read straight from `values()` rows and formatted with precompiled functions
+      that reproduce the DRF fields' `to_representation`, so the output is identical.
+    - Nested forward relations come from the same row (joined columns); nested `many=True`
+      relations are fetched with one extra `values()` query per batch, ordered by primary key
+      like the serializer's eager-loading prefetch.
+    - `compile` raises `Unsupported` for anything it cannot reproduce exactly, and callers
+      fall back to the regular serializer.
+    """
+
+    def __init__(self, model, entries, columns, children):
+        self.model = model
+        self.entries = entries      # (key, column, make_formatter | FastSerializer | None), in output order
+        self.columns = columns      # values() lookups, including joined nested columns
+        self.children = children    # key -> (related_name, FastSerializer) for nested many=True fields
+
+    @classmethod
+    def compile(cls, serializer_class, prefix=''):
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        entries, columns, children = [], [], {}
+
+        for key, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if len(field.source_attrs) != 1:
+                raise Unsupported(f"{key}: dotted source")
+            source = field.source_attrs[0]
+
+            if isinstance(field, serializers.ListSerializer):
+                if prefix:
+                    raise Unsupported(f"{key}: nested many=True inside a joined relation")
+                related_name = model._meta.get_field(source).field.name
+                children[key] = (related_name, cls.compile(type(field.child)))
+                entries.append((key, None, None))
+                continue
+
+            if source.startswith('get_') and source.endswith('_display') and isinstance(field, serializers.CharField):
+                model_field = cls.get_model_field(model, source[len('get_'):-len('_display')])
+                if not model_field.choices:
+                    raise Unsupported(f"{key}: display of a field without choices")
+                column = f"{prefix}{model_field.name}"
+                entries.append((key, column, display_formatter(model_field)))
+                columns.append(column)
+                continue
+
+            model_field = cls.get_model_field(model, source)
+            column = f"{prefix}{source}"
+            columns.append(column)
+            if isinstance(field, serializers.ModelSerializer):
+                nested = cls.compile(type(field), prefix=f"{column}__")
+                entries.append((key, column, nested))
+                columns.extend(nested.columns)
+            elif isinstance(field, serializers.PrimaryKeyRelatedField) and model_field.is_relation:
+                # `values()` returns the FK id, which is what a PK-only related field renders.
+                entries.append((key, column, lambda: identity))
+            else:
+                entries.append((key, column, cls.get_formatter(field)))
+
+        return cls(model, entries, columns, children)
+
+    @staticmethod
+    def get_model_field(model, name):
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise Unsupported(f"{model.__name__}.{name} is not a model field")
+        if not model_field.concrete:
+            raise Unsupported(f"{model.__name__}.{name} is not a column")
+        return model_field
+
+    @staticmethod
+    def get_formatter(field):
+        for field_class, builder in FIELD_FORMATTERS:
+            if isinstance(field, field_class):
+                if type(field).to_representation is not field_class.to_representation:
+                    break
+                return builder(field)
+        raise Unsupported(f"{field.field_name}: {type(field).__name__}")
+
+    def values(self, queryset, extra_columns=()):
+        """
+        Turns a queryset into the `values()` rows this serializer maps; extra columns (such as the
+        pagination's ordering) are fetched alongside.
+        """
+        columns = list(dict.fromkeys([*self.columns, *extra_columns]))
+        return queryset.prefetch_related(None).values(*columns)
+
+    def map_rows(self, rows):
+        """
+        Maps `values()` rows column by column: each field's formatter runs over the whole batch,
+        then the columns are zipped into dicts in the serializer's field order.
+        - Nested relations map the same rows and render None when their FK column is null.
+        """
+        columns = []
+        for key, column, formatter in self.entries:
+            if formatter is None:
+                # Filled in by `represent` from the bulk child query.
+                columns.append([None] * len(rows))
+            elif isinstance(formatter, FastSerializer):
+                linked = [row for row in rows if row[column] is not None]
+                nested = iter(formatter.map_rows(linked))
+                columns.append([None if row[column] is None else next(nested) for row in rows])
+            else:
+                format_value = formatter()
+                columns.append([None if (value := row[column]) is None else format_value(value) for row in rows])
+
+        keys = [key for key, _, _ in self.entries]
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+
+    def represent(self, rows):
+        """
+        Maps `values()` rows to the serializer's output, fetching nested `many=True` relations in bulk.
+        """
+        rows = list(rows)
+        data = self.map_rows(rows)
+        if not self.children or not rows:
+            return data
+
+        pk_name = self.model._meta.pk.name
+        ids = [row[pk_name] for row in rows]
+        for key, (related_name, child) in self.children.items():
+            fk_column = f"{related_name}_id"
+            related = child.model._default_manager.filter(**{f"{related_name}__in": ids}).order_by('pk')
+            child_rows = list(child.values(related, [fk_column]))
+            grouped = defaultdict(list)
+            for row, item in zip(child_rows, child.represent(child_rows)):
+                grouped[row[fk_column]].append(item)
+            for row, item in zip(rows, data):
+                item[key] = grouped.get(row[pk_name], [])
+        return data
+
+
+def compile_serializer(serializer_class):
+    """
+    Returns the compiled FastSerializer for a serializer class, or None when it is not supported.
+    Compiled serializers are cached on the class.
+    """
+    if '_fast_serializer' not in serializer_class.__dict__:
+        try:
+            serializer_class._fast_serializer = FastSerializer.compile(serializer_class)
+        except Unsupported:
+            serializer_class._fast_serializer = None
+    return serializer_class._fast_serializer
@@ -0,0 +1,75 @@
+# products/fieldsets.py
+
+
+def split_param(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+class Fieldset:
+    """
+    A parsed `?fields=` / `?expand=` selection for one serializer level (a sparse fieldset).
+    - `fields` is the set of field names to render, or None to render every field.
+    - `expand` maps relation names to the Fieldset of the nested serializer rendered for them.
+    - In a sparse selection, relations that are not expanded render as primary keys.
+    """
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = expand or {}
+
+    @classmethod
+    def from_query_params(cls, fields=None, expand=None):
+        """
+        Parses comma-separated `fields` and `expand` values; dotted paths reach into nested objects,
+        so `fields=id,items.quantity` keeps `id` and `items`, and only `quantity` within each item.
+        Returns None when neither parameter is given.
+        """
+        fields, expand = split_param(fields), split_param(expand)
+        if not fields and not expand:
+            return None
+
+        fieldset = cls(set() if fields else None)
+        for path in fields:
+            fieldset.add_field(path.split('.'))
+        for path in expand:
+            fieldset.add_expand(path.split('.'))
+        return fieldset
+
+    def add_field(self, parts):
+        name, rest = parts[0], parts[1:]
+        if self.fields is not None:
+            self.fields.add(name)
+        if rest:
+            # Selecting fields of a relation expands it.
+            nested = self.expand.setdefault(name, Fieldset(set()))
+            nested.add_field(rest)
+
+    def add_expand(self, parts):
+        name, rest = parts[0], parts[1:]
+        if self.fields is not None:
+            self.fields.add(name)
+        nested = self.expand.setdefault(name, Fieldset())
+        if rest:
+            nested.add_expand(rest)
+
+    def includes(self, name):
+        """
+        Whether the field is rendered at all.
+        """
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        """
+        Whether a relation renders as a nested object rather than a primary key.
+        """
+        return self.fields is None or name in self.expand
+
+    def nested(self, name):
+        """
+        The Fieldset for a nested serializer, or None to render it in full.
+        """
+        return self.expand.get(name)
+
+
+# The selection applied when none is given: every field, relations nested in full.
+ALL_FIELDS = Fieldset()
@@ -0,0 +1,81 @@
+# products/filters.py
+
+from decimal import Decimal
+
+import django_filters
+from django.db.models import Count, Q
+
+from .models import Product
+
+
+class ProductFilter(django_filters.FilterSet):
+    """
+    Filters for the product listing.
+    - `category` and `available` keep their existing equality semantics.
+    - `min_price`/`max_price` select a price range; combined with `available` they use
+      the `(available, price)` index.
+    - `in_stock` selects products with (or without) stock left.
+    """
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    in_stock = django_filters.BooleanFilter(method='filter_in_stock')
+
+    class Meta:
+        model = Product
+        fields = ['category', 'available', 'min_price', 'max_price', 'in_stock']
+
+    def filter_in_stock(self, queryset, name, value):
+        return queryset.filter(stock__gt=0) if value else queryset.filter(stock__lte=0)
+
+
+def price_bucket_ranges(boundaries):
+    """
+    Turns `(10, 50)` into `[(None, 10), (10, 50), (50, None)]`; each range is `[min, max)`.
+    """
+    edges = [None, *(Decimal(str(boundary)) for boundary in boundaries), None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def facet_counts(queryset, price_boundaries):
+    """
+    Computes category, price-bucket and stock facet counts for `queryset` in a single query:
+    one GROUP BY category row carrying conditional counts, summed up in Python.
+    """
+    buckets = price_bucket_ranges(price_boundaries)
+    aggregates = {
+        'total': Count('pk'),
+        'in_stock': Count('pk', filter=Q(stock__gt=0)),
+    }
+    for index, (low, high) in enumerate(buckets):
+        condition = Q()
+        if low is not None:
+            condition &= Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'price_{index}'] = Count('pk', filter=condition)
+
+    rows = queryset.order_by().values('category_id', 'category__name').annotate(**aggregates)
+
+    categories = []
+    price_counts = [0] * len(buckets)
+    in_stock = out_of_stock = 0
+    for row in rows:
+        categories.append({'id': row['category_id'], 'name': row['category__name'], 'count': row['total']})
+        in_stock += row['in_stock']
+        out_of_stock += row['total'] - row['in_stock']
+        for index in range(len(buckets)):
+            price_counts[index] += row[f'price_{index}']
+
+    categories.sort(key=lambda category: (-category['count'], category['name'] or ''))
+    return {
+        'category': categories,
+        'price': [
+            {
+                'min': str(low) if low is not None else None,
+                'max': str(high) if high is not None else None,
+                'count': count,
+            }
+            for (low, high), count in zip(buckets, price_counts)
+        ],
+        'availability': {'in_stock': in_stock, 'out_of_stock': out_of_stock},
+    }
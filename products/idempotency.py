@@ -0,0 +1,117 @@
+# products/idempotency.py
+
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Subquery
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400))
+
+
+def request_fingerprint(request):
+    """
+    SHA-256 of the method, path and parsed body, so a key reused for another request is caught.
+    """
+    data = request.data
+    if hasattr(data, 'lists'):  # QueryDict from a form body
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def find_key(user_id, key):
+    return IdempotencyKey.objects.filter(
+        user_id=user_id, key=key, expires_at__gt=timezone.now(),
+    ).only('fingerprint', 'status_code', 'response').first()
+
+
+def replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response({"error": f"This {HEADER} was already used for a different request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(handler):
+    """
+    Lets clients retry a write view handler (`post`, `create`, ...) safely with an `Idempotency-Key` header.
+    - The first request inserts the key's row in its own transaction, before the handler runs,
+      and stores the response in that row before committing.
+    - A retry finds the row with one indexed lookup and gets the stored response back, with an
+      `Idempotent-Replayed: true` header. The handler does not run, so no product, cart or order
+      rows are touched.
+    - A concurrent duplicate's insert waits on the unique index until the first request finishes,
+      then replays its response; if the first request failed, the duplicate runs itself.
+    - Only successful (2xx) responses are kept: a failed request leaves no key, so it can be retried.
+    - Keys are per user and expire after IDEMPOTENCY_KEY_TTL seconds. A key reused for a different
+      method, path or body gets a 422.
+    - Requests without the header run as before.
+    """
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return handler(view, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters long."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        record = find_key(request.user.pk, key)
+        if record is not None:
+            return replay(record, fingerprint)
+
+        claimed = False
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user_id=request.user.pk, key=key, fingerprint=fingerprint,
+                    expires_at=timezone.now() + key_ttl(),
+                )
+                claimed = True
+                response = handler(view, request, *args, **kwargs)
+                if status.is_success(response.status_code):
+                    IdempotencyKey.objects.filter(pk=record.pk).update(
+                        status_code=response.status_code, response=response.data,
+                    )
+                else:
+                    transaction.set_rollback(True)
+                return response
+        except IntegrityError:
+            if claimed:
+                raise
+
+        # Another request committed this key while ours waited to insert it.
+        record = find_key(request.user.pk, key)
+        if record is not None:
+            return replay(record, fingerprint)
+        # The key's row has expired without being purged yet: drop it and claim the key afresh.
+        IdempotencyKey.objects.filter(user_id=request.user.pk, key=key, expires_at__lte=timezone.now()).delete()
+        return wrapper(view, request, *args, **kwargs)
+
+    return wrapper
+
+
+def purge_expired(batch_size=1000):
+    """
+    Deletes up to `batch_size` expired keys, oldest first, through the `expires_at` index;
+    returns how many were deleted.
+    """
+    expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at').values('pk')
+    deleted, _ = IdempotencyKey.objects.filter(pk__in=Subquery(expired[:batch_size])).delete()
+    return deleted
@@ -0,0 +1,358 @@
+# products/inventory.py
+
+import logging
+import random
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache as catalog_cache
+from .models import Product, StockReservation, StockShard
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_SETTINGS = {'INVENTORY_SWEEP_INTERVAL', 'INVENTORY_SWEEP_BATCH_SIZE'}
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def reservations_enabled():
+    return getattr(settings, 'INVENTORY_RESERVATIONS', False)
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'INVENTORY_RESERVATION_TTL', 900))
+
+
+# ----------------- Stock counters -----------------
+#
+# A product's stock counter is its own `stock` column, or, for a hot SKU with `stock_shards`,
+# that many `StockShard` rows: a buyer decrements one shard picked at random, so concurrent
+# buyers mostly lock different rows. Counters hold the units still free to reserve or buy.
+
+def available_stock(products):
+    """
+    Units free per product (`{id: units}`) for a `{id: Product}` mapping; sharded products
+    are summed from their shards, in one query for all of them.
+    """
+    available = {pk: product.stock for pk, product in products.items() if not product.stock_shards}
+    sharded = [pk for pk, product in products.items() if product.stock_shards]
+    if sharded:
+        totals = dict(
+            StockShard.objects.filter(product_id__in=sharded).order_by().values('product')
+            .annotate(total=Sum('stock')).values_list('product', 'total')
+        )
+        available.update({pk: totals.get(pk, 0) for pk in sharded})
+    return available
+
+
+def lock_counters(product_ids):
+    """
+    Locks unsharded products' rows in id order, so concurrent multi-product updates cannot deadlock,
+    and returns their current stock.
+    """
+    return dict(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('pk', 'stock'))
+
+
+def take_from_shards(product_id, quantity):
+    """
+    Takes `quantity` units off a sharded product's counters. Returns False if they hold fewer.
+    - One UPDATE takes them from a random shard that can cover them, skipping shards other buyers
+      have locked rather than queueing behind them.
+    - Failing that, the shards are locked in shard order and drained in turn; the product row
+      lock lets one such drain run at a time per product.
+    - The first UPDATE runs in a savepoint that a miss rolls back: re-checking a shard a concurrent
+      buyer just changed leaves it locked even when it no longer matches, and the drain must not
+      wait on shards while holding a stray lock another drain waits for.
+    """
+    pick = (
+        StockShard.objects.select_for_update(skip_locked=True)
+        .filter(product_id=product_id, stock__gte=quantity).order_by('?').values('pk')[:1]
+    )
+    savepoint = transaction.savepoint()
+    if StockShard.objects.filter(pk__in=Subquery(pick)).update(stock=F('stock') - quantity):
+        transaction.savepoint_commit(savepoint)
+        return True
+    transaction.savepoint_rollback(savepoint)
+
+    list(Product.objects.select_for_update(no_key=True).filter(pk=product_id).values_list('pk'))
+    rows = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by('shard'))
+    if sum(row.stock for row in rows) < quantity:
+        return False
+    remaining = quantity
+    for row in rows:
+        taken = min(row.stock, remaining)
+        row.stock -= taken
+        remaining -= taken
+    StockShard.objects.bulk_update(rows, ['stock'])
+    return True
+
+
+def take_stock(products, quantities):
+    """
+    Takes `quantities` (`{id: units}`) off the products' counters. Returns `{id: units free}` for
+    the products short of stock, in which case nothing may be kept: the caller rolls back.
+    - Unsharded products cost one locking read and one UPDATE for all of them.
+    - Sharded products cost one UPDATE each, in a savepoint, while an unlocked shard can cover the quantity.
+    """
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    plain = {pk: quantity for pk, quantity in quantities.items() if not products[pk].stock_shards}
+    short = {}
+    if plain:
+        stock = lock_counters(plain)
+        short = {pk: stock.get(pk, 0) for pk, quantity in plain.items() if stock.get(pk, 0) < quantity}
+        if not short:
+            Product.objects.filter(pk__in=plain).update(
+                stock=Case(*[When(pk=pk, then=F('stock') - quantity) for pk, quantity in plain.items()],
+                           default=F('stock')),
+            )
+    for pk in sorted(quantities.keys() - plain.keys()):
+        if not short and not take_from_shards(pk, quantities[pk]):
+            short[pk] = available_stock({pk: products[pk]})[pk]
+    return short
+
+
+def put_stock(products, quantities):
+    """
+    Returns units to the products' counters; a sharded product's go to one shard at random.
+    """
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    plain = {pk: quantity for pk, quantity in quantities.items() if not products[pk].stock_shards}
+    if plain:
+        if len(plain) > 1:
+            lock_counters(plain)
+        Product.objects.filter(pk__in=plain).update(
+            stock=Case(*[When(pk=pk, then=F('stock') + quantity) for pk, quantity in plain.items()],
+                       default=F('stock')),
+        )
+    for pk in sorted(quantities.keys() - plain.keys()):
+        StockShard.objects.filter(product_id=pk, shard=random.randrange(products[pk].stock_shards)).update(
+            stock=F('stock') + quantities[pk]
+        )
+
+
+# ----------------- Reservations -----------------
+
+def held_by_cart(cart_id, product_ids):
+    """
+    The cart's reservations for the products, locked (they belong to one cart, so nobody else waits).
+    """
+    return {
+        reservation.product_id: reservation
+        for reservation in StockReservation.objects.select_for_update().filter(cart_id=cart_id, product_id__in=product_ids)
+    }
+
+
+def reserve(cart_id, products, targets):
+    """
+    Moves the cart's holds to `targets` (`{id: units}`, 0 releases), taking or returning only the
+    difference and pushing `expires_at` out by `INVENTORY_RESERVATION_TTL`. Must run in a transaction.
+    Returns `{id: units the cart could have}` for products short of stock (the caller then rolls back).
+    - Callers write the cart items in the same transaction; their row locks (or unique constraint)
+      keep two requests of one cart from both creating the same hold.
+    """
+    held = held_by_cart(cart_id, targets)
+    changes = {pk: target - (held[pk].quantity if pk in held else 0) for pk, target in targets.items()}
+    short = take_stock(products, {pk: change for pk, change in changes.items() if change > 0})
+    if short:
+        return {pk: free + (held[pk].quantity if pk in held else 0) for pk, free in short.items()}
+    put_stock(products, {pk: -change for pk, change in changes.items() if change < 0})
+
+    expires_at = timezone.now() + reservation_ttl()
+    StockReservation.objects.bulk_create(
+        [StockReservation(cart_id=cart_id, product_id=pk, quantity=target, expires_at=expires_at)
+         for pk, target in targets.items() if target > 0],
+        update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity', 'expires_at'],
+    )
+    released = [pk for pk, target in targets.items() if target <= 0 and pk in held]
+    if released:
+        StockReservation.objects.filter(cart_id=cart_id, product_id__in=released).delete()
+    get_sweeper().start()
+    return {}
+
+
+def consume(cart_id, products, quantities):
+    """
+    Checks out `quantities` (`{id: units}`) for a cart: its holds cover what they can, only the
+    shortfall comes off the counters, and any surplus held goes back. Must run in a transaction.
+    Returns `{id: units the cart could have}` for products short of stock (the caller then rolls back).
+    """
+    held = held_by_cart(cart_id, quantities)
+    holding = {pk: reservation.quantity for pk, reservation in held.items()}
+    short = take_stock(products, {pk: quantity - holding.get(pk, 0) for pk, quantity in quantities.items()})
+    if short:
+        return {pk: free + holding.get(pk, 0) for pk, free in short.items()}
+    put_stock(products, {pk: holding[pk] - quantity for pk, quantity in quantities.items() if pk in holding})
+    if held:
+        StockReservation.objects.filter(pk__in=[reservation.pk for reservation in held.values()]).delete()
+    return {}
+
+
+def release_cart(cart_id):
+    """
+    Returns every unit a cart holds, e.g. before the cart is deleted.
+    """
+    with transaction.atomic():
+        held = list(StockReservation.objects.select_for_update().filter(cart_id=cart_id))
+        release(held)
+
+
+def release(reservations):
+    if not reservations:
+        return
+    quantities = Counter()
+    for reservation in reservations:
+        quantities[reservation.product_id] += reservation.quantity
+    products = Product.objects.only('id', 'stock_shards').in_bulk(quantities.keys())
+    StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).delete()
+    put_stock(products, {pk: quantity for pk, quantity in quantities.items() if pk in products})
+
+
+def sweep_expired(batch_size=1000):
+    """
+    Returns the units of up to `batch_size` expired reservations to stock; returns how many expired.
+    Rows a checkout is consuming are skipped (`SKIP LOCKED`), and whichever of the two deletes a
+    reservation is the only one to use its units.
+    """
+    with transaction.atomic():
+        expired = list(
+            StockReservation.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lte=timezone.now()).order_by('expires_at')[:batch_size]
+        )
+        release(expired)
+        if expired:
+            # Counter updates bypass the model signals.
+            transaction.on_commit(catalog_cache.invalidate_catalog)
+    return len(expired)
+
+
+def refresh_sharded_stock(product_ids=None):
+    """
+    Copies each sharded product's shard total into `Product.stock`, which catalog reads show;
+    returns how many products changed. `product_ids` (ids or a subquery) limits it to those products.
+    - Does nothing without reservations: checkout then takes sharded products' units off
+      `Product.stock` itself, and the shard totals would undo those sales.
+    """
+    if not reservations_enabled():
+        return 0
+    total = Coalesce(
+        Subquery(StockShard.objects.filter(product=OuterRef('pk')).order_by().values('product')
+                 .annotate(total=Sum('stock')).values('total')),
+        Value(0),
+    )
+    products = Product.objects.filter(stock_shards__gt=0)
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    with transaction.atomic():
+        updated = products.exclude(stock=total).update(stock=total)
+        if updated:
+            transaction.on_commit(catalog_cache.invalidate_catalog)
+    return updated
+
+
+# ----------------- Sharding -----------------
+
+def set_sharded_stock(product_id, shards, total):
+    """
+    Spreads `total` units evenly over a product's `shards` shard rows, replacing what they held.
+    """
+    with transaction.atomic():
+        list(StockShard.objects.select_for_update().filter(product_id=product_id).values_list('pk'))
+        StockShard.objects.filter(product_id=product_id).delete()
+        StockShard.objects.bulk_create([
+            StockShard(product_id=product_id, shard=shard, stock=total // shards + (shard < total % shards))
+            for shard in range(shards)
+        ])
+
+
+def shard_product(product_id, shards):
+    """
+    Moves a product's stock counter into `shards` rows, or back onto the product row with 0.
+    """
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(pk=product_id)
+        total = available_stock({product.pk: product})[product.pk]
+        if shards:
+            set_sharded_stock(product.pk, shards, total)
+        else:
+            StockShard.objects.filter(product_id=product.pk).delete()
+        # update() rather than save(): the stock total did not change.
+        Product.objects.filter(pk=product.pk).update(stock=total, stock_shards=shards)
+    return total
+
+
+# ----------------- Expiry sweep -----------------
+
+class ReservationSweeper:
+    """
+    Background thread returning expired reservations to stock every `interval` seconds, and
+    refreshing sharded products' `stock` copies. Every web process runs one (started by its first
+    reservation); with `interval=0` none runs and `manage.py sweep_reservations` does the job.
+    """
+
+    def __init__(self, interval=30, batch_size=1000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.thread = None
+        self.stopping = threading.Event()
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        if self.interval <= 0 or self.thread is not None:
+            return
+        with self.start_lock:
+            if self.thread is None and not self.stopping.is_set():
+                self.thread = threading.Thread(target=self.run, name='reservation-sweeper', daemon=True)
+                self.thread.start()
+
+    def stop(self, timeout=5):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Reservation sweep failed")
+            finally:
+                connections.close_all()
+
+    def sweep(self):
+        expired = 0
+        while True:
+            swept = sweep_expired(self.batch_size)
+            expired += swept
+            if swept < self.batch_size:
+                return expired, refresh_sharded_stock()
+
+
+def get_sweeper():
+    global _sweeper
+    if _sweeper is None:
+        with _sweeper_lock:
+            if _sweeper is None:
+                _sweeper = ReservationSweeper(
+                    interval=getattr(settings, 'INVENTORY_SWEEP_INTERVAL', 30),
+                    batch_size=getattr(settings, 'INVENTORY_SWEEP_BATCH_SIZE', 1000),
+                )
+    return _sweeper
+
+
+@receiver(setting_changed)
+def reset_sweeper(setting, **kwargs):
+    global _sweeper
+    if setting in INVENTORY_SETTINGS and _sweeper is not None:
+        with _sweeper_lock:
+            _sweeper.stop()
+            _sweeper = None
@@ -0,0 +1,117 @@
+# products/management/commands/benchmark_inventory.py
+
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from products.inventory import available_stock, shard_product
+from products.metrics import percentile
+from products.models import Category, Order, Product
+
+MODES = ('row-lock', 'reserve', 'reserve-sharded')
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Contention benchmark: N parallel buyers each add one unit of the same product to their cart "
+        "and check out, once per mode. 'row-lock' checks stock at add-to-cart and locks the product row "
+        "at checkout (INVENTORY_RESERVATIONS=False); 'reserve' holds stock at add-to-cart; "
+        "'reserve-sharded' does the same on a product with --shards stock shards. "
+        "Runs in-process against the configured database, on a throwaway product and users it deletes afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=50,
+                            help="Parallel buyers (threads, one connection each: keep it under max_connections).")
+        parser.add_argument('--stock', type=int, help="Units on sale (default: half the buyers).")
+        parser.add_argument('--shards', type=int, default=8, help="Stock shards for 'reserve-sharded'.")
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+
+    def handle(self, *args, **options):
+        buyers = options['buyers']
+        stock = options['stock'] if options['stock'] is not None else buyers // 2
+        if buyers < 1 or stock < 0 or not 1 <= options['shards'] <= 256:
+            raise CommandError("Need at least one buyer, non-negative stock and 1 to 256 shards.")
+
+        for mode in options['modes']:
+            # No pipeline workers: orders stay pending, so only the buyers' requests are measured.
+            # The buyers call the views in-process, as the test client's 'testserver' host.
+            with override_settings(INVENTORY_RESERVATIONS=mode != 'row-lock', ORDER_PIPELINE_WORKERS=0,
+                                   ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                self.report(mode, *self.run(mode, buyers, stock, options['shards']))
+
+    def run(self, mode, buyers, stock, shards):
+        tag = f"bench-{uuid.uuid4().hex[:8]}"
+        category = Category.objects.create(name=tag)
+        product = Product.objects.create(name=tag, price=Decimal('9.99'), stock=stock, category=category)
+        if mode == 'reserve-sharded':
+            shard_product(product.pk, shards)
+        users = User.objects.bulk_create([User(username=f'{tag}-{index}') for index in range(buyers)])
+        results = []
+        barrier = threading.Barrier(buyers)
+
+        def buy(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                began = time.perf_counter()
+                added = client.post('/api/cart-items/', {'product_id': product.pk, 'quantity': 1}, format='json')
+                checked_out, checkout_began = None, time.perf_counter()
+                if added.status_code == 201:
+                    checked_out = client.post(
+                        '/api/checkout/', {'order_items': [{'product': product.pk, 'quantity': 1}]}, format='json',
+                    )
+                finished = time.perf_counter()
+                results.append((added.status_code, checked_out and checked_out.status_code,
+                                finished - began, checked_out and finished - checkout_began))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            product.refresh_from_db()
+            sold = Order.objects.filter(items__product=product).count()
+            left = available_stock({product.pk: product})[product.pk]
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            product.delete()
+            category.delete()
+        return results, elapsed, sold, left, stock
+
+    def report(self, mode, results, elapsed, sold, left, stock):
+        self.stdout.write(f"{mode}: {len(results)} buyers in {elapsed:.2f}s, {sold} orders "
+                          f"({sold / elapsed:.1f} orders/sec), {left} of {stock} units left")
+        for label, latencies in (
+            ("Buyer", [buyer for _, _, buyer, _ in results]),
+            ("Checkout", [checkout for _, _, _, checkout in results if checkout is not None]),
+        ):
+            latencies.sort()
+            self.stdout.write(f"  {label} latency (ms): " + ", ".join(
+                f"{name} {percentile(latencies, fraction) * 1000:.1f}"
+                for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))
+            ))
+        outcomes = {}
+        for added, checked_out, _, _ in results:
+            key = f"cart {added}" + (f" / checkout {checked_out}" if checked_out else "")
+            outcomes[key] = outcomes.get(key, 0) + 1
+        self.stdout.write("  Outcomes: " + ", ".join(f"{key}: {n}" for key, n in sorted(outcomes.items())))
+        if sold + left != stock:
+            self.stderr.write(f"  Stock mismatch: {sold} sold + {left} left != {stock}")
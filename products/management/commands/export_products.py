@@ -0,0 +1,35 @@
+# products/management/commands/export_products.py
+
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.bulk import FORMATS, export_rows
+
+
+class Command(BaseCommand):
+    help = "Streams the product catalog to a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or '-' for standard output.")
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--chunk-size', type=int, help="Rows fetched per server-side cursor round trip.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = 0
+        output = sys.stdout if options['path'] == '-' else open(options['path'], 'w', encoding='utf-8', newline='')
+        try:
+            for chunk in export_rows(options['format'], options['chunk_size']):
+                output.write(chunk)
+                rows += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if options['format'] == 'csv':
+            rows -= 1  # Header line
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0
+        self.stderr.write(f"Exported {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/sec).")
@@ -0,0 +1,43 @@
+# products/management/commands/import_products.py
+
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.bulk import FORMATS, ProductImporter, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Streams products from a CSV or NDJSON file into the catalog (upserting on id)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input.")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension, then CSV.")
+        parser.add_argument('--chunk-size', type=int, help="Rows validated and written per batch.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or guess_format(path)
+        started = time.perf_counter()
+
+        try:
+            if path == '-':
+                report = ProductImporter(options['chunk_size']).run(read_rows(sys.stdin.buffer, file_format))
+            else:
+                with open(path, 'rb') as stream:
+                    report = ProductImporter(options['chunk_size']).run(read_rows(stream, file_format))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - started
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        rate = report['imported'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['imported']} rows, rejected {report['rejected']} "
+            f"in {elapsed:.2f}s ({rate:.0f} rows/sec)."
+        ))
+        if 'failed' in report:
+            failed = report['failed']
+            raise CommandError(f"Stopped at row {failed['row']}, which was not imported: {failed['error']}")
@@ -0,0 +1,157 @@
+# products/management/commands/loadtest.py
+
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.metrics import percentile
+
+
+async def read_response(reader):
+    """
+    Reads one HTTP/1.1 response (Content-Length or chunked body) and returns its status code.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by server")
+    status = int(status_line.split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while size := int((await reader.readline()).split(b';')[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection', '').lower() == 'close'
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests a running server with concurrent keep-alive clients and reports requests/sec "
+        "and latency percentiles. Run it against the WSGI deployment (e.g. gunicorn "
+        "ecommerce_backend.wsgi) on /api/products/ and against the ASGI deployment (e.g. uvicorn "
+        "ecommerce_backend.asgi:application) on /api/async/products/ to compare them. "
+        "With --login, extra clients keep logging in (POST /api/token/) for the whole run, to measure "
+        "login throughput and its impact on the other URLs during an auth storm. "
+        "High concurrency needs a matching open-files limit (ulimit -n)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help="URLs to request in turn, e.g. http://localhost:8000/api/products/")
+        parser.add_argument('--concurrency', type=int, default=1000, help="Concurrent clients (connections).")
+        parser.add_argument('--requests', type=int, default=20000, help="Total requests across all clients.")
+        parser.add_argument('--timeout', type=float, default=30, help="Seconds before a request counts as failed.")
+        parser.add_argument('--login', metavar='USERNAME:PASSWORD',
+                            help="Credentials for the login clients (the user must exist).")
+        parser.add_argument('--login-concurrency', type=int, default=50, help="Concurrent login clients.")
+        parser.add_argument('--login-path', default='/api/token/', help="Token endpoint to log in at.")
+
+    def handle(self, *args, **options):
+        targets = []
+        for url in options['urls']:
+            parts = urlsplit(url)
+            if parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(f"Only plain http:// URLs are supported: {url}")
+            path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+            targets.append((parts.hostname, parts.port or 80, path))
+        if len({(host, port) for host, port, _ in targets}) > 1:
+            raise CommandError("All URLs must point at the same server.")
+        if options['login'] and ':' not in options['login']:
+            raise CommandError("--login takes USERNAME:PASSWORD.")
+
+        started = time.perf_counter()
+        stats, login_stats = asyncio.run(self.run(targets, options))
+        elapsed = time.perf_counter() - started
+
+        self.report("Requests", stats, elapsed)
+        if login_stats is not None:
+            self.report("Logins", login_stats, elapsed)
+
+    def report(self, label, stats, elapsed):
+        latencies = sorted(stats.latencies)
+        self.stdout.write(f"{label}: {len(latencies)} ok, {stats.errors} failed in {elapsed:.2f}s "
+                          f"({len(latencies) / elapsed:.0f} requests/sec)")
+        self.stdout.write("  Latency (ms): " + ", ".join(
+            f"{name} {percentile(latencies, fraction) * 1000:.1f}"
+            for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))
+        ))
+        self.stdout.write("  Status codes: " + ", ".join(f"{code}: {n}" for code, n in sorted(stats.statuses.items())))
+
+    async def run(self, targets, options):
+        host, port, _ = targets[0]
+        remaining = options['requests']
+
+        def next_request():
+            nonlocal remaining
+            if remaining <= 0:
+                return None
+            remaining -= 1
+            _, _, path = targets[remaining % len(targets)]
+            return f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nAccept: application/json\r\n\r\n".encode()
+
+        login_request = None
+        if options['login']:
+            username, _, password = options['login'].partition(':')
+            body = json.dumps({'username': username, 'password': password}).encode()
+            login_request = (
+                f"POST {options['login_path']} HTTP/1.1\r\nHost: {host}:{port}\r\nAccept: application/json\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+            ).encode() + body
+
+        stats, login_stats = Stats(), Stats() if login_request else None
+        clients = [self.client(host, port, next_request, stats, options['timeout'])
+                   for _ in range(options['concurrency'])]
+        if login_request is None:
+            await asyncio.gather(*clients)
+            return stats, None
+
+        # Login clients keep going until the main clients are done.
+        done = asyncio.Event()
+
+        def next_login():
+            return None if done.is_set() else login_request
+
+        logins = [asyncio.ensure_future(self.client(host, port, next_login, login_stats, options['timeout']))
+                  for _ in range(options['login_concurrency'])]
+        await asyncio.gather(*clients)
+        done.set()
+        await asyncio.gather(*logins)
+        return stats, login_stats
+
+    @staticmethod
+    async def client(host, port, next_request, stats, timeout):
+        reader = writer = None
+        while (request := next_request()) is not None:
+            began = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host, port)
+                writer.write(request)
+                status, close = await asyncio.wait_for(read_response(reader), timeout)
+            except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                stats.errors += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                continue
+            stats.latencies.append(time.perf_counter() - began)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if close:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
@@ -0,0 +1,62 @@
+# products/management/commands/process_orders.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.models import Order
+from products.pipeline import OrderPipeline
+from products.tasks import get_broker
+
+
+class Command(BaseCommand):
+    help = (
+        "Works the order pipeline queue: a standalone worker for ORDER_QUEUE_BROKER=sqlite, "
+        "or a one-off drain with --once (with the local broker, only of what --requeue-pending queues)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=max(getattr(settings, 'ORDER_PIPELINE_WORKERS', 1), 1),
+                            help="Worker threads (default: ORDER_PIPELINE_WORKERS, at least 1).")
+        parser.add_argument('--once', action='store_true', help="Process what is queued, then exit.")
+        parser.add_argument('--requeue-pending', action='store_true',
+                            help="First queue every order still pending, e.g. after a lost in-memory queue.")
+        parser.add_argument('--pending-for', type=int, default=0, metavar='SECONDS',
+                            help="With --requeue-pending, only orders pending at least this long: run from cron "
+                                 "(e.g. --once --requeue-pending --pending-for 600) to pick up orders whose "
+                                 "submit failed after checkout.")
+
+    def handle(self, *args, **options):
+        pipeline = OrderPipeline(
+            get_broker(settings.ORDER_QUEUE_BROKER, path=settings.ORDER_QUEUE_PATH),
+            workers=0 if options['once'] else options['workers'],
+            batch_size=settings.ORDER_PIPELINE_BATCH_SIZE,
+            max_attempts=settings.ORDER_PIPELINE_MAX_ATTEMPTS,
+        )
+
+        if options['requeue_pending']:
+            pending = Order.objects.filter(status='pending')
+            if options['pending_for']:
+                pending = pending.filter(ordered_at__lte=timezone.now() - timedelta(seconds=options['pending_for']))
+            order_ids = list(pending.order_by('pk').values_list('pk', flat=True))
+            for start in range(0, len(order_ids), pipeline.batch_size):
+                pipeline.enqueue(order_ids[start:start + pipeline.batch_size])
+            self.stdout.write(f"Queued {len(order_ids)} pending orders.")
+
+        if options['once']:
+            processed = pipeline.drain()
+            self.stdout.write(f"Processed {processed} jobs.")
+            return
+
+        pipeline.start()
+        self.stdout.write(f"Working the {pipeline.broker.kind} order queue with {pipeline.workers} threads; Ctrl-C to stop.")
+        try:
+            while not pipeline.stopping.wait(60):
+                stats = pipeline.get_stats()
+                self.stdout.write(f"Queue depth: {stats['depth']}, done: {stats['end_to_end']['count']}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pipeline.stop()
@@ -0,0 +1,21 @@
+# products/management/commands/purge_idempotency_keys.py
+
+from django.core.management.base import BaseCommand
+
+from products.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Deletes expired idempotency keys in batches; run it from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Keys deleted per statement.")
+
+    def handle(self, *args, **options):
+        purged = 0
+        while True:
+            deleted = purge_expired(options['batch_size'])
+            purged += deleted
+            if deleted < options['batch_size']:
+                break
+        self.stdout.write(f"Deleted {purged} expired idempotency keys.")
@@ -0,0 +1,29 @@
+# products/management/commands/recompute_summaries.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.summaries import find_drift, recompute_summaries
+
+
+class Command(BaseCommand):
+    help = "Reports carts and orders whose stored summaries drifted from their items, and optionally fixes them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite the drifted summaries from their items.")
+        parser.add_argument('--all', action='store_true', help="With --fix, rewrite every summary, not just drifted ones.")
+
+    def handle(self, *args, **options):
+        carts, orders = find_drift()
+        cart_ids = list(carts.values_list('pk', flat=True))
+        order_ids = list(orders.values_list('pk', flat=True))
+        self.stdout.write(f"Drifted summaries: {len(cart_ids)} carts, {len(order_ids)} orders.")
+
+        if not options['fix']:
+            return
+        with transaction.atomic():
+            if options['all']:
+                fixed_carts, fixed_orders = recompute_summaries()
+            else:
+                fixed_carts, fixed_orders = recompute_summaries(cart_ids, order_ids)
+        self.stdout.write(f"Recomputed summaries: {fixed_carts} carts, {fixed_orders} orders.")
@@ -0,0 +1,26 @@
+# products/management/commands/shard_stock.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.inventory import shard_product
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Spreads a hot product's stock counter over several rows so concurrent buyers lock different ones; "
+        "0 shards moves it back onto the product row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('shards', type=int, help="Number of stock shards (0 to unshard).")
+
+    def handle(self, *args, **options):
+        if not 0 <= options['shards'] <= 256:
+            raise CommandError("Shards must be between 0 and 256.")
+        try:
+            total = shard_product(options['product_id'], options['shards'])
+        except Product.DoesNotExist:
+            raise CommandError(f"Product with ID {options['product_id']} not found.")
+        self.stdout.write(f"Product {options['product_id']}: {total} units over {options['shards'] or 'no'} shards.")
@@ -0,0 +1,21 @@
+# products/management/commands/sweep_reservations.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.inventory import ReservationSweeper
+
+
+class Command(BaseCommand):
+    help = (
+        "Returns expired cart reservations to stock and refreshes sharded products' stock totals; "
+        "for cron, when INVENTORY_SWEEP_INTERVAL=0 keeps the web processes from sweeping."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.INVENTORY_SWEEP_BATCH_SIZE,
+                            help="Reservations released per transaction.")
+
+    def handle(self, *args, **options):
+        expired, refreshed = ReservationSweeper(interval=0, batch_size=options['batch_size']).sweep()
+        self.stdout.write(f"Released {expired} expired reservations; refreshed {refreshed} sharded stock totals.")
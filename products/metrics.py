@@ -0,0 +1,10 @@
+# products/metrics.py
+
+
+def percentile(sorted_values, fraction):
+    """
+    The value `fraction` of the way through `sorted_values` (nearest rank), or 0.0 if there are none.
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
@@ -0,0 +1,192 @@
+# products/middleware.py
+
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Optional dependency: only gzip is offered
+    brotli = None
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from . import routers
+
+COMPRESSIBLE_CONTENT_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript', 'text/')
+UNCOMPRESSED_STATUS_CODES = {204, 206, 304}
+QUALITY_RE = re.compile(r'q\s*=\s*([0-9.]+)')
+
+
+def accepted_encodings(header):
+    """
+    Returns the content codings an `Accept-Encoding` header accepts (quality above zero).
+    """
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        match = QUALITY_RE.search(params)
+        try:
+            quality = float(match.group(1)) if match else 1.0
+        except ValueError:
+            quality = 0.0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+# ----------------- Compressors -----------------
+
+class GzipCompressor:
+    encoding = 'gzip'
+
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor:
+    encoding = 'br'
+
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+# ----------------- Middleware -----------------
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Opt-in gzip/brotli compression of API responses, enabled with `RESPONSE_COMPRESSION = True`.
+    - Only JSON, NDJSON and text bodies are compressed, and only from `RESPONSE_COMPRESSION_MIN_SIZE`
+      bytes up: small payloads are not worth the CPU.
+    - 304s (and 204/206 responses) and responses that already carry a `Content-Encoding` pass through.
+    - Brotli is preferred when the client accepts it and the `brotli` package is installed.
+    - Streaming responses are compressed on the fly, without a size check.
+    - Compressed responses get a weak ETag, since their bytes differ from the uncompressed ones.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'RESPONSE_COMPRESSION', False):
+            raise MiddlewareNotUsed
+        self.min_size = getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024)
+        self.gzip_level = getattr(settings, 'RESPONSE_COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = getattr(settings, 'RESPONSE_COMPRESSION_BROTLI_QUALITY', 5)
+        super().__init__(get_response)
+
+    def is_compressible(self, response):
+        if response.status_code < 200 or response.status_code in UNCOMPRESSED_STATUS_CODES:
+            return False
+        if response.has_header('Content-Encoding'):
+            return False
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return False
+        return response.streaming or len(response.content) >= self.min_size
+
+    def get_compressor(self, request):
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            return BrotliCompressor(self.brotli_quality)
+        if 'gzip' in accepted:
+            return GzipCompressor(self.gzip_level)
+        return None
+
+    def process_response(self, request, response):
+        if not self.is_compressible(response):
+            return response
+        # The representation depends on Accept-Encoding from here on, compressed or not.
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressor = self.get_compressor(request)
+        if compressor is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.compress_async_stream(compressor, response.streaming_content)
+            else:
+                response.streaming_content = self.compress_stream(compressor, response.streaming_content)
+            response.headers.pop('Content-Length', None)
+        else:
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = compressor.encoding
+        return response
+
+    @staticmethod
+    def compress_stream(compressor, chunks):
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    async def compress_async_stream(compressor, chunks):
+        async for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scopes `PrimaryReplicaRouter` decisions to the request (see products/routers.py), enabled when
+    `DATABASE_REPLICAS` lists at least one replica alias.
+    - Runs after authentication middleware, whose session reads therefore stay on the primary.
+    - Works for sync and async views; the routing state is a context variable, so it follows the
+      request into `sync_to_async` threads.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not routers.get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = routers.RoutingState.for_request(request)
+        token = routers.activate(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        state.finish(request)
+        return response
+
+    async def __acall__(self, request):
+        # Reading the token, session and pin cache may block, so it runs off the event loop.
+        state = await sync_to_async(routers.RoutingState.for_request)(request)
+        token = routers.activate(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        await sync_to_async(state.finish)(request)
+        return response
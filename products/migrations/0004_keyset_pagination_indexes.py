@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_rename_total_amount_order_total_price_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['cart', 'added_at', 'id'], name='products_ca_cart_id_9b5776_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'ordered_at', 'id'], name='products_or_user_id_5e5ab0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='products_pr_name_37bd5c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='products_pr_price_dbec84_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='products_pr_created_3be21c_idx'),
+        ),
+    ]
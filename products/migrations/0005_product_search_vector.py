@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:07
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Keeps search_vector in sync with name/description for every write path,
+# including QuerySet.update() and bulk_create(), which bypass model signals.
+SEARCH_VECTOR_TRIGGER = """
+CREATE FUNCTION products_product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector_update();
+
+-- Backfill existing rows through the trigger.
+UPDATE products_product SET name = name;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product;
+DROP FUNCTION IF EXISTS products_product_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='product_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
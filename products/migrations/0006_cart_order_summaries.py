@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:17
+
+from django.db import migrations, models
+
+# Backfills the summaries from existing items; afterwards they are maintained
+# incrementally by the cart and checkout views.
+BACKFILL_SUMMARIES = """
+UPDATE products_cart SET
+    item_count = coalesce((
+        SELECT sum(ci.quantity) FROM products_cartitem ci WHERE ci.cart_id = products_cart.id
+    ), 0),
+    subtotal = coalesce((
+        SELECT sum(ci.quantity * p.price)
+        FROM products_cartitem ci JOIN products_product p ON p.id = ci.product_id
+        WHERE ci.cart_id = products_cart.id
+    ), 0);
+
+UPDATE products_order SET
+    item_count = coalesce((
+        SELECT sum(oi.quantity) FROM products_orderitem oi WHERE oi.order_id = products_order.id
+    ), 0);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(BACKFILL_SUMMARIES, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_cart_order_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='products.cart')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='products_st_expires_817182_idx'), models.Index(fields=['product'], name='products_st_product_979278_idx')],
+                'unique_together': {('cart', 'product')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('stock', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='products.product')),
+            ],
+            options={
+                'unique_together': {('product', 'shard')},
+            },
+        ),
+    ]
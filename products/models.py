@@ -1,5 +1,8 @@
 # products/models.py
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models import Index, Q
 from django.utils.text import slugify
@@ -38,9 +41,14 @@ class Product(models.Model):
         null=True, blank=True, related_name='products'
     )
     stock = models.IntegerField(default=0)
+    # Hot SKUs keep their stock in this many `StockShard` rows (see products/inventory.py);
+    # `stock` is then a copy of their sum. 0 keeps the stock on this row.
+    stock_shards = models.PositiveSmallIntegerField(default=0)
     available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger from name (weight A) and description (weight B)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['name']
@@ -53,14 +61,36 @@ class Product(models.Model):
             Index(fields=["category"]),
             Index(fields=["-created_at"]),
             Index(fields=["available", "price"]),
+            # Keyset pagination: one (field, id) index per allowed ordering
+            Index(fields=["name", "id"]),
+            Index(fields=["price", "id"]),
+            Index(fields=["created_at", "id"]),
+            # Full-text and trigram search (see products/search.py)
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            GinIndex(fields=["name"], name="product_name_trgm_idx", opclasses=["gin_trgm_ops"]),
         ]
 
     def __str__(self):
         return self.name
 
+# --- StockShard Model ---
+class StockShard(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    stock = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'shard')
+
+    def __str__(self):
+        return f"{self.stock} x {self.product_id} in shard {self.shard}"
+
 # --- Cart Model ---
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    # Maintained incrementally (see products/summaries.py): total quantity and sum of quantity * price
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -79,11 +109,34 @@ class CartItem(models.Model):
         indexes = [
             Index(fields=["cart"]),
             Index(fields=["product"]),
+            Index(fields=["cart", "added_at", "id"]),  # Keyset pagination within a cart
         ]
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in {self.cart.user.username}'s cart"
 
+# --- StockReservation Model ---
+class StockReservation(models.Model):
+    """
+    Units of a product held for a cart until `expires_at`; taken off the product's stock counter
+    when made, returned by the expiry sweep or turned into an order at checkout.
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('cart', 'product')
+        indexes = [
+            Index(fields=["expires_at"]),  # Expiry sweep
+            Index(fields=["product"]),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for cart {self.cart_id}"
+
 # --- Order Model ---
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -96,6 +149,7 @@ class Order(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    item_count = models.PositiveIntegerField(default=0)  # Total quantity, set at checkout
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
     ordered_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -108,6 +162,7 @@ class Order(models.Model):
             Index(fields=["ordered_at"]),
             Index(fields=["-updated_at"]),
             Index(fields=["user", "status"]),
+            Index(fields=["user", "ordered_at", "id"]),  # Keyset pagination of a user's orders
         ]
 
     def __str__(self):
@@ -130,3 +185,26 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Order {self.order.id}"
+
+# --- IdempotencyKey Model ---
+class IdempotencyKey(models.Model):
+    """
+    A client's `Idempotency-Key` for one write, with the response to replay for its retries until
+    `expires_at` (see products/idempotency.py). `fingerprint` hashes the request the key was used for.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)  # Null until the request commits
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'key')
+        indexes = [
+            Index(fields=["expires_at"]),  # Bulk expiry
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} of user {self.user_id}"
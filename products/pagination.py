@@ -0,0 +1,172 @@
+# products/pagination.py
+
+import json
+from decimal import InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination that follows the view's ordering.
+    - Honours `?ordering=` through the view's OrderingFilter, falling back to the view's
+      `ordering` and then the model's default ordering.
+    - Appends `id` as a tie-breaker so every ordering matches a composite `(field, id)` index.
+    - The cursor holds each ordering field with the last row's value for it, `id` included, and pages are
+      fetched with `WHERE field >= v AND (field > v OR (field = v AND id > k)) LIMIT n`. Positions
+      are unique, so DRF's tie-skipping offset is never needed: there is no `COUNT(*)` and no
+      `OFFSET` scan no matter how deep the client paginates or how many rows share a value.
+    - A cursor made for another ordering, or holding a value its field cannot parse, is a 404
+      `Invalid cursor` like any other malformed cursor.
+    """
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        default_ordering = getattr(view, 'ordering', None) or queryset.model._meta.ordering
+        if default_ordering:
+            self.ordering = default_ordering
+        ordering = list(super().get_ordering(request, queryset, view))
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return tuple(ordering)
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        # Positions are unique, so an offset only ever comes from a hand-edited cursor.
+        return cursor and cursor._replace(offset=0)
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            name = field.lstrip('-')
+            position.append([field, str(instance[name] if isinstance(instance, dict) else getattr(instance, name))])
+        return json.dumps(position)
+
+    def decode_position(self, queryset, position):
+        """
+        The cursor's values parsed by their model fields, if it was made for the current ordering.
+        """
+        try:
+            position = json.loads(position)
+            fields = [field for field, _ in position]
+            values = [value for _, value in position]
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if fields != list(self.ordering) or not all(isinstance(value, str) for value in values):
+            raise NotFound(self.invalid_cursor_message)
+
+        opts = queryset.model._meta
+        parsed = []
+        try:
+            for field, value in zip(fields, values):
+                model_field = opts.pk if field.lstrip('-') == 'pk' else opts.get_field(field.lstrip('-'))
+                value = model_field.to_python(value)
+                # Range and digit checks, so the database is never handed a value it cannot compare.
+                model_field.run_validators(value)
+                parsed.append(value)
+        except (ValidationError, InvalidOperation, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return parsed
+
+    def filter_after(self, queryset, position, reverse):
+        """
+        Rows strictly after `position` in the (possibly reversed) ordering, as a lexicographic
+        comparison over the ordering fields. The leading `>=`/`<=` bound lets the planner range-scan
+        the `(field, id)` index instead of evaluating the OR over every row.
+        """
+        values = self.decode_position(queryset, position)
+        lookups = [
+            (field.lstrip('-'), 'lt' if reverse != field.startswith('-') else 'gt')
+            for field in self.ordering
+        ]
+        after, equal = Q(), Q()
+        for (name, direction), value in zip(lookups, values):
+            after |= equal & Q(**{f'{name}__{direction}': value})
+            equal &= Q(**{name: value})
+        name, direction = lookups[0]
+        return queryset.filter(Q(**{f'{name}__{direction}e': values[0]}), after)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, current_position = (self.cursor.reverse, self.cursor.position) if self.cursor else (False, None)
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if current_position is not None:
+            queryset = self.filter_after(queryset, current_position, reverse)
+
+        # One extra row tells whether a page follows this one.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = current_position is not None, current_position
+            self.has_previous, self.previous_position = following_position is not None, following_position
+        else:
+            self.has_next, self.next_position = following_position is not None, following_position
+            self.has_previous, self.previous_position = current_position is not None, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class KeysetOrPageNumberPagination(BasePagination):
+    """
+    Page-number pagination by default, keyset pagination on request.
+    - `?pagination=cursor` (or any `?cursor=` link returned by a previous page) switches to keyset mode.
+    - Existing clients using `?page=` keep the `count`/`next`/`previous`/`results` response unchanged.
+    """
+    mode_query_param = 'pagination'
+    page_number_class = PageNumberPagination
+    cursor_class = KeysetPagination
+
+    def __init__(self):
+        self.paginator = self.page_number_class()
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.cursor_class() if self.use_cursor(request) else self.page_number_class()
+        return self.paginator.paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.paginator.get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    def get_results(self, data):
+        return data['results']
+
+    def get_schema_operation_parameters(self, view):
+        parameters = self.page_number_class().get_schema_operation_parameters(view)
+        parameters += self.cursor_class().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.mode_query_param,
+            'required': False,
+            'in': 'query',
+            'description': "Set to 'cursor' for keyset pagination.",
+            'schema': {'type': 'string', 'enum': ['cursor']},
+        })
+        return parameters
@@ -0,0 +1,33 @@
+# products/parsers.py
+
+import io
+
+try:
+    import orjson
+except ImportError:  # Optional dependency: the stdlib parser is used instead
+    orjson = None
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+
+class FastJSONParser(JSONParser):
+    """
+    Drop-in `JSONParser` built on orjson.
+    - UTF-8 bodies are decoded by orjson; anything it rejects is handed to the stdlib parser,
+      so error messages and edge cases (`NaN` under `STRICT_JSON`, wide integers) are unchanged.
+    - Falls back to the stdlib parser when orjson is not installed, for other charsets,
+      and when `STRICT_JSON` is off.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,322 @@
+# products/pipeline.py
+
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .inventory import refresh_sharded_stock
+from .metrics import percentile
+from .models import Order, Product
+from .tasks import get_broker
+
+logger = logging.getLogger(__name__)
+
+# Post-checkout stages, in order; each job moves to the next stage once its batch succeeds.
+STAGES = ('reconcile_stock', 'process', 'notify')
+
+# Statuses an order may move to from each status.
+ORDER_TRANSITIONS = {
+    'pending': ('processing', 'cancelled'),
+    'processing': ('shipped', 'cancelled'),
+    'shipped': ('delivered',),
+}
+
+PIPELINE_SETTINGS = {
+    'ORDER_QUEUE_BROKER',
+    'ORDER_QUEUE_PATH',
+    'ORDER_PIPELINE_WORKERS',
+    'ORDER_PIPELINE_BATCH_SIZE',
+    'ORDER_PIPELINE_MAX_ATTEMPTS',
+}
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+# ----------------- Stages -----------------
+#
+# Each stage handles a whole batch of orders in a fixed number of queries, and is safe to run
+# again for the same orders (a retried batch, or orders requeued by `process_orders`).
+
+def transition_orders(order_ids, status):
+    """
+    Moves orders to `status` with one `bulk_update`, skipping those whose current status does not
+    allow it (see `ORDER_TRANSITIONS`). Returns the orders that moved.
+    """
+    sources = [source for source, targets in ORDER_TRANSITIONS.items() if status in targets]
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update().filter(pk__in=order_ids, status__in=sources)
+            .only('id', 'status', 'updated_at').order_by('id')
+        )
+        now = timezone.now()
+        for order in orders:
+            order.status = status
+            order.updated_at = now  # bulk_update skips auto_now
+        Order.objects.bulk_update(orders, ['status', 'updated_at'])
+    return orders
+
+
+def reconcile_stock(order_ids):
+    """
+    Brings the `stock` copy of the sharded products the orders bought in line with their shards,
+    with one UPDATE, so listings and `?in_stock=` show the sale without waiting for the sweeper.
+    `available` is left alone: it is the admin's on-sale switch, while being sold out is read from
+    `stock` (`?in_stock=false`), so a restocked product is back in stock with no further step.
+    """
+    return refresh_sharded_stock(Product.objects.filter(orderitem__order__in=order_ids).values('pk'))
+
+
+def process_orders(order_ids):
+    return transition_orders(order_ids, 'processing')
+
+
+def notify_customers(order_ids):
+    """
+    Emails a confirmation for each order, over one mail connection; users without an address are skipped.
+    """
+    orders = Order.objects.filter(pk__in=order_ids).select_related('user').only(
+        'id', 'status', 'total_price', 'item_count', 'user__username', 'user__email',
+    )
+    messages = [
+        (
+            f"Order {order.pk} confirmed",
+            f"Hi {order.user.username},\n\nWe received your order {order.pk} of {order.item_count} "
+            f"item(s) totalling {order.total_price}. Its status is now: {order.get_status_display()}.",
+            None,  # DEFAULT_FROM_EMAIL
+            [order.user.email],
+        )
+        for order in orders if order.user.email
+    ]
+    return send_mass_mail(messages) if messages else 0
+
+
+STAGE_HANDLERS = {
+    'reconcile_stock': reconcile_stock,
+    'process': process_orders,
+    'notify': notify_customers,
+}
+
+
+# ----------------- Metrics -----------------
+
+def summarize(samples):
+    """
+    p50/p95/max of a list of durations in seconds, in milliseconds.
+    """
+    if not samples:
+        return {'count': 0, 'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+    ordered = sorted(samples)
+    return {'count': len(ordered), 'p50_ms': round(percentile(ordered, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 2), 'max_ms': round(ordered[-1] * 1000, 2)}
+
+
+class PipelineMetrics:
+    """
+    Per-stage counters and latencies for this process, over the last `sample_size` jobs per stage.
+    - `wait`: time a job spent queued before its batch started.
+    - `run`: time a whole batch took in the stage handler.
+    - `end_to_end`: time from checkout to the last stage finishing, per order.
+    """
+    sample_size = 1000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {
+                stage: {'jobs': 0, 'batches': 0, 'retries': 0, 'dropped': 0,
+                        'wait': deque(maxlen=self.sample_size), 'run': deque(maxlen=self.sample_size)}
+                for stage in STAGES
+            }
+            self.end_to_end = deque(maxlen=self.sample_size)
+
+    def record_batch(self, stage, waits, run):
+        with self.lock:
+            stats = self.stages[stage]
+            stats['jobs'] += len(waits)
+            stats['batches'] += 1
+            stats['wait'].extend(waits)
+            stats['run'].append(run)
+
+    def record_failure(self, stage, retried, dropped):
+        with self.lock:
+            self.stages[stage]['retries'] += retried
+            self.stages[stage]['dropped'] += dropped
+
+    def record_done(self, latencies):
+        with self.lock:
+            self.end_to_end.extend(latencies)
+
+    def report(self):
+        with self.lock:
+            return {
+                'stages': {
+                    stage: {
+                        'jobs': stats['jobs'],
+                        'batches': stats['batches'],
+                        'retries': stats['retries'],
+                        'dropped': stats['dropped'],
+                        'wait': summarize(list(stats['wait'])),
+                        'run': summarize(list(stats['run'])),
+                    }
+                    for stage, stats in self.stages.items()
+                },
+                'end_to_end': summarize(list(self.end_to_end)),
+            }
+
+
+# ----------------- Pipeline -----------------
+
+class OrderPipeline:
+    """
+    Runs committed orders through `STAGES` on a task queue, outside the checkout request.
+    - Workers take up to `batch_size` queued jobs at a time and run each stage once for all of
+      their orders, so a burst of checkouts costs a few queries per batch rather than per order.
+    - A failed batch is retried up to `max_attempts` times per job, then dropped (and counted).
+    - With `workers=0` nothing runs in this process: jobs wait for `drain()` or `manage.py process_orders`.
+    - Delivery is at-least-once: a retried notify batch can email an order twice.
+    """
+
+    def __init__(self, broker, workers=1, batch_size=100, max_attempts=3):
+        self.broker = broker
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.metrics = PipelineMetrics()
+        self.threads = []
+        self.stopping = threading.Event()
+        self.start_lock = threading.Lock()
+
+    def enqueue(self, order_ids, stage=STAGES[0]):
+        self.broker.put(stage, {'orders': list(order_ids), 'since': time.time()})
+        self.start()
+
+    def start(self):
+        # Workers start with the first order, so management commands and migrations never spawn them.
+        if self.workers <= 0 or self.threads:
+            return
+        with self.start_lock:
+            if self.threads or self.stopping.is_set():
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self.work, name=f'order-pipeline-{index}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def stop(self, timeout=5):
+        # Workers notice within one `take` timeout and finish their current batch first.
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.broker.close()
+
+    def work(self):
+        while not self.stopping.is_set():
+            jobs = self.broker.take(self.batch_size, timeout=1)
+            if not jobs:
+                continue
+            try:
+                self.run_batch(jobs)
+            finally:
+                # Django only closes connections at the end of requests; this thread has none.
+                connections.close_all()
+
+    def drain(self):
+        """
+        Processes queued jobs in the calling thread until the queue is empty; returns how many ran.
+        """
+        processed = 0
+        while True:
+            jobs = self.broker.take(self.batch_size, timeout=0)
+            if not jobs:
+                return processed
+            processed += self.run_batch(jobs)
+
+    def run_batch(self, jobs):
+        by_stage = {}
+        for job in jobs:
+            by_stage.setdefault(job.stage, []).append(job)
+        processed = 0
+        for stage, stage_jobs in by_stage.items():
+            if self.run_stage(stage, stage_jobs):
+                processed += len(stage_jobs)
+        return processed
+
+    def run_stage(self, stage, jobs):
+        started = time.time()
+        order_ids = sorted({order_id for job in jobs for order_id in job.payload['orders']})
+        try:
+            STAGE_HANDLERS[stage](order_ids)
+        except Exception:
+            logger.exception("Order pipeline stage %s failed for orders %s", stage, order_ids)
+            retry = [job for job in jobs if job.attempts + 1 < self.max_attempts]
+            drop = [job for job in jobs if job.attempts + 1 >= self.max_attempts]
+            for job in retry:
+                self.broker.retry(job)
+            self.broker.ack(drop)
+            self.metrics.record_failure(stage, len(retry), len(drop))
+            return False
+
+        finished = time.time()
+        self.metrics.record_batch(stage, [started - job.enqueued_at for job in jobs], finished - started)
+        next_stage = STAGES.index(stage) + 1
+        if next_stage < len(STAGES):
+            for job in jobs:
+                self.broker.put(STAGES[next_stage], job.payload)
+        else:
+            self.metrics.record_done([finished - job.payload['since'] for job in jobs])
+        self.broker.ack(jobs)
+        return True
+
+    def get_stats(self):
+        depth = self.broker.depth()
+        return {
+            'broker': self.broker.kind,
+            'workers': sum(thread.is_alive() for thread in self.threads),
+            'depth': {stage: depth.get(stage, 0) for stage in STAGES},
+            **self.metrics.report(),
+        }
+
+
+def get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = OrderPipeline(
+                    get_broker(
+                        getattr(settings, 'ORDER_QUEUE_BROKER', 'local'),
+                        path=getattr(settings, 'ORDER_QUEUE_PATH', None),
+                    ),
+                    workers=getattr(settings, 'ORDER_PIPELINE_WORKERS', 1),
+                    batch_size=getattr(settings, 'ORDER_PIPELINE_BATCH_SIZE', 100),
+                    max_attempts=getattr(settings, 'ORDER_PIPELINE_MAX_ATTEMPTS', 3),
+                )
+    return _pipeline
+
+
+@receiver(setting_changed)
+def reset_pipeline(setting, **kwargs):
+    global _pipeline
+    if setting in PIPELINE_SETTINGS and _pipeline is not None:
+        with _pipeline_lock:
+            _pipeline.stop()
+            _pipeline = None
+
+
+def submit_orders(order_ids):
+    """
+    Queues committed orders for post-processing; call it from `transaction.on_commit`.
+    """
+    get_pipeline().enqueue(order_ids)
@@ -0,0 +1,41 @@
+# products/renderers.py
+
+try:
+    import orjson
+except ImportError:  # Optional dependency: the stdlib renderer is used instead
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Date/time values go through DRF's encoder (UTC datetimes end in `Z`, not `+00:00`).
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+encode_default = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in `JSONRenderer` built on orjson, producing the same bytes as the stdlib renderer.
+    - Anything orjson does not encode natively (Decimal, datetimes, lazy strings, querysets, ...)
+      goes through DRF's `JSONEncoder.default`, exactly as with the stdlib encoder.
+    - Falls back to the stdlib renderer when orjson is not installed, for indented output,
+      for `UNICODE_JSON = False`/`COMPACT_JSON = False`, and for values orjson rejects
+      (such as integers wider than 64 bits).
+    - Not covered: non-finite floats render as `null` instead of raising, and very large or
+      small floats may use a different exponent notation. Serializer payloads carry neither.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+        except TypeError:  # orjson.JSONEncodeError
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Like the stdlib renderer, escape the line separators that are invalid in JavaScript.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,165 @@
+# products/routers.py
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+PRIMARY = 'default'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Routing state of the request being handled; None outside requests (management commands,
+# shell, background work), where everything goes to the primary.
+_request_state = ContextVar('replica_routing_state', default=None)
+
+
+def get_replicas():
+    """
+    The aliases safe reads may go to. Aliases that resolve to the primary's own database (as test
+    mirrors do) are left out: a second connection to it would only miss rows written in the
+    primary connection's open transaction.
+    """
+    primary = connections[PRIMARY].settings_dict
+    return [
+        alias for alias in getattr(settings, 'DATABASE_REPLICAS', [])
+        if alias not in connections or not same_database(connections[alias].settings_dict, primary)
+    ]
+
+
+def same_database(first, second):
+    return all(first.get(key) == second.get(key) for key in ('HOST', 'PORT', 'NAME'))
+
+
+def pin_key(user_id):
+    return f"db:primary-pin:user:{user_id}"
+
+
+def pin_to_primary(user_id):
+    """
+    Sends the user's reads to the primary for the next `REPLICA_PIN_SECONDS`,
+    until the replicas have caught up with what they just wrote.
+    """
+    cache.set(pin_key(user_id), True, timeout=getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(user_id):
+    return user_id is not None and cache.get(pin_key(user_id)) is not None
+
+
+def request_user_id(request):
+    """
+    The id of the user making the request, ahead of authentication: read from a valid JWT access
+    token (no user lookup), or from the session of a session-authenticated user.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is not None:
+        raw_token = authentication.get_raw_token(header)
+        if raw_token is None:
+            return None
+        try:
+            return authentication.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+        except (InvalidToken, TokenError):
+            return None
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return session.get(SESSION_KEY)
+    return None
+
+
+class RoutingState:
+    """
+    Where one request's queries go.
+    - `use_primary` is set for unsafe methods and for users pinned by a recent write;
+      otherwise reads go to a replica.
+    - `wrote` records that a write was routed, which pins the user once the response is out.
+    """
+
+    def __init__(self, user_id, use_primary):
+        self.user_id = user_id
+        self.use_primary = use_primary
+        self.wrote = False
+        self.replica = None
+
+    @classmethod
+    def for_request(cls, request):
+        user_id = request_user_id(request)
+        use_primary = request.method not in SAFE_METHODS or is_pinned(user_id)
+        return cls(user_id, use_primary)
+
+    def finish(self, request):
+        """
+        Pins the user to the primary after a request that wrote (or could have: any unsafe method).
+        """
+        if not self.wrote and request.method in SAFE_METHODS:
+            return
+        user_id = self.user_id
+        if user_id is None:
+            # E.g. a session login during this request.
+            user = getattr(request, 'user', None)
+            user_id = user.pk if user is not None and user.is_authenticated else None
+        if user_id is not None:
+            pin_to_primary(user_id)
+
+    def read_alias(self):
+        if self.use_primary or self.wrote:
+            return PRIMARY
+        if self.replica is None:
+            # One replica per request, so all of its reads see the same snapshot.
+            self.replica = random.choice(get_replicas())
+        return self.replica
+
+
+def reading_from_replica():
+    """
+    Whether the current request's reads go to a replica, which may not have the latest writes yet.
+    """
+    state = _request_state.get()
+    return state is not None and not (state.use_primary or state.wrote) and bool(get_replicas())
+
+
+def activate(state):
+    return _request_state.set(state)
+
+
+def deactivate(token):
+    _request_state.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads in safe requests to a replica and everything else to the primary (`default`).
+    - Only requests that went through `ReplicaRoutingMiddleware` read from replicas; queries outside
+      a request, including those of streaming responses iterated after the view returns, use the primary.
+    - Unsafe requests, and the reads after a write in the same request, stay on the primary.
+    - A user who wrote keeps reading from the primary for `REPLICA_PIN_SECONDS` (read-your-writes).
+    - Related objects are read from the database their instance came from.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        state = _request_state.get()
+        if state is None or not get_replicas():
+            return PRIMARY
+        return state.read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
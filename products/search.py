@@ -0,0 +1,58 @@
+# products/search.py
+
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Exists, F, Q
+from rest_framework import filters
+
+# Text search configuration used by the `products_product.search_vector` trigger (migration 0005).
+SEARCH_CONFIG = 'english'
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Full-text search for products, keeping the `?search=` contract of DRF's SearchFilter.
+    - Matches the trigger-maintained `search_vector` (name weighted 'A', description 'B')
+      through its GIN index, with every term treated as a prefix.
+    - When nothing matches, falls back to trigram word similarity on `name`, which catches typos.
+      The fallback filters with the `%>` operator so it can use the GIN `gin_trgm_ops` index; its
+      threshold is the connection's `pg_trgm.word_similarity_threshold` (`SEARCH_TRIGRAM_THRESHOLD`).
+    - Both run as one query: the fallback branch only applies when the full-text branch has no rows.
+    - Orders by rank (then similarity); an explicit `?ordering=` still wins.
+    - On non-PostgreSQL databases it behaves exactly like SearchFilter.
+    """
+    @staticmethod
+    def build_tsquery(terms):
+        """
+        Turns search terms into a raw tsquery where each word is a prefix match,
+        e.g. ['gaming', 'lap'] -> 'gaming:* & lap:*'.
+        """
+        words = [word for term in terms for word in re.findall(r'\w+', term)]
+        return ' & '.join(f"{word}:*" for word in words)
+
+    def filter_queryset(self, request, queryset, view):
+        if connection.vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        text = ' '.join(terms)
+        similar = Q(name__trigram_word_similar=text)
+        ordering = ('-search_similarity', *queryset.model._meta.ordering, 'id')
+        tsquery = self.build_tsquery(terms)
+        if not tsquery:
+            return queryset.filter(similar).annotate(
+                search_similarity=TrigramWordSimilarity(text, 'name')
+            ).order_by(*ordering)
+
+        # Nothing matching the full-text query most likely means a typo: match by trigram similarity instead.
+        query = SearchQuery(tsquery, search_type='raw', config=SEARCH_CONFIG)
+        matches = queryset.filter(search_vector=query)
+        return queryset.filter(Q(search_vector=query) | (similar & ~Exists(matches))).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            search_similarity=TrigramWordSimilarity(text, 'name'),
+        ).order_by('-search_rank', *ordering)
@@ -1,9 +1,153 @@
 # products/serializers.py
 
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 from rest_framework import serializers
+from .fieldsets import ALL_FIELDS
 from .models import Category, Product, Cart, CartItem, Order, OrderItem
 
-class CategorySerializer(serializers.ModelSerializer):
+
+class EagerLoadingMixin:
+    """
+    Lets a serializer declare the relations it renders so views can eager-load them.
+    - `select_related_fields` lists forward FK/one-to-one relations rendered by a nested serializer.
+    - `prefetch_related_fields` lists reverse/many relations rendered by a nested `many=True` serializer.
+    - `field_sources` maps computed fields to the model columns they read.
+    Nested serializers are followed recursively, so a parent only declares its own relations.
+
+    An optional `fieldset` (see `products.fieldsets`) trims both the rendered fields and the eager-loading
+    plan: relations that are not expanded render as primary keys and are not joined, and the selected
+    columns are loaded with `only()`.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    field_sources = {}
+
+    def __init__(self, *args, fieldset=None, **kwargs):
+        self.fieldset = fieldset
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.fieldset
+        if fieldset is None:
+            return fields
+
+        fields = {name: field for name, field in fields.items() if fieldset.includes(name)}
+        for name, field in fields.items():
+            nested = getattr(field, 'child', field)
+            if not isinstance(nested, EagerLoadingMixin):
+                continue
+            if fieldset.expands(name):
+                nested.fieldset = fieldset.nested(name)
+            else:
+                source = {'source': field.source} if field.source else {}
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=nested is not field, **source)
+        return fields
+
+    @classmethod
+    def _nested_serializer_class(cls, field_name):
+        field = cls._declared_fields.get(field_name)
+        field = getattr(field, 'child', field)
+        return type(field) if isinstance(field, EagerLoadingMixin) else None
+
+    @classmethod
+    def get_select_related(cls, prefix='', fieldset=None):
+        """
+        Returns the flattened `select_related` lookups for this serializer and its nested serializers.
+        """
+        fieldset = fieldset or ALL_FIELDS
+        lookups = []
+        for field_name in cls.select_related_fields:
+            if not fieldset.expands(field_name):
+                continue
+            lookup = f"{prefix}{field_name}"
+            lookups.append(lookup)
+            nested = cls._nested_serializer_class(field_name)
+            if nested is not None:
+                lookups.extend(nested.get_select_related(f"{lookup}__", fieldset.nested(field_name)))
+        return lookups
+
+    @classmethod
+    def get_prefetch_related(cls, fieldset=None):
+        """
+        Returns `Prefetch` objects whose querysets are themselves eager-loaded for the nested serializer.
+        """
+        fieldset = fieldset or ALL_FIELDS
+        prefetches = []
+        for field_name in cls.prefetch_related_fields:
+            if not fieldset.includes(field_name):
+                continue
+            nested = cls._nested_serializer_class(field_name)
+            if nested is None:
+                prefetches.append(field_name)
+                continue
+            # The prefetched rows must carry the FK back to this model to be matched up.
+            related_name = cls.Meta.model._meta.get_field(field_name).field.name
+            queryset = nested.Meta.model._default_manager.all()
+            if not queryset.ordered:
+                # Nested lists come out in a stable order (the fast read path relies on it too).
+                queryset = queryset.order_by('pk')
+            if fieldset.expands(field_name):
+                queryset = nested.setup_eager_loading(queryset, fieldset.nested(field_name), (related_name,))
+            else:
+                queryset = queryset.only('pk', related_name)
+            prefetches.append(Prefetch(field_name, queryset=queryset))
+        return prefetches
+
+    @classmethod
+    def get_only_fields(cls, fieldset, prefix=''):
+        """
+        Returns the `only()` lookups needed to render `fieldset`, following expanded forward relations.
+        Returns None when a rendered field cannot be mapped to model columns, so nothing is deferred.
+        """
+        model = cls.Meta.model
+        lookups = [f"{prefix}{model._meta.pk.name}"]
+        for name in cls.Meta.fields:
+            declared = cls._declared_fields.get(name)
+            if not fieldset.includes(name) or name in cls.prefetch_related_fields:
+                continue
+            if declared is not None and declared.write_only:
+                continue
+
+            source = declared.source if declared is not None and declared.source else name
+            for column in cls.field_sources.get(name, (source,)):
+                try:
+                    model_field = model._meta.get_field(column)
+                except FieldDoesNotExist:
+                    return None
+                if not model_field.concrete:
+                    return None
+                lookups.append(f"{prefix}{column}")
+
+            nested = cls._nested_serializer_class(name)
+            if nested is not None and name in cls.select_related_fields and fieldset.expands(name):
+                nested_lookups = nested.get_only_fields(fieldset.nested(name) or ALL_FIELDS, f"{prefix}{name}__")
+                if nested_lookups is None:
+                    return None
+                lookups.extend(nested_lookups)
+        return lookups
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fieldset=None, required_fields=()):
+        """
+        Applies the serializer's `select_related`/`prefetch_related` plan to a queryset.
+        - With a `fieldset`, only its columns (plus `required_fields`) are loaded.
+        """
+        select_related = cls.get_select_related(fieldset=fieldset)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        prefetch_related = cls.get_prefetch_related(fieldset)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if fieldset is not None:
+            only = cls.get_only_fields(fieldset)
+            if only is not None:
+                queryset = queryset.only(*only, *required_fields)
+        return queryset
+
+
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Category model.
     """
@@ -12,10 +156,12 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug']
         read_only_fields = ['slug']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Product model.
     """
+    select_related_fields = ('category',)
+
     category_id = serializers.IntegerField(write_only=True)
     category = CategorySerializer(read_only=True)
 
@@ -37,10 +183,12 @@ class ProductSerializer(serializers.ModelSerializer):
         product = Product.objects.create(category=category, **validated_data)
         return product
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the CartItem model.
     """
+    select_related_fields = ('product',)
+
     product = ProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
 
@@ -49,30 +197,46 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'product_id', 'quantity']
         read_only_fields = ['id']
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Cart model, including its items.
     """
+    prefetch_related_fields = ('items',)
+
     items = CartItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Cart
         fields = ['id', 'items', 'created_at']
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class CartSummarySerializer(serializers.ModelSerializer):
+    """
+    Lightweight cart summary built from the maintained `item_count`/`subtotal` columns.
+    """
+    class Meta:
+        model = Cart
+        fields = ['id', 'item_count', 'subtotal']
+        read_only_fields = fields
+
+class OrderItemSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the OrderItem model.
     """
+    select_related_fields = ('product',)
+
     product = ProductSerializer(read_only=True)
 
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'quantity', 'price']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Order model, including its items.
     """
+    prefetch_related_fields = ('items',)
+    field_sources = {'status_display': ('status',)}
+
     items = OrderItemSerializer(many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
 
@@ -81,3 +245,33 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'total_price', 'status', 'status_display', 'ordered_at', 'items']
         read_only_fields = ['user', 'total_amount', 'status', 'ordered_at', 'items']
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """
+    Lightweight order row for order history lists, without nested items.
+    """
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'total_price', 'item_count', 'status', 'status_display', 'ordered_at']
+        read_only_fields = fields
+
+class ProductImportSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk product import (CSV or NDJSON).
+    - `id` is optional: rows with an id update that product, rows without one are inserted.
+    - `category` is a category name, resolved in bulk by the importer.
+    """
+    id = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    name = serializers.CharField(max_length=200)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True, default='')
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    stock = serializers.IntegerField(required=False, default=0)
+    available = serializers.BooleanField(required=False, default=True)
+    category = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True, default='')
+
+    def to_internal_value(self, data):
+        # CSV cells are always strings; treat empty cells as missing values.
+        if isinstance(data, dict):
+            data = {key: value for key, value in data.items() if value not in ('', None)}
+        return super().to_internal_value(data)
@@ -0,0 +1,91 @@
+# products/signals.py
+
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache as catalog_cache
+from . import inventory
+from .carts import forget_cart
+from .models import Cart, Category, Product
+from .summaries import refresh_cart_subtotals
+from .suggest import suggestion_index
+
+SUGGESTION_KINDS = {Product: 'product', Category: 'category'}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Bumps the catalog cache generation once the write is committed,
+    so readers cannot re-cache the old rows before the transaction finishes.
+    """
+    transaction.on_commit(catalog_cache.invalidate_catalog)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def update_suggestion_index(sender, instance, **kwargs):
+    """
+    Adds or renames the entry in the typeahead index once the write is committed.
+    """
+    transaction.on_commit(partial(suggestion_index.update, SUGGESTION_KINDS[sender], instance.pk, instance.name))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def remove_from_suggestion_index(sender, instance, **kwargs):
+    """
+    Drops the entry from the typeahead index once the delete is committed.
+    """
+    transaction.on_commit(partial(suggestion_index.remove, SUGGESTION_KINDS[sender], instance.pk))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_user_cart(sender, instance, created, raw=False, **kwargs):
+    """
+    Gives every new user a cart up front, so cart requests never need `get_or_create`.
+    """
+    if created and not raw:
+        Cart.objects.get_or_create(user=instance)
+
+
+@receiver(post_delete, sender=Cart)
+def forget_deleted_cart(sender, instance, **kwargs):
+    transaction.on_commit(partial(forget_cart, instance.user_id))
+
+
+@receiver(post_save, sender=Product)
+def refresh_cart_subtotals_on_price_change(sender, instance, created, raw=False, **kwargs):
+    """
+    Cart subtotals track current prices, so a saved product re-prices the carts holding it.
+    """
+    if not created and not raw:
+        refresh_cart_subtotals(instance.pk)
+
+
+@receiver(pre_delete, sender=Cart)
+def release_cart_reservations(sender, instance, **kwargs):
+    """
+    A deleted cart (or user) gives back the units it held; the cascade would only drop the rows.
+    """
+    inventory.release_cart(instance.pk)
+
+
+@receiver(pre_save, sender=Product)
+def set_sharded_stock(sender, instance, raw=False, **kwargs):
+    """
+    A sharded product's `stock` is a copy of its shards' total: a save that changes it
+    (an admin restocking) sets the shards instead, and other saves leave them alone.
+    """
+    if raw or instance.pk is None or not instance.stock_shards:
+        return
+    previous = Product.objects.filter(pk=instance.pk).values_list('stock', flat=True).first()
+    if previous is not None and previous != instance.stock:
+        inventory.set_sharded_stock(instance.pk, instance.stock_shards, instance.stock)
@@ -0,0 +1,122 @@
+# products/suggest.py
+
+import re
+import threading
+from bisect import bisect_left, insort
+
+# Longest key kept per word; completions only ever need the leading characters.
+MAX_KEY_LENGTH = 64
+
+
+class SuggestionIndex:
+    """
+    In-process prefix index over product and category names for typeahead.
+    - A sorted list of `(word_suffix, kind, pk)` keys searched with `bisect`, so a lookup
+      costs O(log n + k) and memory grows only with the number of words in the names.
+    - Every word starts a key, so "lap" completes both "Laptop Sleeve" and "Gaming Laptop".
+    - Loaded lazily from the database on first use, then kept fresh through model signals.
+    """
+    # Index kind -> key in the suggestion response
+    kinds = {'product': 'products', 'category': 'categories'}
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._names = {}
+        self._loaded = False
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(re.findall(r'\w+', text.lower()))
+
+    def _make_keys(self, kind, pk, name):
+        words = self.normalize(name).split(' ')
+        return {
+            (' '.join(words[index:])[:MAX_KEY_LENGTH], kind, pk)
+            for index in range(len(words)) if words[index]
+        }
+
+    def _load(self):
+        from .models import Category, Product
+
+        names = {}
+        for kind, model in (('product', Product), ('category', Category)):
+            for pk, name in model.objects.values_list('pk', 'name').iterator():
+                names[(kind, pk)] = name
+
+        keys = []
+        for (kind, pk), name in names.items():
+            keys.extend(self._make_keys(kind, pk, name))
+        keys.sort()
+
+        self._names = names
+        self._keys = keys
+        self._loaded = True
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+
+    def clear(self):
+        """
+        Drops the index; the next lookup reloads it from the database.
+        """
+        with self._lock:
+            self._keys = []
+            self._names = {}
+            self._loaded = False
+
+    def remove(self, kind, pk):
+        with self._lock:
+            if not self._loaded:
+                return
+            name = self._names.pop((kind, pk), None)
+            if name is None:
+                return
+            for key in self._make_keys(kind, pk, name):
+                position = bisect_left(self._keys, key)
+                if position < len(self._keys) and self._keys[position] == key:
+                    del self._keys[position]
+
+    def update(self, kind, pk, name):
+        with self._lock:
+            if not self._loaded:
+                return
+            self.remove(kind, pk)
+            self._names[(kind, pk)] = name
+            for key in self._make_keys(kind, pk, name):
+                insort(self._keys, key)
+
+    def suggest(self, prefix, limit=10):
+        """
+        Returns `{'products': [{'id': pk, 'name': name}, ...], 'categories': [...]}`
+        with at most `limit` completions per kind,
+        in alphabetical order of the matching word.
+        """
+        prefix = self.normalize(prefix)[:MAX_KEY_LENGTH]
+        results = {group: [] for group in self.kinds.values()}
+        if not prefix:
+            return results
+
+        self.ensure_loaded()
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys):
+                key, kind, pk = self._keys[position]
+                position += 1
+                if not key.startswith(prefix):
+                    break
+                matches = results[self.kinds[kind]]
+                if (kind, pk) in seen or len(matches) >= limit:
+                    continue
+                seen.add((kind, pk))
+                matches.append({'id': pk, 'name': self._names[(kind, pk)]})
+                if all(len(matches) >= limit for matches in results.values()):
+                    break
+        return results
+
+
+suggestion_index = SuggestionIndex()
@@ -0,0 +1,78 @@
+# products/summaries.py
+
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Cart, CartItem, Order, OrderItem
+
+
+def adjust_cart_summary(cart_id, quantity_delta, subtotal_delta):
+    """
+    Applies a change in item quantity and subtotal to a cart with one `F()` UPDATE,
+    so concurrent adjustments add up instead of overwriting each other.
+    """
+    if not quantity_delta and not subtotal_delta:
+        return
+    Cart.objects.filter(pk=cart_id).update(
+        item_count=F('item_count') + quantity_delta,
+        subtotal=F('subtotal') + subtotal_delta,
+    )
+
+
+def cart_item_count_subquery():
+    totals = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    return Coalesce(
+        Subquery(totals.annotate(total=Sum('quantity')).values('total')),
+        Value(0), output_field=IntegerField(),
+    )
+
+
+def cart_subtotal_subquery():
+    totals = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    return Coalesce(
+        Subquery(totals.annotate(total=Sum(F('quantity') * F('product__price'))).values('total')),
+        Value(Decimal('0.00')), output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def order_item_count_subquery():
+    totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    return Coalesce(
+        Subquery(totals.annotate(total=Sum('quantity')).values('total')),
+        Value(0), output_field=IntegerField(),
+    )
+
+
+def refresh_cart_subtotals(product_id):
+    """
+    Recomputes the subtotal of every cart holding a product, in one UPDATE, after its price changed.
+    """
+    Cart.objects.filter(items__product_id=product_id).update(subtotal=cart_subtotal_subquery())
+
+
+def find_drift():
+    """
+    Returns querysets of carts and orders whose stored summaries disagree with their items.
+    """
+    carts = Cart.objects.annotate(
+        actual_item_count=cart_item_count_subquery(),
+        actual_subtotal=cart_subtotal_subquery(),
+    ).exclude(item_count=F('actual_item_count'), subtotal=F('actual_subtotal'))
+    orders = Order.objects.annotate(
+        actual_item_count=order_item_count_subquery(),
+    ).exclude(item_count=F('actual_item_count'))
+    return carts, orders
+
+
+def recompute_summaries(cart_ids=None, order_ids=None):
+    """
+    Rewrites summaries from the items with one UPDATE per table; `None` means every row.
+    """
+    carts = Cart.objects.all() if cart_ids is None else Cart.objects.filter(pk__in=cart_ids)
+    orders = Order.objects.all() if order_ids is None else Order.objects.filter(pk__in=order_ids)
+    return (
+        carts.update(item_count=cart_item_count_subquery(), subtotal=cart_subtotal_subquery()),
+        orders.update(item_count=order_item_count_subquery()),
+    )
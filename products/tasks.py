@@ -0,0 +1,169 @@
+# products/tasks.py
+
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from itertools import count
+
+
+class Job:
+    """
+    One queued unit of work: a pipeline `stage` and its JSON-serializable `payload`.
+    """
+    __slots__ = ('id', 'stage', 'payload', 'enqueued_at', 'attempts')
+
+    def __init__(self, id, stage, payload, enqueued_at, attempts=0):
+        self.id = id
+        self.stage = stage
+        self.payload = payload
+        self.enqueued_at = enqueued_at  # time.time(), comparable across processes
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.stage} attempt {self.attempts}>"
+
+
+class LocalBroker:
+    """
+    In-process FIFO queue: jobs live in memory and are lost with the process.
+    - Enough for development and tests, and for deployments whose workers run inside the web process.
+    """
+    kind = 'local'
+
+    def __init__(self):
+        self.jobs = deque()
+        self.ids = count(1)
+        self.ready = threading.Condition()
+
+    def put(self, stage, payload, attempts=0):
+        with self.ready:
+            self.jobs.append(Job(next(self.ids), stage, payload, time.time(), attempts))
+            self.ready.notify()
+
+    def take(self, limit, timeout=None):
+        """
+        Claims up to `limit` jobs, waiting up to `timeout` seconds (forever with None) for the first one.
+        """
+        with self.ready:
+            if not self.ready.wait_for(lambda: self.jobs, timeout=timeout):
+                return []
+            return [self.jobs.popleft() for _ in range(min(limit, len(self.jobs)))]
+
+    def ack(self, jobs):
+        # Taken jobs are already off the queue.
+        pass
+
+    def retry(self, job):
+        with self.ready:
+            job.attempts += 1
+            self.jobs.append(job)
+            self.ready.notify()
+
+    def depth(self):
+        with self.ready:
+            return dict(Counter(job.stage for job in self.jobs))
+
+    def purge(self):
+        with self.ready:
+            self.jobs.clear()
+
+    def close(self):
+        with self.ready:
+            # Wakes any worker still waiting for a job.
+            self.ready.notify_all()
+
+
+class SQLiteBroker:
+    """
+    Queue kept in a SQLite file, shared by every process on the host and surviving restarts.
+    - A job is claimed by stamping `claimed_at` and deleted once acked; claims older than
+      `visibility_timeout` seconds (a worker died mid-batch) are handed out again.
+    - Claims run in `BEGIN IMMEDIATE` transactions, so two workers never take the same job.
+    - `path=':memory:'` keeps the queue private to the process, for tests.
+    """
+    kind = 'sqlite'
+    poll_interval = 0.1  # Seconds between checks while waiting for work
+
+    def __init__(self, path, visibility_timeout=300):
+        self.path = str(path)
+        self.visibility_timeout = visibility_timeout
+        self.lock = threading.Lock()
+        self.closed = False
+        self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, stage TEXT NOT NULL, payload TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, claimed_at REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_claimed_at_id ON jobs (claimed_at, id)")
+
+    def put(self, stage, payload, attempts=0):
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO jobs (stage, payload, enqueued_at, attempts) VALUES (?, ?, ?, ?)",
+                (stage, json.dumps(payload), time.time(), attempts),
+            )
+
+    def claim(self, limit):
+        now = time.time()
+        with self.lock:
+            if self.closed:
+                return []
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.db.execute(
+                    "SELECT id, stage, payload, enqueued_at, attempts FROM jobs"
+                    " WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?",
+                    (now - self.visibility_timeout, limit),
+                ).fetchall()
+                self.db.executemany("UPDATE jobs SET claimed_at = ? WHERE id = ?", [(now, row[0]) for row in rows])
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return [Job(id, stage, json.loads(payload), enqueued_at, attempts)
+                for id, stage, payload, enqueued_at, attempts in rows]
+
+    def take(self, limit, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            jobs = self.claim(limit)
+            if jobs or self.closed or (deadline is not None and time.monotonic() >= deadline):
+                return jobs
+            time.sleep(self.poll_interval)
+
+    def ack(self, jobs):
+        with self.lock:
+            self.db.executemany("DELETE FROM jobs WHERE id = ?", [(job.id,) for job in jobs])
+
+    def retry(self, job):
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET attempts = attempts + 1, claimed_at = NULL WHERE id = ?", (job.id,)
+            )
+        job.attempts += 1
+
+    def depth(self):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT stage, COUNT(*) FROM jobs WHERE claimed_at IS NULL GROUP BY stage"
+            ).fetchall()
+        return dict(rows)
+
+    def purge(self):
+        with self.lock:
+            self.db.execute("DELETE FROM jobs")
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.db.close()
+
+
+def get_broker(kind='local', path=None, visibility_timeout=300):
+    if kind == 'sqlite':
+        return SQLiteBroker(path or ':memory:', visibility_timeout=visibility_timeout)
+    return LocalBroker()
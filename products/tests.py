@@ -1,3 +1,2064 @@
-from django.test import TestCase
+import base64
+import copy
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlencode, urlsplit
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.db import connection, connections
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from ecommerce_backend.databases import database_config, pool_available
+from . import cache as catalog_cache
+from .models import (
+    Category, Product, Cart, CartItem, IdempotencyKey, Order, OrderItem, StockReservation, StockShard,
+)
+from .async_views import get_query_slots
+from .carts import get_cart_id
+from .fastpath import compile_serializer
+from .idempotency import purge_expired
+from .inventory import available_stock, refresh_sharded_stock, shard_product, sweep_expired
+from .middleware import brotli
+from .parsers import FastJSONParser
+from .pipeline import STAGE_HANDLERS, get_pipeline, transition_orders
+from .renderers import FastJSONRenderer, orjson
+from .search import ProductSearchFilter
+from .routers import PrimaryReplicaRouter, RoutingState, activate, deactivate, pin_key
+from .serializers import CartSerializer, OrderSerializer, ProductSerializer
+from .suggest import suggestion_index
+from .summaries import find_drift
+from .tasks import SQLiteBroker
+from .views import OrderItemViewSet
+
+
+class CatalogTestMixin:
+    """
+    Shared fixtures for building categories, products, carts and orders.
+    """
+
+    def make_products(self, count, stock=10, price='9.99'):
+        products = []
+        for index in range(count):
+            category = Category.objects.create(name=f"Category {Category.objects.count()}")
+            products.append(Product.objects.create(
+                name=f"Product {Product.objects.count():05d}",
+                description="A product",
+                price=Decimal(price),
+                stock=stock,
+                category=category,
+            ))
+        return products
+
+    def make_order(self, user, products):
+        order = Order.objects.create(user=user, total_price=Decimal('0.00'))
+        for product in products:
+            OrderItem.objects.create(
+                order=order, product=product, quantity=1,
+                price=product.price, product_name=product.name,
+            )
+        return order
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context.captured_queries)
+
+
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+# For tests that check out or write carts: no pipeline workers or reservation sweeper threads
+# running against the test database (a TransactionTestCase truncates it under them).
+NO_BACKGROUND_WORK = {'ORDER_PIPELINE_WORKERS': 0, 'INVENTORY_SWEEP_INTERVAL': 0}
+
+
+@override_settings(CACHES=NO_CACHE)
+class QueryCountRegressionTests(CatalogTestMixin, APITestCase):
+    """
+    Each list endpoint must run a fixed number of queries regardless of how many rows it renders.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+
+    def assertConstantQueries(self, url, grow):
+        """
+        Measures `url`, adds more rows through `grow`, and checks the query count did not change.
+        """
+        baseline = self.count_queries(url)
+        grow()
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_product_list(self):
+        self.make_products(1)
+        self.assertConstantQueries('/api/products/', lambda: self.make_products(4))
+
+    def test_product_detail(self):
+        product = self.make_products(1)[0]
+        # One aggregate for the ETag/Last-Modified validators, one fetch for the row.
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/products/{product.pk}/')
+
+    def test_cart_list(self):
+        cart = self.user.cart
+        CartItem.objects.create(cart=cart, product=self.make_products(1)[0])
+
+        def grow():
+            for product in self.make_products(4):
+                CartItem.objects.create(cart=cart, product=product)
+
+        self.assertConstantQueries('/api/carts/', grow)
+
+    def test_cart_item_list(self):
+        cart = self.user.cart
+        CartItem.objects.create(cart=cart, product=self.make_products(1)[0])
+
+        def grow():
+            for product in self.make_products(4):
+                CartItem.objects.create(cart=cart, product=product)
+
+        self.assertConstantQueries('/api/cart-items/', grow)
+
+    def test_order_list(self):
+        self.make_order(self.user, self.make_products(1))
+
+        def grow():
+            for _ in range(4):
+                self.make_order(self.user, self.make_products(3))
+
+        self.assertConstantQueries('/api/orders/', grow)
+
+    def test_order_item_list(self):
+        order = self.make_order(self.user, self.make_products(1))
+        view = OrderItemViewSet.as_view({'get': 'list'})
+
+        def count():
+            request = APIRequestFactory().get('/')
+            force_authenticate(request, self.user)
+            with CaptureQueriesContext(connection) as context:
+                response = view(request, order_pk=order.pk)
+                response.render()
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries)
+
+        baseline = count()
+        for product in self.make_products(4):
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+        self.assertEqual(count(), baseline)
+
+
+@override_settings(CACHES=NO_CACHE, **NO_BACKGROUND_WORK)
+class CheckoutTests(CatalogTestMixin, APITestCase):
+    """
+    Checkout must lock, write and decrement stock in a constant number of queries.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, products, quantity=1):
+        return self.client.post('/api/checkout/', {
+            'order_items': [
+                {'product': product.pk, 'quantity': quantity}
+                for product in products
+            ]
+        }, format='json')
+
+    def test_checkout_decrements_stock(self):
+        products = self.make_products(3, stock=5)
+        response = self.checkout(products, quantity=2)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data['items']), 3)
+        for product in products:
+            product.refresh_from_db()
+            self.assertEqual(product.stock, 3)
+
+    def test_checkout_query_count_is_constant(self):
+        products = self.make_products(1)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.checkout(products).status_code, 201)
+        products = self.make_products(50)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.checkout(products).status_code, 201)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_insufficient_stock_rolls_back(self):
+        in_stock, sold_out = self.make_products(2, stock=1)
+        response = self.checkout([in_stock, sold_out], quantity=2)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        in_stock.refresh_from_db()
+        self.assertEqual(in_stock.stock, 1)
+
+    def test_missing_product(self):
+        response = self.client.post('/api/checkout/', {
+            'order_items': [{'product': 999999, 'quantity': 1}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['lines'][0]['status'], 'not_found')
+
+    def test_prices_come_from_the_catalog(self):
+        first, second = self.make_products(2, price='0.10')
+        response = self.client.post('/api/checkout/', {
+            'order_items': [
+                {'product': first.pk, 'quantity': 3, 'price': '0.01'},
+                {'product': second.pk, 'quantity': 7},
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Order.objects.get().total_price, Decimal('1.00'))
+        self.assertEqual(
+            sorted(item['price'] for item in response.data['items']),
+            ['0.10', '0.10'],
+        )
+
+    def test_validation_report_covers_every_line(self):
+        ok, short = self.make_products(2, stock=1)
+        response = self.client.post('/api/checkout/', {
+            'order_items': [
+                {'product': ok.pk, 'quantity': 1},
+                {'product': short.pk, 'quantity': 4},
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        report = {line['product']: line for line in response.data['lines']}
+        self.assertEqual(report[ok.pk]['status'], 'ok')
+        self.assertEqual(report[ok.pk]['line_total'], '9.99')
+        self.assertEqual(report[short.pk]['status'], 'insufficient_stock')
+        self.assertEqual(report[short.pk]['available'], 1)
+
+    def test_malformed_lines_are_reported_by_index(self):
+        response = self.client.post('/api/checkout/', {
+            'order_items': [{'product': 'abc', 'quantity': 1}, {'product': 1, 'quantity': 0}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([line['index'] for line in response.data['lines']], [0, 1])
+
+
+@skipUnless(connection.features.has_select_for_update, "Requires row-level locking.")
+@override_settings(CACHES=NO_CACHE, **NO_BACKGROUND_WORK)
+class CheckoutConcurrencyTests(CatalogTestMixin, TransactionTestCase):
+    """
+    Parallel checkouts against the same SKU must never sell more than the available stock.
+    """
+    buyers = 12
+    stock = 5
+
+    def test_parallel_checkouts_do_not_oversell(self):
+        product = self.make_products(1, stock=self.stock)[0]
+        users = [
+            User.objects.create_user(username=f'buyer{index}', password='secret-pass-123')
+            for index in range(self.buyers)
+        ]
+        barrier = threading.Barrier(self.buyers)
+        statuses = []
+
+        def buy(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                response = client.post('/api/checkout/', {
+                    'order_items': [{'product': product.pk, 'quantity': 1}]
+                }, format='json')
+                statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(statuses.count(201), self.stock)
+        self.assertEqual(statuses.count(400), self.buyers - self.stock)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), self.stock)
+
+
+@override_settings(**NO_BACKGROUND_WORK)
+class CatalogCacheTests(CatalogTestMixin, APITestCase):
+    """
+    Catalog reads are served from cache until a product or category write bumps the generation.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_list_is_served_from_cache(self):
+        self.make_products(3)
+        first = self.client.get('/api/products/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/products/')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(catalog_cache.get_stats()['hits'], 1)
+        self.assertEqual(catalog_cache.get_stats()['misses'], 1)
+
+    def test_query_parameters_are_part_of_the_key(self):
+        self.make_products(3)
+        self.client.get('/api/products/?ordering=price&search=Product')
+        with self.assertNumQueries(0):
+            self.client.get('/api/products/?search=Product&ordering=price')
+        response = self.client.get('/api/products/?ordering=-name')
+        self.assertEqual(catalog_cache.get_stats()['misses'], 2)
+        self.assertEqual(response.data['results'][0]['name'], 'Product 00002')
+
+    def test_product_write_invalidates(self):
+        product = self.make_products(1)[0]
+        self.client.get(f'/api/products/{product.pk}/')
+        product.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(self.client.get(f'/api/products/{product.pk}/').data['name'], 'Renamed')
+
+    def test_category_delete_invalidates(self):
+        category = Category.objects.create(name='Garden')
+        self.assertEqual(self.client.get('/api/categories/').data['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            category.delete()
+        self.assertEqual(self.client.get('/api/categories/').data['count'], 0)
+
+    def test_checkout_invalidates_stock(self):
+        product = self.make_products(1, stock=5)[0]
+        self.client.get(f'/api/products/{product.pk}/')
+        self.client.force_authenticate(User.objects.create_user(username='buyer', password='secret-pass-123'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/checkout/', {'order_items': [{'product': product.pk, 'quantity': 2}]}, format='json')
+        self.assertEqual(self.client.get(f'/api/products/{product.pk}/').data['stock'], 3)
+
+    def test_stats_are_admin_only(self):
+        self.client.force_authenticate(User.objects.create_user(username='shopper', password='secret-pass-123'))
+        self.assertEqual(self.client.get('/api/catalog-cache/stats/').status_code, 403)
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='secret-pass-123', is_staff=True))
+        self.assertEqual(self.client.get('/api/catalog-cache/stats/').data['hits'], 0)
+
+
+@override_settings(CACHES=NO_CACHE)
+class ConditionalGetTests(CatalogTestMixin, APITestCase):
+    """
+    Repeated requests carrying validators get a bodiless 304 after a single aggregate query.
+    """
+
+    def revalidate(self, url, response):
+        with CaptureQueriesContext(connection) as context:
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        return repeat, len(context.captured_queries)
+
+    def test_product_list_not_modified(self):
+        self.make_products(5)
+        with CaptureQueriesContext(connection) as context:
+            first = self.client.get('/api/products/')
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+
+        repeat, queries = self.revalidate('/api/products/', first)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.content, b'')
+        self.assertGreater(len(first.content), 0)
+        self.assertEqual(queries, 1)
+        self.assertLess(queries, len(context.captured_queries))
+
+    def test_if_modified_since(self):
+        product = self.make_products(1)[0]
+        first = self.client.get(f'/api/products/{product.pk}/')
+        repeat = self.client.get(f'/api/products/{product.pk}/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_write_changes_etag(self):
+        product = self.make_products(1)[0]
+        first = self.client.get('/api/products/')
+        product.category.name = 'Renamed'
+        product.category.save()
+        repeat, _ = self.revalidate('/api/products/', first)
+        self.assertEqual(repeat.status_code, 200)
+        self.assertNotEqual(repeat['ETag'], first['ETag'])
+
+    def test_delete_changes_etag(self):
+        first_product, second_product = self.make_products(2)
+        first = self.client.get('/api/products/')
+        second_product.delete()
+        repeat, _ = self.revalidate('/api/products/', first)
+        self.assertEqual(repeat.status_code, 200)
+
+    def test_missing_detail_is_still_404(self):
+        self.assertEqual(self.client.get('/api/products/999999/').status_code, 404)
+
+    def test_order_detail_not_modified(self):
+        user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(user)
+        order = self.make_order(user, self.make_products(2))
+        first = self.client.get(f'/api/orders/{order.pk}/')
+        repeat, queries = self.revalidate(f'/api/orders/{order.pk}/', first)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(queries, 1)
+
+
+class CachedConditionalGetTests(CatalogTestMixin, APITestCase):
+    """
+    Conditional requests answered from the catalog cache do not touch the database.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_not_modified(self):
+        self.make_products(3)
+        first = self.client.get('/api/categories/')
+        with self.assertNumQueries(0):
+            repeat = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_cached_response_keeps_validators(self):
+        self.make_products(1)
+        first = self.client.get('/api/products/')
+        second = self.client.get('/api/products/')
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(first['Last-Modified'], second['Last-Modified'])
+
+
+@override_settings(CACHES=NO_CACHE)
+class KeysetPaginationTests(CatalogTestMixin, APITestCase):
+    """
+    `?pagination=cursor` walks a listing with keyset queries; page numbers keep working.
+    """
+
+    def walk(self, url):
+        names, queries = [], []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertNotIn('count', response.data)
+            names.extend(row.get('name', row['id']) for row in response.data['results'])
+            queries.extend(query['sql'] for query in context.captured_queries)
+            url = response.data['next']
+        return names, queries
+
+    def expected_names(self, ordering):
+        tie_breaker = '-id' if ordering.startswith('-') else 'id'
+        return [product.name for product in Product.objects.order_by(ordering, tie_breaker)]
+
+    def test_every_ordering_walks_all_rows_without_count_or_offset(self):
+        for index, product in enumerate(self.make_products(12)):
+            Product.objects.filter(pk=product.pk).update(price=Decimal(index * 7 % 12) + Decimal('0.50'))
+        for ordering in ('name', '-price', 'created_at'):
+            with self.subTest(ordering=ordering):
+                names, queries = self.walk(f'/api/products/?pagination=cursor&ordering={ordering}')
+                self.assertEqual(names, self.expected_names(ordering))
+                self.assertFalse(any('COUNT(' in sql or 'OFFSET' in sql for sql in queries))
+
+    def test_ties_are_neither_skipped_nor_repeated(self):
+        self.make_products(12)
+        names, _ = self.walk('/api/products/?pagination=cursor&ordering=price')
+        self.assertEqual(names, self.expected_names('price'))
+
+    def test_pages_of_equal_values_use_the_id_tie_breaker_not_an_offset(self):
+        self.make_products(25)
+        Product.objects.update(price=Decimal('5.00'))
+        names, queries = self.walk('/api/products/?pagination=cursor&ordering=-price')
+        self.assertEqual(names, self.expected_names('-price'))
+        self.assertFalse(any('OFFSET' in sql for sql in queries))
+
+        # Walking back from the last page returns the same pages in reverse.
+        url = '/api/products/?pagination=cursor&ordering=-price'
+        while (response := self.client.get(url)).data['next']:
+            url = response.data['next']
+        back = []
+        while url:
+            response = self.client.get(url)
+            back[:0] = [row['name'] for row in response.data['results']]
+            url = response.data['previous']
+        self.assertEqual(back, names)
+
+    def test_cursor_from_another_ordering_is_rejected(self):
+        self.make_products(6)
+        next_link = self.client.get('/api/products/?pagination=cursor&ordering=name').data['next']
+        cursor = parse_qs(urlsplit(next_link).query)['cursor'][0]
+        for ordering in ('price', 'created_at', '-name'):
+            with self.subTest(ordering=ordering):
+                response = self.client.get('/api/products/', {'cursor': cursor, 'ordering': ordering})
+                self.assertEqual(response.status_code, 404)
+
+    def test_forged_cursor_values_are_rejected(self):
+        self.make_products(6)
+        forged = [
+            [['price', 'cheap'], ['id', '1']],
+            [['price', '1e999999'], ['id', '1']],
+            [['price', '1.00'], ['id', 'one']],
+            [['price', None], ['id', '1']],
+            [['price', '1.00']],
+            {'price': '1.00'},
+        ]
+        for position in forged:
+            with self.subTest(position=position):
+                cursor = base64.b64encode(urlencode({'p': json.dumps(position)}).encode()).decode()
+                response = self.client.get('/api/products/', {'cursor': cursor, 'ordering': 'price'})
+                self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_is_unchanged(self):
+        self.make_products(7)
+        response = self.client.get('/api/products/?page=2')
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_orders_cursor(self):
+        user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(user)
+        orders = [self.make_order(user, self.make_products(1)) for _ in range(7)]
+        ids, _ = self.walk('/api/orders/?pagination=cursor')
+        self.assertEqual(ids, [order.pk for order in reversed(orders)])
+
+    def test_cart_items_cursor(self):
+        user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(user)
+        cart = user.cart
+        items = [CartItem.objects.create(cart=cart, product=product) for product in self.make_products(6)]
+        ids, _ = self.walk('/api/cart-items/?pagination=cursor')
+        self.assertEqual(ids, [item.pk for item in reversed(items)])
+
+
+@override_settings(CACHES=NO_CACHE)
+class ProductSearchTests(APITestCase):
+    """
+    Relevance corpus for the full-text search backend behind `?search=`.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        electronics = Category.objects.create(name='Electronics')
+        corpus = [
+            ('Gaming Laptop', 'High refresh rate screen and a fast GPU.'),
+            ('Laptop Sleeve', 'Neoprene sleeve that fits most 15 inch models.'),
+            ('Wireless Mouse', 'Ergonomic mouse, pairs with any laptop over Bluetooth.'),
+            ('Mechanical Keyboard', 'Hot-swappable switches and RGB lighting.'),
+            ('USB-C Charger', 'Fast charging brick for phones and tablets.'),
+        ]
+        for name, description in corpus:
+            Product.objects.create(name=name, description=description, price=Decimal('10.00'), category=electronics)
+
+    def search(self, term, **params):
+        response = self.client.get('/api/products/', {'search': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['results']]
+
+    def test_name_matches_outrank_description_matches(self):
+        names = self.search('laptop')
+        self.assertEqual(set(names), {'Gaming Laptop', 'Laptop Sleeve', 'Wireless Mouse'})
+        self.assertEqual(names[-1], 'Wireless Mouse')
+
+    def test_stemming(self):
+        self.assertIn('Mechanical Keyboard', self.search('keyboards'))
+
+    def test_prefix_matches(self):
+        self.assertEqual(self.search('mech'), ['Mechanical Keyboard'])
+
+    def test_typo_falls_back_to_trigram(self):
+        self.assertEqual(self.search('keybord'), ['Mechanical Keyboard'])
+
+    def test_typo_fallback_can_use_the_trigram_index(self):
+        request = Request(APIRequestFactory().get('/api/products/', {'search': 'keybord'}))
+        queryset = ProductSearchFilter().filter_queryset(request, Product.objects.all(), None)
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")  # The corpus is too small for the planner to bother
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('product_name_trgm_idx', plan)
+
+    def test_multiple_terms_must_all_match(self):
+        self.assertEqual(self.search('gaming laptop'), ['Gaming Laptop'])
+
+    def test_explicit_ordering_wins(self):
+        self.assertEqual(self.search('laptop', ordering='-name'), ['Wireless Mouse', 'Laptop Sleeve', 'Gaming Laptop'])
+
+    def test_vector_follows_updates(self):
+        product = Product.objects.get(name='USB-C Charger')
+        product.description = 'Compact power adapter'
+        product.save()
+        self.assertEqual(self.search('adapter'), ['USB-C Charger'])
+        self.assertEqual(self.search('brick'), [])
+
+
+class SuggestionIndexTests(CatalogTestMixin, APITestCase):
+    """
+    Typeahead completions come from the in-process prefix index and follow writes.
+    """
+
+    def setUp(self):
+        suggestion_index.clear()
+        Category.objects.create(name='Laptops')
+        for name in ('Gaming Laptop', 'Laptop Sleeve', 'Lamp', 'Wireless Mouse'):
+            Product.objects.create(name=name, price=Decimal('1.00'))
+
+    def suggest(self, query, **params):
+        response = self.client.get('/api/products/suggest/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_completes_any_word_prefix(self):
+        data = self.suggest('lap')
+        self.assertEqual([p['name'] for p in data['products']], ['Gaming Laptop', 'Laptop Sleeve'])
+        self.assertEqual([c['name'] for c in data['categories']], ['Laptops'])
+
+    def test_lookups_do_not_query_the_database_once_loaded(self):
+        self.suggest('la')
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.suggest('la', limit=2)['products']), 2)
+
+    def test_empty_query(self):
+        self.assertEqual(self.suggest(''), {'query': '', 'products': [], 'categories': []})
+
+    def test_index_follows_writes(self):
+        self.suggest('x')
+        product = Product.objects.get(name='Lamp')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Desk Lamp'
+            product.save()
+            Product.objects.create(name='Xbox Controller', price=Decimal('1.00'))
+        self.assertEqual([p['name'] for p in self.suggest('desk')['products']], ['Desk Lamp'])
+        self.assertEqual([p['name'] for p in self.suggest('x')['products']], ['Xbox Controller'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self.suggest('lamp')['products'], [])
+
+
+@override_settings(CACHES=NO_CACHE)
+class ProductFacetTests(APITestCase):
+    """
+    Range/stock filters and facet counts computed in a single aggregate query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = Category.objects.create(name='Books')
+        cls.games = Category.objects.create(name='Games')
+        rows = [
+            ('Novel', '8.00', 3, cls.books),
+            ('Atlas', '45.00', 0, cls.books),
+            ('Cookbook', '25.00', 1, cls.books),
+            ('Board Game', '60.00', 2, cls.games),
+            ('Console', '499.99', 0, cls.games),
+            ('Gift Card', '500.00', 9, None),
+        ]
+        for name, price, stock, category in rows:
+            Product.objects.create(name=name, price=Decimal(price), stock=stock, category=category)
+
+    def names(self, **params):
+        return [product['name'] for product in self.client.get('/api/products/', params).data['results']]
+
+    def test_range_and_stock_filters(self):
+        self.assertEqual(self.names(min_price='20', max_price='60'), ['Atlas', 'Board Game', 'Cookbook'])
+        self.assertEqual(self.names(in_stock='false'), ['Atlas', 'Console'])
+        self.assertEqual(self.names(category=self.games.pk, in_stock='true'), ['Board Game'])
+
+    def test_facets_are_one_query(self):
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get('/api/products/')
+        with CaptureQueriesContext(connection) as faceted:
+            response = self.client.get('/api/products/', {'facets': 'true'})
+        self.assertEqual(len(faceted.captured_queries), len(plain.captured_queries) + 1)
+
+        facets = response.data['facets']
+        self.assertEqual(
+            [(category['name'], category['count']) for category in facets['category']],
+            [('Books', 3), ('Games', 2), (None, 1)],
+        )
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 2, 1, 1, 1])
+        self.assertEqual(facets['price'][0], {'min': None, 'max': '10', 'count': 1})
+        self.assertEqual(facets['availability'], {'in_stock': 4, 'out_of_stock': 2})
+
+    def test_facets_follow_filters(self):
+        facets = self.client.get('/api/products/', {'facets': 'true', 'in_stock': 'true'}).data['facets']
+        self.assertEqual(facets['availability'], {'in_stock': 4, 'out_of_stock': 0})
+
+    def test_facets_are_opt_in(self):
+        self.assertNotIn('facets', self.client.get('/api/products/').data)
+
+
+@override_settings(CACHES=NO_CACHE, PRODUCT_BULK_CHUNK_SIZE=2)
+class ProductBulkTests(APITestCase):
+    """
+    Streaming CSV/NDJSON import (chunked upserts) and export.
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='secret-pass-123', is_staff=True)
+        self.client.force_authenticate(self.admin)
+        self.books = Category.objects.create(name='Books')
+
+    def upload(self, name, content, **params):
+        upload = io.BytesIO(content.encode())
+        upload.name = name
+        return self.client.post(f'/api/products/import/?{urlencode(params)}', {'file': upload}, format='multipart')
+
+    def test_csv_import_upserts_in_chunks(self):
+        existing = Product.objects.create(name='Old name', price=Decimal('1.00'), category=self.books)
+        content = (
+            'id,name,description,price,stock,available,category\n'
+            f'{existing.pk},New name,,2.50,4,true,Books\n'
+            ',Fresh,Brand new,3.00,1,true,Garden\n'
+            ',Another,,4.00,,false,\n'
+        )
+        response = self.upload('catalog.csv', content)
+        self.assertEqual(response.data, {'imported': 3, 'rejected': 0, 'errors': []})
+
+        existing.refresh_from_db()
+        self.assertEqual((existing.name, existing.price, existing.stock), ('New name', Decimal('2.50'), 4))
+        fresh = Product.objects.get(name='Fresh')
+        self.assertEqual(fresh.category.slug, 'garden')
+        self.assertFalse(Product.objects.get(name='Another').available)
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        content = '{"name": "Good", "price": "1.00"}\nnot json\n{"name": "No price"}\n'
+        response = self.upload('catalog.ndjson', content)
+        self.assertEqual(response.data['imported'], 1)
+        self.assertEqual(response.data['rejected'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertIn('price', response.data['errors'][1]['errors'])
+
+    def test_category_names_with_a_taken_slug_resolve_to_that_category(self):
+        garden = Category.objects.create(name='Home & Garden')
+        content = (
+            'name,price,category\n'
+            'Rake,1.00,Home Garden\n'
+            'Hose,2.00,Home & Garden\n'
+            'Kettle,3.00,Kitchen\n'
+            'Pan,4.00,KITCHEN\n'
+        )
+        response = self.upload('catalog.csv', content)
+        self.assertEqual(response.data, {'imported': 4, 'rejected': 0, 'errors': []})
+        self.assertEqual(set(Product.objects.filter(category=garden).values_list('name', flat=True)), {'Rake', 'Hose'})
+        kitchen = Category.objects.get(slug='kitchen')
+        self.assertEqual(set(kitchen.products.values_list('name', flat=True)), {'Kettle', 'Pan'})
+        self.assertFalse(Product.objects.filter(category=None).exists())
+
+    def test_unreadable_file_reports_the_committed_chunks(self):
+        # TextIOWrapper decodes 8 KiB at a time, so the bad byte must come well after the first chunk.
+        rows = ''.join(f'Product {index:04d} with a long enough name,1.00\n' for index in range(400))
+        content = f'name,price\n{rows}'.encode() + b'Broken \xff,1.00\n'
+        upload = io.BytesIO(content)
+        upload.name = 'catalog.csv'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, \
+                mock.patch('products.suggest.suggestion_index.clear') as clear_suggestions:
+            response = self.client.post('/api/products/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        imported = Product.objects.count()
+        self.assertGreater(imported, 0)
+        self.assertEqual(response.data['imported'], imported)
+        self.assertEqual(response.data['failed']['row'], imported + 1)
+        self.assertIn("can't decode byte 0xff", response.data['failed']['error'])
+        self.assertIn(catalog_cache.invalidate_catalog, callbacks)
+        clear_suggestions.assert_called_once()
+
+    def test_explicit_ids_advance_the_sequence(self):
+        self.upload('catalog.csv', 'id,name,price\n5000,Imported,1.00\n')
+        self.assertGreater(Product.objects.create(name='Next', price=Decimal('1.00')).pk, 5000)
+
+    def test_import_is_admin_only(self):
+        self.client.force_authenticate(User.objects.create_user(username='shopper', password='secret-pass-123'))
+        self.assertEqual(self.upload('catalog.csv', 'name,price\nX,1.00\n').status_code, 403)
+        self.assertEqual(self.client.get('/api/products/export/').status_code, 403)
+
+    def test_export_round_trips_through_import(self):
+        Product.objects.create(name='Novel, signed', description='Line one\nline two', price=Decimal('8.00'),
+                               stock=3, category=self.books)
+        Product.objects.create(name='Loose item', price=Decimal('1.25'))
+        response = self.client.get('/api/products/export/')
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+
+        Product.objects.update(stock=0)
+        self.assertEqual(self.upload('catalog.csv', content).data['imported'], 2)
+        self.assertEqual(Product.objects.get(name='Novel, signed').stock, 3)
+        self.assertEqual(Product.objects.get(name='Novel, signed').description, 'Line one\nline two')
+
+    def test_ndjson_export(self):
+        Product.objects.create(name='Novel', price=Decimal('8.00'), category=self.books)
+        response = self.client.get('/api/products/export/', {'file_format': 'ndjson'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['category'], 'Books')
+        self.assertEqual(json.loads(lines[0])['price'], '8.00')
+
+    def test_management_commands(self):
+        Product.objects.create(name='Novel', price=Decimal('8.00'), category=self.books)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.ndjson')
+            call_command('export_products', path, format='ndjson', stderr=io.StringIO())
+            Product.objects.all().delete()
+            stdout = io.StringIO()
+            call_command('import_products', path, stdout=stdout, stderr=io.StringIO())
+        self.assertIn('Imported 1 rows', stdout.getvalue())
+        self.assertEqual(Product.objects.get().category, self.books)
+
+
+@override_settings(CACHES=NO_CACHE, **NO_BACKGROUND_WORK)
+class CartBatchTests(CatalogTestMixin, APITestCase):
+    """
+    `/api/cart-items/batch/` applies many operations atomically in constant queries.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+        self.cart = self.user.cart
+
+    def batch(self, *operations):
+        return self.client.post('/api/cart-items/batch/', {'operations': list(operations)}, format='json')
+
+    def quantities(self):
+        return dict(self.cart.items.values_list('product_id', 'quantity'))
+
+    def test_add_set_remove(self):
+        kept, replaced, removed, new = self.make_products(4)
+        CartItem.objects.create(cart=self.cart, product=kept, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=replaced, quantity=5)
+        CartItem.objects.create(cart=self.cart, product=removed, quantity=2)
+
+        response = self.batch(
+            {'op': 'add', 'product_id': kept.pk, 'quantity': 2},
+            {'op': 'set', 'product_id': replaced.pk, 'quantity': 3},
+            {'op': 'remove', 'product_id': removed.pk},
+            {'op': 'add', 'product_id': new.pk},
+            {'op': 'add', 'product_id': new.pk, 'quantity': 2},
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([result['quantity'] for result in response.data['results']], [3, 3, 0, 3, 3])
+        self.assertEqual(self.quantities(), {kept.pk: 3, replaced.pk: 3, new.pk: 3})
+
+    def test_query_count_is_constant(self):
+        products = self.make_products(30)
+        for product in products[:10]:
+            CartItem.objects.create(cart=self.cart, product=product)
+
+        def operations(selection):
+            return [{'op': 'add', 'product_id': product.pk} for product in selection]
+
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.batch(*operations(products[:1]), *operations(products[10:11])).status_code, 200)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.batch(*operations(products[1:10]), *operations(products[11:30])).status_code, 200)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_failure_applies_nothing(self):
+        product, scarce = self.make_products(2, stock=2)
+        response = self.batch(
+            {'op': 'add', 'product_id': product.pk},
+            {'op': 'set', 'product_id': scarce.pk, 'quantity': 3},
+            {'op': 'add', 'product_id': 999999},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['ok', 'insufficient_stock', 'not_found'],
+        )
+        self.assertEqual(self.quantities(), {})
+
+    def test_malformed_operations(self):
+        response = self.batch({'op': 'explode', 'product_id': 1}, {'op': 'add', 'product_id': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.data['results']], ['invalid', 'invalid'])
+
+    def test_single_add_rejects_insufficient_stock(self):
+        product = self.make_products(1, stock=1)[0]
+        response = self.client.post('/api/cart-items/', {'product_id': product.pk, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {})
+
+
+@override_settings(**NO_BACKGROUND_WORK)
+class CartLookupTests(CatalogTestMixin, APITestCase):
+    """
+    Carts exist from registration and their id is cached, so cart endpoints skip `get_or_create`.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+        self.product = self.make_products(1)[0]
+        CartItem.objects.create(cart=self.user.cart, product=self.product)
+        # Warm the per-user cart cache.
+        self.client.get('/api/cart-items/')
+
+    def test_registration_creates_cart(self):
+        response = self.client.post('/api/accounts/register/', {
+            'username': 'newcomer', 'email': 'new@example.com', 'password': 'secret-pass-123',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Cart.objects.filter(user__username='newcomer').exists())
+
+    def test_cart_list(self):
+        # Page count, cart row, items prefetch (with product and category joined).
+        with self.assertNumQueries(3):
+            self.client.get('/api/carts/')
+
+    def test_cart_item_list(self):
+        # Page count and items (product and category joined).
+        with self.assertNumQueries(2):
+            self.client.get('/api/cart-items/')
+
+    def test_cart_item_create(self):
+        other = self.make_products(1)[0]
+        # Product (with category), get_or_create's select and savepointed insert, and the
+        # cart summary UPDATE, all inside one savepointed transaction.
+        with self.assertNumQueries(8):
+            response = self.client.post('/api/cart-items/', {'product_id': other.pk, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(INVENTORY_RESERVATIONS=True)
+    def test_cart_item_create_with_reservations(self):
+        other = self.make_products(1)[0]
+        # As above, plus the reservation: held select, stock lock and UPDATE, upsert.
+        with self.assertNumQueries(12):
+            response = self.client.post('/api/cart-items/', {'product_id': other.pk, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_cart_batch(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.post('/api/cart-items/batch/', {
+                'operations': [{'op': 'add', 'product_id': self.product.pk}]
+            }, format='json')
+        # The only cart query is the summary UPDATE; the cart id itself comes from the cache.
+        cart_queries = [q['sql'] for q in context.captured_queries if '"products_cart"' in q['sql']]
+        self.assertEqual(len(cart_queries), 1)
+        self.assertTrue(cart_queries[0].startswith('UPDATE'))
+
+    def test_legacy_user_without_cart(self):
+        self.user.cart.delete()
+        cache.clear()
+        self.assertEqual(self.client.get('/api/carts/').data['count'], 1)
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+
+
+@override_settings(**NO_BACKGROUND_WORK)
+class CartSummaryTests(CatalogTestMixin, APITestCase):
+    """
+    Cart and order summaries are maintained incrementally and checked by `recompute_summaries`.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+        self.first, self.second = self.make_products(2, price='2.50')
+
+    def assertSummary(self, item_count, subtotal):
+        cart = Cart.objects.get(pk=self.user.cart.pk)
+        self.assertEqual((cart.item_count, cart.subtotal), (item_count, Decimal(subtotal)))
+
+    def test_item_endpoints_maintain_summary(self):
+        response = self.client.post('/api/cart-items/', {'product_id': self.first.pk, 'quantity': 2}, format='json')
+        self.client.post('/api/cart-items/', {'product_id': self.first.pk, 'quantity': 1}, format='json')
+        self.assertSummary(3, '7.50')
+
+        item_url = f"/api/cart-items/{response.data['id']}/"
+        self.client.patch(item_url, {'quantity': 1}, format='json')
+        self.assertSummary(1, '2.50')
+
+        self.client.post('/api/cart-items/', {'product_id': self.second.pk, 'quantity': 4}, format='json')
+        self.client.delete(item_url)
+        self.assertSummary(4, '10.00')
+
+    def test_adds_are_checked_against_the_cart_quantity(self):
+        product = self.make_products(1, stock=5)[0]
+        add = {'product_id': product.pk, 'quantity': 3}
+        self.assertEqual(self.client.post('/api/cart-items/', add, format='json').status_code, 201)
+        self.assertEqual(self.client.post('/api/cart-items/', add, format='json').status_code, 400)
+        self.assertEqual(CartItem.objects.get(cart=self.user.cart, product=product).quantity, 3)
+        self.assertSummary(3, '29.97')
+
+    def test_batch_maintains_summary(self):
+        self.client.post('/api/cart-items/', {'product_id': self.first.pk, 'quantity': 2}, format='json')
+        self.client.post('/api/cart-items/batch/', {'operations': [
+            {'op': 'add', 'product_id': self.first.pk, 'quantity': 1},
+            {'op': 'set', 'product_id': self.second.pk, 'quantity': 2},
+        ]}, format='json')
+        self.assertSummary(5, '12.50')
+
+        self.client.post('/api/cart-items/batch/', {'operations': [
+            {'op': 'remove', 'product_id': self.first.pk},
+        ]}, format='json')
+        self.assertSummary(2, '5.00')
+
+    def test_price_change_refreshes_subtotal(self):
+        self.client.post('/api/cart-items/', {'product_id': self.first.pk, 'quantity': 2}, format='json')
+        self.first.price = Decimal('4.00')
+        self.first.save()
+        self.assertSummary(2, '8.00')
+
+    def test_summary_endpoints(self):
+        self.client.post('/api/cart-items/', {'product_id': self.first.pk, 'quantity': 3}, format='json')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/carts/summary/')
+        self.assertEqual(response.data, {'id': self.user.cart.pk, 'item_count': 3, 'subtotal': '7.50'})
+
+        self.client.post('/api/checkout/', {'order_items': [
+            {'product': self.first.pk, 'quantity': 2}, {'product': self.second.pk, 'quantity': 1},
+        ]}, format='json')
+        response = self.client.get('/api/orders/summary/')
+        order = response.data['results'][0]
+        self.assertEqual((order['item_count'], order['total_price']), (3, '7.50'))
+        self.assertNotIn('items', order)
+
+    def test_recompute_command_repairs_drift(self):
+        CartItem.objects.create(cart=self.user.cart, product=self.first, quantity=2)
+        self.make_order(self.user, [self.first, self.second])
+        carts, orders = find_drift()
+        self.assertEqual((carts.count(), orders.count()), (1, 1))
+
+        out = io.StringIO()
+        call_command('recompute_summaries', stdout=out)
+        self.assertIn('1 carts, 1 orders', out.getvalue())
+        self.assertEqual(find_drift()[0].count(), 1)
+
+        call_command('recompute_summaries', '--fix', stdout=out)
+        carts, orders = find_drift()
+        self.assertEqual((carts.count(), orders.count()), (0, 0))
+        self.assertSummary(2, '5.00')
+
+
+@override_settings(CACHES=NO_CACHE)
+class SparseFieldsetTests(CatalogTestMixin, APITestCase):
+    """
+    `?fields=` / `?expand=` trim both the rendered fields and the SQL.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+        self.products = self.make_products(3)
+        self.order = self.make_order(self.user, self.products)
+        CartItem.objects.create(cart=self.user.cart, product=self.products[0], quantity=2)
+
+    def get_with_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_product_fields(self):
+        response, queries = self.get_with_queries('/api/products/?fields=id,name,price')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'price'})
+        listing = queries[-1]
+        self.assertNotIn('"products_product"."description"', listing)
+        self.assertNotIn('JOIN "products_category"', listing)
+
+    def test_unexpanded_relation_renders_pk(self):
+        product = self.products[0]
+        response, queries = self.get_with_queries(f'/api/products/{product.pk}/?fields=id,category')
+        self.assertEqual(response.data, {'id': product.pk, 'category': product.category_id})
+        self.assertNotIn('JOIN "products_category"', queries[-1])
+
+    def test_expand_relation(self):
+        product = self.products[0]
+        response, queries = self.get_with_queries(f'/api/products/{product.pk}/?fields=name&expand=category')
+        self.assertEqual(response.data, {
+            'name': product.name,
+            'category': {'id': product.category_id, 'name': product.category.name, 'slug': product.category.slug},
+        })
+        self.assertNotIn('"products_category"."description"', queries[-1])
+
+    def test_expand_only_matches_default_output(self):
+        default = self.client.get('/api/products/').data['results']
+        expanded = self.client.get('/api/products/?expand=category').data['results']
+        self.assertEqual(expanded, default)
+
+    def test_cursor_pages_with_fields(self):
+        products = self.products + self.make_products(4)
+        for index, product in enumerate(products):
+            Product.objects.filter(pk=product.pk).update(price=Decimal(index * 5 % 7) + Decimal('0.50'))
+        first = self.client.get('/api/products/?pagination=cursor&ordering=price&fields=id').data
+        # The ordering column is loaded along with the selected fields, so the cursor costs no extra query.
+        with self.assertNumQueries(1):
+            second = self.client.get(first['next']).data
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(ids, list(Product.objects.order_by('price', 'id').values_list('pk', flat=True)))
+
+    def test_order_nested_fields(self):
+        response, queries = self.get_with_queries('/api/orders/?fields=id,items.quantity')
+        self.assertEqual(response.data['results'][0], {'id': self.order.pk, 'items': [{'quantity': 1}] * 3})
+        items_query = next(query for query in queries if query.startswith('SELECT "products_orderitem"'))
+        self.assertNotIn('"products_product"', items_query)
+
+        response = self.client.get('/api/orders/?fields=id,items')
+        self.assertEqual(sorted(response.data['results'][0]['items']),
+                         sorted(self.order.items.values_list('pk', flat=True)))
+
+    def test_cart_expand(self):
+        response = self.client.get('/api/carts/?fields=items.quantity,items.product&expand=items.product')
+        item = response.data['results'][0]['items'][0]
+        self.assertEqual(item['quantity'], 2)
+        self.assertEqual(item['product']['id'], self.products[0].pk)
+        self.assertEqual(item['product']['category']['id'], self.products[0].category_id)
+
+        response = self.client.get('/api/carts/?fields=items.quantity,items.product')
+        self.assertEqual(response.data['results'][0]['items'], [{'quantity': 2, 'product': self.products[0].pk}])
+
+
+@override_settings(CACHES=NO_CACHE)
+class FastListParityTests(CatalogTestMixin, APITestCase):
+    """
+    The compiled `.values()` list path renders byte-for-byte what the serializers render.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+        products = self.make_products(7)
+        prices = ['0.50', '1234.00', '19.99', '7.10', '0.00', '99999.99', '42.42']
+        for product, price in zip(products, prices):
+            Product.objects.filter(pk=product.pk).update(price=Decimal(price))
+        Product.objects.filter(pk=products[0].pk).update(category=None, description=None)
+        Product.objects.filter(pk=products[1].pk).update(name='Searchable lamp', available=False)
+        for status, chunk in zip(['pending', 'shipped', 'cancelled'], [products[:3], products[3:4], []]):
+            order = self.make_order(self.user, chunk)
+            Order.objects.filter(pk=order.pk).update(status=status, total_price=Decimal('12.30'))
+
+    def assertSameBytes(self, url):
+        with self.settings(FAST_LIST_SERIALIZERS=False):
+            expected = self.client.get(url)
+        with self.settings(FAST_LIST_SERIALIZERS=True):
+            actual = self.client.get(url)
+        self.assertEqual(actual.status_code, 200, actual.content)
+        self.assertEqual(actual.content, expected.content)
+
+    def test_product_listings(self):
+        for url in (
+            '/api/products/',
+            '/api/products/?page=2',
+            '/api/products/?ordering=-price',
+            '/api/products/?pagination=cursor&ordering=created_at',
+            '/api/products/?search=lamp',
+            '/api/products/?available=true&min_price=1',
+        ):
+            with self.subTest(url=url):
+                self.assertSameBytes(url)
+
+    def test_order_listings(self):
+        for url in ('/api/orders/', '/api/orders/?pagination=cursor'):
+            with self.subTest(url=url):
+                self.assertSameBytes(url)
+
+    def test_cursor_walk(self):
+        url = '/api/products/?pagination=cursor&ordering=price'
+        with self.settings(FAST_LIST_SERIALIZERS=False):
+            expected = self.client.get(self.client.get(url).data['next'])
+        second = self.client.get(self.client.get(url).data['next'])
+        self.assertEqual(second.content, expected.content)
+
+    @override_settings(TIME_ZONE='America/New_York')
+    def test_local_timezone(self):
+        self.assertSameBytes('/api/orders/')
+
+    def test_compiled_serializers_match(self):
+        renderer = JSONRenderer()
+        for serializer_class, queryset in (
+            (ProductSerializer, Product.objects.order_by('pk')),
+            (OrderSerializer, Order.objects.order_by('pk')),
+        ):
+            with self.subTest(serializer=serializer_class.__name__):
+                fast = compile_serializer(serializer_class)
+                self.assertIsNotNone(fast)
+                expected = serializer_class(serializer_class.setup_eager_loading(queryset), many=True).data
+                self.assertEqual(renderer.render(fast.represent(fast.values(queryset))), renderer.render(expected))
+
+    def test_order_list_queries(self):
+        # ETag validators, page count, orders, then every item (product and category joined) in one query.
+        self.assertEqual(self.count_queries('/api/orders/?ordering=-ordered_at'), 4)
+
+    def test_sparse_fieldsets_use_the_serializer(self):
+        response = self.client.get('/api/products/?fields=id,name')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+
+
+@skipUnless(orjson is not None, "orjson is not installed")
+class FastJSONContractTests(CatalogTestMixin, APITestCase):
+    """
+    The orjson renderer and parser are byte-for-byte interchangeable with DRF's stdlib ones.
+    """
+
+    def assertSameRendering(self, data, accepted_media_type=None):
+        expected = JSONRenderer().render(data, accepted_media_type)
+        self.assertEqual(FastJSONRenderer().render(data, accepted_media_type), expected)
+
+    def test_serializer_payloads(self):
+        user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        products = self.make_products(3, price='1234.50')
+        self.make_order(user, products)
+        CartItem.objects.create(cart=user.cart, product=products[0], quantity=2)
+
+        orders = OrderSerializer(OrderSerializer.setup_eager_loading(Order.objects.all()), many=True).data
+        carts = CartSerializer(CartSerializer.setup_eager_loading(Cart.objects.all()), many=True).data
+        self.assertSameRendering({'count': 1, 'next': None, 'results': orders})
+        self.assertSameRendering(carts)
+
+    def test_native_python_values(self):
+        from datetime import date, datetime, time, timedelta
+        from datetime import timezone as dt_timezone
+        from uuid import UUID
+        from django.utils.translation import gettext_lazy
+
+        self.assertSameRendering({
+            'decimal': Decimal('19.90'),
+            'utc': datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+            'offset': datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone(timedelta(hours=2))),
+            'naive': datetime(2026, 1, 2, 3, 4, 5),
+            'date': date(2026, 1, 2),
+            'time': time(3, 4, 5),
+            'duration': timedelta(minutes=90),
+            'uuid': UUID('12345678-1234-5678-1234-567812345678'),
+            'lazy': gettext_lazy('Pending'),
+            'text': 'Ünïcode — "quoted" \\ \u2028 \u2029 \n',
+            'nested': [(1, 2), {3: None, 'ok': True}],
+            'queryset': Category.objects.none(),
+        })
+
+    def test_fallbacks(self):
+        self.assertSameRendering({'wide': 2 ** 70})
+        self.assertSameRendering({'a': [1, 2]}, 'application/json; indent=4')
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def parse(self, parser, body):
+        return parser.parse(io.BytesIO(body), 'application/json', {'encoding': 'utf-8'})
+
+    def test_parser(self):
+        for body in (b'{"price": 19.9, "items": [1, "\\u00fc", null, true]}', '{"name": "Lámpara"}'.encode()):
+            self.assertEqual(self.parse(FastJSONParser(), body), self.parse(JSONParser(), body))
+
+        for body in (b'{"broken": ', b'{"price": NaN}'):
+            with self.assertRaises(ParseError) as expected:
+                self.parse(JSONParser(), body)
+            with self.assertRaises(ParseError) as actual:
+                self.parse(FastJSONParser(), body)
+            self.assertEqual(str(actual.exception), str(expected.exception))
+
+    def test_api_round_trip(self):
+        self.make_products(2)
+        response = self.client.get('/api/products/')
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+
+@override_settings(CACHES=NO_CACHE)
+class StreamingListTests(CatalogTestMixin, APITestCase):
+    """
+    `?stream=true` renders the same rows as one JSON array, batch by batch from a server-side cursor.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+        self.products = self.make_products(7)
+
+    def stream(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    @override_settings(PRODUCT_BULK_CHUNK_SIZE=3)
+    def test_products_stream(self):
+        streamed = self.stream('/api/products/?stream=true&ordering=-name&min_price=1')
+        serialized = ProductSerializer(Product.objects.order_by('-name'), many=True).data
+        self.assertEqual(streamed, json.loads(JSONRenderer().render(serialized)))
+
+        streamed = self.stream('/api/products/?stream=true&fields=id')
+        self.assertEqual(streamed, [{'id': product.pk} for product in sorted(self.products, key=lambda p: p.name)])
+
+    @override_settings(PRODUCT_BULK_CHUNK_SIZE=2)
+    def test_orders_stream(self):
+        orders = [self.make_order(self.user, self.products[:index]) for index in range(1, 5)]
+        streamed = self.stream('/api/orders/?stream=true')
+        self.assertEqual([order['id'] for order in streamed], [order.pk for order in reversed(orders)])
+        self.assertEqual([len(order['items']) for order in streamed], [4, 3, 2, 1])
+
+    def test_empty_stream(self):
+        self.assertEqual(self.stream('/api/orders/?stream=true'), [])
+
+
+@override_settings(CACHES=NO_CACHE, RESPONSE_COMPRESSION=True, RESPONSE_COMPRESSION_MIN_SIZE=500)
+class CompressionTests(CatalogTestMixin, APITestCase):
+    """
+    Opt-in response compression: JSON above the size threshold only, never for 304s.
+    """
+
+    def setUp(self):
+        self.make_products(5)
+
+    def test_gzip_above_threshold(self):
+        plain = self.client.get('/api/products/')
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+    @skipUnless(brotli is not None, "brotli is not installed")
+    def test_brotli_preferred(self):
+        plain = self.client.get('/api/products/')
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_skipped_below_threshold_and_without_accept_encoding(self):
+        response = self.client.get('/api/categories/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get('/api/products/')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_not_modified_is_not_compressed(self):
+        etag = self.client.get('/api/products/')['ETag']
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_list(self):
+        plain = b''.join(self.client.get('/api/products/?stream=true').streaming_content)
+        response = self.client.get('/api/products/?stream=true', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+    @override_settings(RESPONSE_COMPRESSION=False)
+    def test_disabled_by_default(self):
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+@override_settings(CACHES=NO_CACHE)
+class AsyncCatalogTests(CatalogTestMixin, APITestCase):
+    """
+    The async catalog endpoints answer like their sync counterparts, validators and caching included.
+    """
+
+    def setUp(self):
+        suggestion_index.clear()
+        self.products = self.make_products(7)
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('120.00'), name='Desk lamp')
+
+    async def assertSameAsSync(self, sync_url, async_url):
+        expected = await sync_to_async(self.client.get)(sync_url)
+        response = await self.async_client.get(async_url)
+        self.assertEqual(response.status_code, expected.status_code)
+        # Pagination links point at the endpoint that was called.
+        content = response.content.replace(b'/api/async/', b'/api/')
+        self.assertEqual(json.loads(content), json.loads(expected.content))
+
+    async def test_product_list(self):
+        for query in ('', '?page=2', '?ordering=-price', '?min_price=50', f'?category={self.products[1].category_id}'):
+            with self.subTest(query=query):
+                await self.assertSameAsSync(f'/api/products/{query}', f'/api/async/products/{query}')
+
+    async def test_product_detail(self):
+        pk = self.products[0].pk
+        await self.assertSameAsSync(f'/api/products/{pk}/', f'/api/async/products/{pk}/')
+        response = await self.async_client.get('/api/async/products/999999/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_category_list_and_suggestions(self):
+        await self.assertSameAsSync('/api/categories/', '/api/async/categories/')
+        await self.assertSameAsSync('/api/products/suggest/?q=des', '/api/async/products/suggest/?q=des')
+
+    async def test_invalid_requests(self):
+        response = await self.async_client.get('/api/async/products/?category=999999')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category', json.loads(response.content))
+        response = await self.async_client.get('/api/async/products/?page=99')
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.post('/api/async/products/')
+        self.assertEqual(response.status_code, 405)
+
+    async def test_validators_match_the_sync_endpoint(self):
+        pk = self.products[0].pk
+        for path in ('products/?ordering=-price', f'products/{pk}/', 'categories/'):
+            with self.subTest(path=path):
+                expected = await sync_to_async(self.client.get)(f'/api/{path}')
+                response = await self.async_client.get(f'/api/async/{path}')
+                self.assertEqual(response['ETag'], expected['ETag'])
+                self.assertEqual(response['Last-Modified'], expected['Last-Modified'])
+                response = await self.async_client.get(f'/api/async/{path}', headers={'If-None-Match': expected['ETag']})
+                self.assertEqual(response.status_code, 304)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    async def test_responses_are_cached_until_the_catalog_changes(self):
+        pk = self.products[0].pk
+        first = await self.async_client.get(f'/api/async/products/{pk}/')
+        # A bulk UPDATE bypasses the signals that bump the catalog generation.
+        await Product.objects.filter(pk=pk).aupdate(name='Renamed lamp')
+        cached = await self.async_client.get(f'/api/async/products/{pk}/')
+        self.assertEqual(json.loads(cached.content)['name'], 'Desk lamp')
+        self.assertEqual(cached['ETag'], first['ETag'])
+
+        await sync_to_async(catalog_cache.invalidate_catalog)()
+        fresh = await self.async_client.get(f'/api/async/products/{pk}/')
+        self.assertEqual(json.loads(fresh.content)['name'], 'Renamed lamp')
+
+    @override_settings(ASYNC_DB_CONCURRENCY=1, ASYNC_DB_QUEUE_TIMEOUT=0.01)
+    async def test_concurrency_is_bounded(self):
+        slots = get_query_slots()
+        while not slots.locked():
+            await slots.acquire()
+        response = await self.async_client.get('/api/async/categories/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+class DatabaseConfigTests(APITestCase):
+    """
+    Connection management is configured from the environment and reported per alias.
+    """
+
+    def config(self, **env):
+        with mock.patch.dict(os.environ, env, clear=True):
+            return database_config('POSTGRES')
+
+    def test_per_request_connections_by_default(self):
+        # Persistent connections leak under ASGI, so they are opt-in.
+        config = self.config(POSTGRES_DB='shop')
+        self.assertEqual(config['NAME'], 'shop')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', config['OPTIONS'])
+
+        self.assertEqual(self.config(DB_CONN_MAX_AGE='60')['CONN_MAX_AGE'], 60)
+        config = self.config(DB_CONN_MAX_AGE='None', DB_CONN_HEALTH_CHECKS='False')
+        self.assertIsNone(config['CONN_MAX_AGE'])
+        self.assertFalse(config['CONN_HEALTH_CHECKS'])
+
+    def test_replica_falls_back_to_primary_values(self):
+        env = {'POSTGRES_USER': 'shop', 'POSTGRES_HOST': 'primary', 'POSTGRES_REPLICA_HOST': 'replica'}
+        with mock.patch.dict(os.environ, env, clear=True):
+            config = database_config('POSTGRES_REPLICA', fallback='POSTGRES')
+        self.assertEqual((config['HOST'], config['USER']), ('replica', 'shop'))
+
+    @skipUnless(pool_available(), "psycopg 3 and psycopg-pool are not installed")
+    def test_pool_replaces_persistent_connections(self):
+        config = self.config(DB_POOL='True', DB_POOL_MAX_SIZE='4')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 4)
+
+    def test_pool_without_psycopg_3_fails_loudly(self):
+        with mock.patch('ecommerce_backend.databases.pool_available', return_value=False):
+            with self.assertRaises(ImproperlyConfigured):
+                self.config(DB_POOL='True')
+
+    def test_stats_are_admin_only(self):
+        self.client.force_authenticate(User.objects.create_user(username='shopper', password='secret-pass-123'))
+        self.assertEqual(self.client.get('/api/database/stats/').status_code, 403)
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='secret-pass-123', is_staff=True))
+        stats = self.client.get('/api/database/stats/').data['default']
+        self.assertEqual(stats['pooled'], stats['pool'] is not None)
+        self.assertIsInstance(stats['connects'], int)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_a', 'replica_b'])
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    Routing decisions: safe requests read from one replica, everything else goes to the primary.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.token = str(AccessToken.for_user(User(pk=7)))
+
+    def route(self, method, write=False):
+        request = RequestFactory().generic(method, '/api/products/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        state = RoutingState.for_request(request)
+        token = activate(state)
+        try:
+            aliases = [self.router.db_for_read(Product) for _ in range(3)]
+            if write:
+                self.assertEqual(self.router.db_for_write(Product), 'default')
+                aliases.append(self.router.db_for_read(Product))
+        finally:
+            deactivate(token)
+        state.finish(request)
+        return aliases
+
+    def test_outside_requests_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.assertEqual(self.router.db_for_write(Product), 'default')
+
+    def test_safe_requests_read_from_one_replica(self):
+        aliases = self.route('GET')
+        self.assertIn(aliases[0], ['replica_a', 'replica_b'])
+        self.assertEqual(len(set(aliases)), 1)
+        self.assertIsNone(cache.get(pin_key(7)))
+
+    def test_unsafe_requests_use_the_primary_and_pin_the_user(self):
+        self.assertEqual(set(self.route('POST')), {'default'})
+        self.assertEqual(set(self.route('GET')), {'default'})
+        cache.delete(pin_key(7))  # The pin expired
+        self.assertNotIn('default', self.route('GET'))
+
+    def test_write_in_a_safe_request_moves_later_reads_to_the_primary(self):
+        aliases = self.route('GET', write=True)
+        self.assertEqual(aliases[-1], 'default')
+        self.assertEqual(set(self.route('GET')), {'default'})
+
+    def test_related_reads_follow_the_instance(self):
+        product = Product(pk=1)
+        product._state.db = 'replica_b'
+        self.assertEqual(self.router.db_for_read(Category, instance=product), 'replica_b')
+
+
+REPLICA = 'replica_under_test'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], **NO_BACKGROUND_WORK)
+class ReplicaRoutingTests(CatalogTestMixin, TransactionTestCase):
+    """
+    Read-your-writes against two local databases: the test primary and a separately migrated copy
+    standing in for a replica. Rows reach the replica only when a test copies them, which
+    simulates replication lag.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # The replica alias only exists from here on, so the runner's checks never see it.
+        primary = connections['default'].settings_dict
+        replica = copy.deepcopy(primary)
+        replica['TEST'].update(NAME=f"{primary['NAME']}_replica", MIRROR=None)
+        connections.settings[REPLICA] = replica  # The same dict as settings.DATABASES
+        connections[REPLICA].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cls.databases = {'default', REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].creation.destroy_test_db(verbosity=0)
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self):
+        cache.clear()
+        self.product = self.make_products(1)[0]
+        self.shopper = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.other = User.objects.create_user(username='other', password='secret-pass-123')
+        self.replicate(self.shopper, self.other)
+
+    def replicate(self, *objects):
+        for obj in objects:
+            type(obj).objects.using(REPLICA).bulk_create([copy.copy(obj)])
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    def test_catalog_reads_go_to_the_replica(self):
+        self.assertEqual(self.client.get('/api/products/').data['count'], 0)
+        self.replicate(self.product.category, self.product)
+        cache.clear()
+        self.assertEqual(self.client.get('/api/products/').data['count'], 1)
+
+    def test_lagging_replica_reads_are_not_cached_after_a_write(self):
+        # The product was just created (a catalog invalidation) and has not reached the replica.
+        self.assertEqual(self.client.get('/api/products/').data['count'], 0)
+        self.replicate(self.product.category, self.product)
+        self.assertEqual(self.client.get('/api/products/').data['count'], 1)
+
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.client.get('/api/products/')
+            with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+                self.assertEqual(self.client.get('/api/products/').data['count'], 1)
+        self.assertFalse(replica_queries.captured_queries)
+
+    def test_writer_reads_its_own_writes(self):
+        self.replicate(self.product.category, self.product)
+        shopper = self.client_for(self.shopper)
+        response = shopper.post('/api/cart-items/', {'product_id': self.product.pk, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(CartItem.objects.using(REPLICA).exists())
+
+        # Pinned to the primary: the item shows up although the replica has not caught up.
+        items = shopper.get('/api/cart-items/').data['results']
+        self.assertEqual([item['quantity'] for item in items], [2])
+        # Other users keep reading from the replica.
+        self.replicate(Cart.objects.get(user=self.other))
+        get_cart_id(self.other)
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            self.assertEqual(self.client_for(self.other).get('/api/cart-items/').data['results'], [])
+        self.assertTrue(replica_queries.captured_queries)
+        self.assertIsNone(cache.get(pin_key(self.other.pk)))
+
+        # Once the pin expires the shopper is back on the (lagging) replica.
+        cache.delete(pin_key(self.shopper.pk))
+        self.assertEqual(shopper.get('/api/cart-items/').data['results'], [])
+
+
+@override_settings(CACHES=NO_CACHE, ORDER_QUEUE_BROKER='local', **NO_BACKGROUND_WORK)
+class OrderPipelineTests(CatalogTestMixin, APITestCase):
+    """
+    Checkout queues committed orders; the pipeline reconciles stock, moves them to `processing`
+    and emails the customer, a batch at a time.
+    """
+
+    def setUp(self):
+        self.pipeline = get_pipeline()
+        self.pipeline.broker.purge()
+        self.pipeline.metrics.reset()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, product, quantity=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/checkout/', {
+                'order_items': [{'product': product.pk, 'quantity': quantity}]
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Order.objects.get(pk=response.data['id'])
+
+    def test_checkout_queues_the_order_for_processing(self):
+        sold_out, in_stock = self.make_products(2, stock=2)
+        first = self.checkout(sold_out, quantity=2)
+        second = self.checkout(in_stock)
+        self.assertEqual(first.status, 'pending')
+        self.assertEqual(self.pipeline.get_stats()['depth']['reconcile_stock'], 2)
+
+        # Both orders run through every stage together: one batch per stage.
+        self.assertEqual(self.pipeline.drain(), 6)
+        self.assertEqual(
+            set(Order.objects.filter(pk__in=[first.pk, second.pk]).values_list('status', flat=True)),
+            {'processing'},
+        )
+        sold_out.refresh_from_db()
+        self.assertEqual((sold_out.stock, sold_out.available), (0, True))
+        self.assertEqual(sorted(message.subject for message in mail.outbox),
+                         [f"Order {first.pk} confirmed", f"Order {second.pk} confirmed"])
+
+        stats = self.pipeline.get_stats()
+        self.assertEqual(stats['depth'], {'reconcile_stock': 0, 'process': 0, 'notify': 0})
+        for stage in ('reconcile_stock', 'process', 'notify'):
+            self.assertEqual(stats['stages'][stage]['jobs'], 2)
+            self.assertEqual(stats['stages'][stage]['batches'], 1)
+        self.assertEqual(stats['end_to_end']['count'], 2)
+
+    def test_sold_out_products_are_listed_again_once_restocked(self):
+        product = self.make_products(1, stock=1)[0]
+        self.checkout(product)
+        self.pipeline.drain()
+
+        def listed(**params):
+            response = self.client.get('/api/products/', {'available': 'true', **params})
+            return [row['id'] for row in response.data['results']]
+
+        self.assertEqual((listed(in_stock='true'), listed(in_stock='false')), ([], [product.pk]))
+        Product.objects.filter(pk=product.pk).update(stock=5)
+        self.assertEqual(listed(in_stock='true'), [product.pk])
+
+    @override_settings(INVENTORY_RESERVATIONS=True)
+    def test_sharded_stock_copy_is_reconciled(self):
+        product = self.make_products(1, stock=8)[0]
+        shard_product(product.pk, 4)
+        self.checkout(product, quantity=3)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 8)  # Checkout only touches the shards
+        self.pipeline.drain()
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 5)
+
+    def test_sharded_stock_is_left_alone_without_reservations(self):
+        product = self.make_products(1, stock=8)[0]
+        shard_product(product.pk, 4)
+        self.checkout(product, quantity=3)
+        self.pipeline.drain()
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 5)
+
+    def test_failed_submit_is_requeued_later(self):
+        with mock.patch('products.pipeline.get_pipeline', side_effect=RuntimeError("queue down")):
+            with self.assertLogs(level='ERROR'):
+                order = self.checkout(self.make_products(1)[0])
+        self.assertEqual(self.pipeline.get_stats()['depth']['reconcile_stock'], 0)
+
+        Order.objects.filter(pk=order.pk).update(ordered_at=timezone.now() - timezone.timedelta(hours=1))
+        recent = self.make_order(self.user, [])
+        call_command('process_orders', '--once', '--requeue-pending', '--pending-for', '600', stdout=io.StringIO())
+        order.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((order.status, recent.status), ('processing', 'pending'))
+
+    def test_status_updates_are_batched(self):
+        def count_stage_queries(size):
+            orders = [self.make_order(self.user, []) for _ in range(size)]
+            with CaptureQueriesContext(connection) as context:
+                moved = transition_orders([order.pk for order in orders], 'processing')
+            self.assertEqual(len(moved), size)
+            return len(context.captured_queries)
+
+        self.assertEqual(count_stage_queries(2), count_stage_queries(20))
+
+    def test_transitions_follow_the_status_machine(self):
+        order = self.make_order(self.user, [])
+        self.assertEqual(transition_orders([order.pk], 'shipped'), [])
+        self.assertEqual(len(transition_orders([order.pk], 'processing')), 1)
+        self.assertEqual(len(transition_orders([order.pk], 'shipped')), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'shipped')
+
+    def test_failing_stage_is_retried_then_dropped(self):
+        order = self.checkout(self.make_products(1)[0])
+        with mock.patch.dict(STAGE_HANDLERS, notify=mock.Mock(side_effect=RuntimeError("mail server down"))):
+            with self.assertLogs('products.pipeline', 'ERROR') as logs:
+                self.pipeline.drain()
+        self.assertEqual(len(logs.records), 3)
+        stats = self.pipeline.get_stats()['stages']['notify']
+        self.assertEqual((stats['retries'], stats['dropped'], stats['jobs']), (2, 1, 0))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'processing')
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(ORDER_QUEUE_BROKER='sqlite', ORDER_QUEUE_PATH=':memory:')
+    def test_sqlite_broker(self):
+        pipeline = get_pipeline()
+        self.assertIsInstance(pipeline.broker, SQLiteBroker)
+        order = self.checkout(self.make_products(1)[0])
+        self.assertEqual(pipeline.get_stats()['depth']['reconcile_stock'], 1)
+        self.assertEqual(pipeline.drain(), 3)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'processing')
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_sqlite_claims_are_exclusive_until_they_expire(self):
+        broker = SQLiteBroker(':memory:', visibility_timeout=60)
+        self.addCleanup(broker.close)
+        broker.put('process', {'orders': [1]})
+        self.assertEqual(len(broker.take(10, timeout=0)), 1)
+        self.assertEqual(broker.take(10, timeout=0), [])
+        self.assertEqual(broker.depth(), {})
+
+        broker.visibility_timeout = 0  # The worker that claimed it is presumed dead.
+        reclaimed = broker.take(10, timeout=0)
+        self.assertEqual([job.payload for job in reclaimed], [{'orders': [1]}])
+        broker.ack(reclaimed)
+        broker.visibility_timeout = 60
+        self.assertEqual(broker.take(10, timeout=0), [])
+
+    def test_stats_view_is_admin_only(self):
+        self.assertEqual(self.client.get('/api/order-pipeline/stats/').status_code, 403)
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='x', is_staff=True))
+        response = self.client.get('/api/order-pipeline/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['broker'], 'local')
+        self.assertEqual(self.client.delete('/api/order-pipeline/stats/').status_code, 204)
+
+
+@override_settings(CACHES=NO_CACHE, INVENTORY_RESERVATIONS=True, **NO_BACKGROUND_WORK)
+class InventoryReservationTests(CatalogTestMixin, APITestCase):
+    """
+    Adding to cart holds stock until the hold expires or is checked out.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+        self.product = self.make_products(1, stock=5)[0]
+
+    def add(self, quantity, product=None):
+        return self.client.post('/api/cart-items/', {
+            'product_id': (product or self.product).pk, 'quantity': quantity,
+        }, format='json')
+
+    def stock(self, product=None):
+        product = Product.objects.get(pk=(product or self.product).pk)
+        return available_stock({product.pk: product})[product.pk]
+
+    def checkout(self, quantity, product=None):
+        return self.client.post('/api/checkout/', {
+            'order_items': [{'product': (product or self.product).pk, 'quantity': quantity}]
+        }, format='json')
+
+    def test_cart_changes_move_the_hold(self):
+        response = self.add(2)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.stock(), 3)
+        item_url = f"/api/cart-items/{response.data['id']}/"
+        self.assertEqual(self.client.patch(item_url, {'quantity': 4}, format='json').status_code, 200)
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(StockReservation.objects.get().quantity, 4)
+        # Only what is still free can be added.
+        self.assertEqual(self.add(2).status_code, 400)
+        self.assertEqual(self.client.delete(item_url).status_code, 204)
+        self.assertEqual(self.stock(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_batch_reserves_and_rolls_back(self):
+        scarce = self.make_products(1, stock=1)[0]
+        response = self.client.post('/api/cart-items/batch/', {'operations': [
+            {'op': 'add', 'product_id': self.product.pk, 'quantity': 2},
+            {'op': 'set', 'product_id': scarce.pk, 'quantity': 2},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(), 5)
+        response = self.client.post('/api/cart-items/batch/', {'operations': [
+            {'op': 'add', 'product_id': self.product.pk, 'quantity': 2},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.stock(), 3)
+
+    def test_checkout_uses_the_hold_without_touching_the_product(self):
+        self.add(3)
+        other = User.objects.create_user(username='other', password='secret-pass-123')
+        self.client.force_authenticate(other)
+        # The held units are not for sale to anyone else.
+        self.assertEqual(self.checkout(3).data['lines'][0]['available'], 2)
+
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.checkout(3).status_code, 201)
+        writes = [query['sql'] for query in context.captured_queries
+                  if '"products_product"' in query['sql'] and ('FOR UPDATE' in query['sql'] or query['sql'].startswith('UPDATE'))]
+        self.assertEqual(writes, [])
+        self.assertEqual(self.stock(), 2)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_takes_the_shortfall_and_returns_the_surplus(self):
+        self.add(2)
+        self.assertEqual(self.checkout(3).status_code, 201)
+        self.assertEqual(self.stock(), 2)
+        self.add(2)
+        self.assertEqual(self.checkout(1).status_code, 201)
+        self.assertEqual(self.stock(), 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_holds_are_swept_back(self):
+        self.add(4)
+        self.assertEqual(sweep_expired(), 0)
+        StockReservation.objects.update(expires_at=timezone.now())
+        self.assertEqual(sweep_expired(), 1)
+        self.assertEqual(self.stock(), 5)
+        # The cart item stays; checking it out now takes from stock.
+        self.assertEqual(self.checkout(4).status_code, 201)
+        self.assertEqual(self.stock(), 1)
+
+    def test_deleted_cart_releases_its_holds(self):
+        self.add(4)
+        self.user.delete()
+        self.assertEqual(self.stock(), 5)
+
+    def test_sharded_stock(self):
+        self.assertEqual(shard_product(self.product.pk, 3), 5)
+        self.assertEqual(sorted(StockShard.objects.values_list('stock', flat=True)), [1, 2, 2])
+        self.assertEqual(self.add(1).status_code, 201)
+        self.assertEqual(self.stock(), 4)
+        # More than any single shard holds: taken across shards.
+        self.assertEqual(self.checkout(4).status_code, 201)
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(self.checkout(2).status_code, 400)
+
+        # Catalog reads show the copy refreshed by the sweep.
+        self.assertEqual(refresh_sharded_stock(), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 1)
+        # An admin restock goes to the shards.
+        product = Product.objects.get(pk=self.product.pk)
+        product.stock = 30
+        product.save()
+        self.assertEqual(self.stock(), 30)
+        product.name = "Renamed"
+        product.save()
+        self.assertEqual(self.stock(), 30)
+
+        self.assertEqual(shard_product(self.product.pk, 0), 30)
+        self.assertFalse(StockShard.objects.exists())
+        self.assertEqual(self.stock(), 30)
+
+    @override_settings(INVENTORY_RESERVATIONS=False)
+    def test_row_lock_mode(self):
+        self.assertEqual(self.add(5).status_code, 201)
+        self.assertEqual(self.stock(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.checkout(5).status_code, 201)
+        self.assertEqual(self.stock(), 0)
+
+
+@skipUnless(connection.features.has_select_for_update, "Requires row-level locking.")
+@override_settings(CACHES=NO_CACHE, INVENTORY_RESERVATIONS=True, **NO_BACKGROUND_WORK)
+class ShardedReservationConcurrencyTests(CatalogTestMixin, TransactionTestCase):
+    """
+    Parallel add-to-carts against one sharded SKU must never hold more than its stock.
+    """
+    buyers = 12
+    stock = 5
+
+    def test_parallel_reservations_do_not_oversell(self):
+        product = self.make_products(1, stock=self.stock)[0]
+        shard_product(product.pk, 4)
+        users = [
+            User.objects.create_user(username=f'buyer{index}', password='secret-pass-123')
+            for index in range(self.buyers)
+        ]
+        barrier = threading.Barrier(self.buyers)
+        statuses = []
+
+        def reserve(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                response = client.post('/api/cart-items/', {'product_id': product.pk, 'quantity': 1}, format='json')
+                statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reserve, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses.count(201), self.stock)
+        self.assertEqual(statuses.count(400), self.buyers - self.stock)
+        self.assertEqual(sum(StockShard.objects.values_list('stock', flat=True)), 0)
+        self.assertEqual(sum(StockReservation.objects.values_list('quantity', flat=True)), self.stock)
+
+
+@override_settings(**NO_BACKGROUND_WORK)
+class IdempotencyTests(CatalogTestMixin, APITestCase):
+    """
+    Writes retried with the same Idempotency-Key must be applied once and replay the first response.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, product, key, quantity=1):
+        return self.client.post('/api/checkout/', {
+            'order_items': [{'product': product.pk, 'quantity': quantity}]
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_checkout_retry_replays_the_first_order(self):
+        product = self.make_products(1, stock=5)[0]
+        first = self.checkout(product, 'order-1')
+        self.assertEqual(first.status_code, 201, first.data)
+
+        with CaptureQueriesContext(connection) as replay:
+            retry = self.checkout(product, 'order-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(len(replay.captured_queries), 1)
+        self.assertNotIn('products_product', replay.captured_queries[0]['sql'])
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 4)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        product = self.make_products(1, stock=5)[0]
+        self.assertEqual(self.checkout(product, 'order-1').status_code, 201)
+        response = self.checkout(product, 'order-1', quantity=2)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_request_leaves_the_key_free(self):
+        product = self.make_products(1, stock=1)[0]
+        self.assertEqual(self.checkout(product, 'order-1', quantity=2).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        Product.objects.filter(pk=product.pk).update(stock=2)
+        self.assertEqual(self.checkout(product, 'order-1', quantity=2).status_code, 201)
+
+    def test_cart_add_retry_adds_once(self):
+        product = self.make_products(1, stock=5)[0]
+        for _ in range(3):
+            response = self.client.post('/api/cart-items/', {'product_id': product.pk, 'quantity': 2},
+                                        format='json', HTTP_IDEMPOTENCY_KEY='add-1')
+            self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(CartItem.objects.get(product=product).quantity, 2)
+
+    def test_expired_keys_are_ignored_and_purged(self):
+        product = self.make_products(1, stock=5)[0]
+        self.assertEqual(self.checkout(product, 'order-1').status_code, 201)
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        retry = self.checkout(product, 'order-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(Order.objects.count(), 2)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertEqual(purge_expired(), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+@override_settings(INVENTORY_RESERVATIONS=True, **NO_BACKGROUND_WORK)
+class IdempotencyConcurrencyTests(CatalogTestMixin, TransactionTestCase):
+    """
+    Concurrent duplicates of one keyed request must run it once and all get its response.
+    """
+    duplicates = 8
+
+    def send_duplicates(self, user, url, data):
+        barrier = threading.Barrier(self.duplicates)
+        responses = []
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                responses.append(client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-1'))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=send) for _ in range(self.duplicates)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_concurrent_checkout_duplicates_place_one_order(self):
+        product = self.make_products(1, stock=5)[0]
+        user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        responses = self.send_duplicates(user, '/api/checkout/', {
+            'order_items': [{'product': product.pk, 'quantity': 1}]
+        })
+
+        self.assertEqual([response.status_code for response in responses], [201] * self.duplicates)
+        self.assertEqual(len({response.json()['id'] for response in responses}), 1)
+        self.assertEqual(sum(response.has_header('Idempotent-Replayed') for response in responses),
+                         self.duplicates - 1)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 4)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_cart_batch_duplicates_apply_once(self):
+        product = self.make_products(1, stock=20)[0]
+        user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        responses = self.send_duplicates(user, '/api/cart-items/batch/', {
+            'operations': [{'op': 'add', 'product_id': product.pk, 'quantity': 2}]
+        })
+
+        self.assertEqual([response.status_code for response in responses], [200] * self.duplicates)
+        self.assertEqual(CartItem.objects.get(product=product).quantity, 2)
+        self.assertEqual(StockReservation.objects.get(product=product).quantity, 2)
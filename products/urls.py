@@ -1,6 +1,7 @@
 # products/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     CategoryViewSet,
     ProductViewSet,
@@ -9,6 +10,9 @@ from .views import (
     OrderViewSet,
     OrderItemViewSet,
     CheckoutView,
+    CatalogCacheStatsView,
+    DatabaseStatsView,
+    OrderPipelineStatsView,
     ProtectedView
 )
 
@@ -27,5 +31,14 @@ urlpatterns = [
 
     # Custom API paths
     path('checkout/', CheckoutView.as_view(), name='checkout'),
+    path('catalog-cache/stats/', CatalogCacheStatsView.as_view(), name='catalog-cache-stats'),
+    path('database/stats/', DatabaseStatsView.as_view(), name='database-stats'),
+    path('order-pipeline/stats/', OrderPipelineStatsView.as_view(), name='order-pipeline-stats'),
     path('protected/', ProtectedView.as_view(), name='protected-view'),
+
+    # Async variants of the catalog reads, for ASGI deployments
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/products/suggest/', async_views.product_suggestions, name='async-product-suggest'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('async/categories/', async_views.category_list, name='async-category-list'),
 ]
@@ -1,26 +1,360 @@
 # products/views.py
 
-from rest_framework import viewsets, filters, generics, status
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser
+import hashlib
+import logging
+from decimal import Decimal
+
+from rest_framework import viewsets, filters, generics, serializers, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Case, Count, F, Max, Q, When
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
+from . import cache as catalog_cache
+from . import dbstats
+from . import inventory
+from . import pipeline as order_pipeline
+from .bulk import FORMATS, ProductImporter, batched, export_rows, get_chunk_size, guess_format, read_rows
+from .fastpath import compile_serializer
+from .fieldsets import Fieldset
+from .idempotency import idempotent
+from .carts import get_cart_id
+from .filters import ProductFilter, facet_counts
+from .pagination import KeysetOrPageNumberPagination
+from .routers import reading_from_replica
+from .search import ProductSearchFilter
+from .suggest import suggestion_index
+from .summaries import adjust_cart_summary
 from .models import Category, Product, Cart, CartItem, Order, OrderItem
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
     CartSerializer,
+    CartSummarySerializer,
     CartItemSerializer,
     OrderSerializer,
+    OrderSummarySerializer,
     OrderItemSerializer,
 )
 
+logger = logging.getLogger(__name__)
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+# ----------------- Mixins -----------------
+
+class EagerLoadingViewSetMixin:
+    """
+    Applies the serializer's declared eager-loading plan to the view's queryset.
+    - Serializers built on `EagerLoadingMixin` declare the relations they render.
+    - The plan is applied in `filter_queryset`, which both list and detail lookups go through,
+      so subclasses can keep overriding `get_queryset` as usual.
+    """
+
+    def get_fieldset(self):
+        return None
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        setup_eager_loading = getattr(serializer_class, 'setup_eager_loading', None)
+        if setup_eager_loading is None:
+            return queryset
+
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return setup_eager_loading(queryset)
+        return setup_eager_loading(queryset, fieldset, self.get_ordering_columns(queryset))
+
+    def get_ordering_columns(self, queryset):
+        """
+        Plain columns the queryset may be ordered by, which cursor pagination reads back from rows.
+        """
+        ordering = [*queryset.query.order_by, *(getattr(self, 'ordering', None) or ()), *queryset.model._meta.ordering]
+        columns = {field.name for field in queryset.model._meta.concrete_fields}
+        return [name.lstrip('-') for name in ordering if isinstance(name, str) and name.lstrip('-') in columns]
+
+
+class StreamingListMixin:
+    """
+    `?stream=true` returns the whole filtered list as one JSON array, streamed instead of paginated.
+    - Rows are read from a server-side cursor and rendered batch by batch, so memory stays flat
+      however long the list is.
+    - Batches go through the compiled fast serializer when available, the regular serializer otherwise.
+    - Must come before `FastListMixin`; the ETag/Last-Modified validators still apply.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream', '').lower() not in ('1', 'true', 'yes'):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(self.stream_json(queryset), content_type='application/json')
+
+    def get_json_renderer(self):
+        renderers = [renderer for renderer in self.get_renderers() if renderer.media_type == 'application/json']
+        return renderers[0] if renderers else JSONRenderer()
+
+    def stream_json(self, queryset):
+        renderer = self.get_json_renderer()
+        chunk_size = get_chunk_size()
+        fast_serializer = self.get_fast_serializer()
+        if fast_serializer is not None:
+            rows = fast_serializer.values(queryset).iterator(chunk_size=chunk_size)
+            batches = (fast_serializer.represent(batch) for batch in batched(rows, chunk_size))
+        else:
+            instances = queryset.iterator(chunk_size=chunk_size)
+            batches = (self.get_serializer(batch, many=True).data for batch in batched(instances, chunk_size))
+
+        yield b'['
+        separator = b''
+        for batch in batches:
+            # Each batch renders as `[...]`; drop the brackets and splice it into the outer array.
+            yield separator + renderer.render(batch)[1:-1]
+            separator = b','
+        yield b']'
+
+
+class FastListMixin:
+    """
+    Serves `list` through the serializer compiled by `products.fastpath`: rows come from `.values()`
+    and are mapped by precompiled field formatters, producing the serializer's exact output.
+    - Falls back to the serializer for sparse fieldsets, for serializers the compiler does not
+      support, and when `FAST_LIST_SERIALIZERS` is off.
+    - Must come before `EagerLoadingViewSetMixin`; filters, search and both pagination modes apply as usual.
+    """
+
+    def list(self, request, *args, **kwargs):
+        fast_serializer = self.get_fast_serializer()
+        if fast_serializer is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = fast_serializer.values(queryset, self.get_ordering_columns(queryset))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast_serializer.represent(page))
+        return Response(fast_serializer.represent(rows))
+
+    def get_fast_serializer(self):
+        if not getattr(settings, 'FAST_LIST_SERIALIZERS', True) or self.get_fieldset() is not None:
+            return None
+        return compile_serializer(self.get_serializer_class())
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets for read requests: `?fields=` picks the fields to render and `?expand=`
+    the relations to render as nested objects.
+    - Dotted paths reach into nested objects (`?fields=id,items.quantity`, `?expand=items.product`).
+    - With `?fields=`, relations that are not expanded render as primary keys.
+    - The selection also trims the SQL: unexpanded relations are not joined, and only the
+      selected columns are loaded. Must come before `EagerLoadingViewSetMixin`.
+    """
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = None
+            if self.request is not None and self.request.method in SAFE_METHODS:
+                params = self.request.query_params
+                self._fieldset = Fieldset.from_query_params(params.get('fields'), params.get('expand'))
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            kwargs.setdefault('fieldset', fieldset)
+        return super().get_serializer(*args, **kwargs)
+
+
+def validator_aggregates(last_modified_fields):
+    """
+    The aggregate behind a catalog resource's validators: its row count and latest timestamps.
+    """
+    aggregates = {f"max_{index}": Max(field) for index, field in enumerate(last_modified_fields)}
+    return {'count': Count('pk', distinct=True), **aggregates}
+
+
+def make_validators(values):
+    """
+    Returns `(etag, last_modified)` from a `validator_aggregates` result, where `last_modified`
+    is a Unix timestamp or None.
+    """
+    timestamps = [value for name, value in values.items() if name != 'count' and value is not None]
+    last_modified = max(timestamps) if timestamps else None
+    digest = hashlib.md5(f"{values['count']}:{last_modified.isoformat() if last_modified else ''}".encode()).hexdigest()
+    return f'W/"{digest}"', int(last_modified.timestamp()) if last_modified else None
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for `list` and `retrieve`.
+    - Validators come from `MAX(updated_at)` and `COUNT` over the filtered queryset,
+      computed before anything is serialized, so a `304 Not Modified` skips serialization.
+    - `last_modified_fields` may name related timestamps whose changes show up in nested output.
+    """
+    last_modified_fields = ('updated_at',)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def get_validators(self):
+        """
+        Returns `(etag, last_modified)` for the current request, where `last_modified`
+        is a Unix timestamp or None. Returns None when validators do not apply: keyset pages,
+        or a detail lookup that matches nothing (the regular handler raises the 404).
+        """
+        use_cursor = getattr(self.paginator, 'use_cursor', None)
+        if self.action == 'list' and use_cursor is not None and use_cursor(self.request):
+            # Keyset pages must not pay for a full-table aggregate on every page.
+            return None
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            try:
+                queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            except (TypeError, ValueError, ValidationError):
+                return None
+
+        values = queryset.aggregate(**validator_aggregates(self.last_modified_fields))
+        if self.action == 'retrieve' and not values['count']:
+            return None
+        return make_validators(values)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return handler(request, *args, **kwargs)
+
+        etag, last_modified = validators
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class CatalogCacheMixin:
+    """
+    Read-through cache for catalog `list` and `retrieve` responses.
+    - Keys cover the path and all query parameters (filters, search, ordering, page).
+    - Entries are namespaced by a generation counter that model signals bump on every write.
+    - The ETag/Last-Modified validators are cached with the data, so conditional requests
+      answered from cache do not touch the database.
+    - Responses read from a replica are not stored until `REPLICA_PIN_SECONDS` after the last
+      invalidation: a lagging replica would otherwise put pre-write rows into the new generation,
+      where every user (including the pinned writer) would get them.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response('list', super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response('retrieve', super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, action, handler, request, *args, **kwargs):
+        key = catalog_cache.make_key(f"{self.basename}-{action}", request)
+        entry = catalog_cache.lookup(key)
+        if entry is not None:
+            not_modified = get_conditional_response(
+                request, etag=entry['etag'], last_modified=entry['last_modified']
+            )
+            if not_modified is not None:
+                return not_modified
+            headers = {'ETag': entry['etag']} if entry['etag'] else {}
+            if entry['last_modified'] is not None:
+                headers['Last-Modified'] = http_date(entry['last_modified'])
+            return Response(entry['data'], headers=headers)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK and not response.streaming and self.may_store():
+            catalog_cache.store(key, {
+                'data': response.data,
+                'etag': response.get('ETag'),
+                'last_modified': parse_http_date_safe(response.get('Last-Modified', '')),
+            })
+        return response
+
+    @staticmethod
+    def may_store():
+        if not reading_from_replica():
+            return True
+        return catalog_cache.seconds_since_invalidation() >= getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+class FacetedListMixin:
+    """
+    Adds facet counts next to the list results when `?facets=true` is passed.
+    - Counts cover the filtered queryset (filters, search) and come from one aggregate query.
+    - Sits below the catalog cache, so cached pages include their facets.
+    """
+    price_facet_boundaries = ()
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if response.streaming:
+            return response
+        if request.query_params.get('facets', '').lower() in ('1', 'true', 'yes'):
+            queryset = self.filter_queryset(self.get_queryset())
+            response.data['facets'] = facet_counts(queryset, self.price_facet_boundaries)
+        return response
+
+
+class UserCartMixin:
+    """
+    Resolves the current user's cart id once per request, from the per-user cart cache.
+    """
+
+    def get_cart_id(self):
+        if not hasattr(self, '_cart_id'):
+            self._cart_id = get_cart_id(self.request.user)
+        return self._cart_id
+
+
+class TokenClaimsAuthenticationMixin:
+    """
+    For views that use `request.user` only in permission checks (`is_authenticated`, `is_staff`).
+    - With `JWT_STATELESS_PERMISSIONS = True`, bearer tokens authenticate as a `TokenUser` built from
+      the token's claims, so no user is loaded; other authenticators (sessions) are kept.
+    """
+
+    def get_authenticators(self):
+        authenticators = super().get_authenticators()
+        if not getattr(settings, 'JWT_STATELESS_PERMISSIONS', False):
+            return authenticators
+        return [
+            JWTStatelessUserAuthentication() if isinstance(authenticator, JWTAuthentication) else authenticator
+            for authenticator in authenticators
+        ]
+
 
 # ----------------- Category & Product ViewSets -----------------
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(TokenClaimsAuthenticationMixin, CatalogCacheMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     A ViewSet for viewing and editing product categories.
     - Public users can list and retrieve categories.
@@ -37,22 +371,30 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(TokenClaimsAuthenticationMixin, CatalogCacheMixin, ConditionalGetMixin, FacetedListMixin,
+                     StreamingListMixin, FastListMixin, SparseFieldsetMixin, EagerLoadingViewSetMixin,
+                     viewsets.ModelViewSet):
     """
     A ViewSet for viewing and editing products.
     - Public users can list and retrieve products.
     - Authenticated admin users can create, update, and delete products.
-    Includes filtering, searching, and ordering.
+    Includes filtering, searching, ordering, facet counts (`?facets=true`)
+    sparse fieldsets (`?fields=id,name,price`, `?expand=category`) and streaming (`?stream=true`).
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    last_modified_fields = ('updated_at', 'category__updated_at')
+    pagination_class = KeysetOrPageNumberPagination
 
     # Enable filtering, searching, and ordering
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, filters.OrderingFilter]
 
-    # Define which fields can be filtered
-    filterset_fields = ['category', 'available']
+    # Define which fields can be filtered (category, available, price range, stock)
+    filterset_class = ProductFilter
+
+    # Price bands reported by `?facets=true`
+    price_facet_boundaries = (10, 50, 100, 500)
 
     # Define which fields can be searched
     search_fields = ['name', 'description']
@@ -66,14 +408,61 @@ class ProductViewSet(viewsets.ModelViewSet):
             self.permission_classes = [IsAdminUser]
         return super().get_permissions()
 
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def suggest(self, request):
+        """
+        Typeahead completions for `?q=`, served from the in-process prefix index.
+        - Returns up to `?limit=` (default 10, max 50) product and category names.
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        query = request.query_params.get('q', '')
+        return Response({'query': query, **suggestion_index.suggest(query, limit=limit)})
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser],
+            parser_classes=[MultiPartParser])
+    def import_catalog(self, request):
+        """
+        Admin-only bulk upsert from an uploaded CSV/NDJSON `file`, streamed in chunks.
+        - The format comes from `?file_format=` or the file extension.
+        - A file that becomes unreadable part-way gets a 400 with the report of what was committed
+          before it, and a `failed` entry naming the first row not imported.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload a CSV or NDJSON file as 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.query_params.get('file_format') or guess_format(upload.name)
+        if file_format not in FORMATS:
+            return Response({"error": f"Unsupported format '{file_format}'. Use one of: {', '.join(FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        report = ProductImporter().run(read_rows(upload.file, file_format))
+        return Response(report, status=status.HTTP_400_BAD_REQUEST if 'failed' in report else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export', permission_classes=[IsAdminUser])
+    def export_catalog(self, request):
+        """
+        Admin-only streaming export of the whole catalog as CSV (default) or NDJSON (`?file_format=ndjson`).
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_CONTENT_TYPES:
+            return Response({"error": f"Unsupported format '{file_format}'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(export_rows(file_format), content_type=EXPORT_CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
+
 
 # ----------------- Cart & Order ViewSets -----------------
 
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(UserCartMixin, SparseFieldsetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     """
     A ViewSet for a user's shopping cart.
     - Allows authenticated users to view their own cart.
     - Cart items are managed via the CartItemViewSet.
+    - Supports sparse fieldsets (`?fields=`, `?expand=items.product`).
     """
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
@@ -83,45 +472,60 @@ class CartViewSet(viewsets.ModelViewSet):
         Ensures a user can only see their own cart.
         """
         # Get or create the cart for the current user
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        return Cart.objects.filter(pk=cart.pk)
+        return Cart.objects.filter(pk=self.get_cart_id())
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        The cart badge: item count and subtotal read from the cart row alone.
+        """
+        cart = Cart.objects.only(*CartSummarySerializer.Meta.fields).get(pk=self.get_cart_id())
+        return Response(CartSummarySerializer(cart).data)
 
-class CartItemViewSet(viewsets.ModelViewSet):
+
+class CartItemViewSet(UserCartMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     """
     A ViewSet for managing items within a user's cart.
     - Allows authenticated users to create, retrieve, update, and delete items in their cart.
     - The `perform_create` method handles adding to or updating an existing item.
+    - Writes accept an `Idempotency-Key` header, so retried requests are applied once (see products/idempotency.py).
     """
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetOrPageNumberPagination
+    ordering = ['-added_at']
 
     def get_queryset(self):
         """
         Ensures a user can only manage items in their own cart.
         """
-        # Get or create the cart for the current user
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        return CartItem.objects.filter(cart=cart)
+        return CartItem.objects.filter(cart_id=self.get_cart_id()).order_by('-added_at', '-id')
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
+    @idempotent
+    def update(self, request, *args, **kwargs):
+        # `partial_update` goes through here too.
+        return super().update(request, *args, **kwargs)
+
+    @idempotent
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
+    @transaction.atomic
     def perform_create(self, serializer):
         """
         Custom create method to handle adding a product to the cart.
         If the product already exists in the cart, its quantity is updated.
         """
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        product_id = self.request.data.get('product_id')
-        quantity = self.request.data.get('quantity', 1)
-
-        product = get_object_or_404(Product, id=product_id)
-        if product.stock < quantity:
-            return Response(
-                {"detail": "Not enough stock for this product."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        product_id = serializer.validated_data['product_id']
+        quantity = serializer.validated_data.get('quantity', 1)
 
+        product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
         cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
+            cart_id=self.get_cart_id(),
             product=product,
             defaults={'quantity': quantity}
         )
@@ -129,17 +533,215 @@ class CartItemViewSet(viewsets.ModelViewSet):
         if not created:
             cart_item.quantity += quantity
             cart_item.save()
+        self.hold_stock({product.pk: product}, {product.pk: cart_item.quantity})
+        adjust_cart_summary(cart_item.cart_id, quantity, product.price * quantity)
+        serializer.instance = cart_item
+
+    def perform_update(self, serializer):
+        """
+        Updates an item's quantity (or product) and applies the difference to the cart summary.
+        """
+        instance = serializer.instance
+        old_quantity, old_price = instance.quantity, instance.product.price
+        product_id = serializer.validated_data.get('product_id', instance.product_id)
+        quantity = serializer.validated_data.get('quantity', instance.quantity)
+
+        product = instance.product
+        if product_id != instance.product_id:
+            product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
+
+        with transaction.atomic():
+            products, targets = {product.pk: product}, {product.pk: quantity}
+            if product.pk != instance.product_id:
+                # The old product's units go back.
+                products[instance.product_id], targets[instance.product_id] = instance.product, 0
+            serializer.save(product=product)
+            self.hold_stock(products, targets)
+            adjust_cart_summary(
+                instance.cart_id, quantity - old_quantity, product.price * quantity - old_price * old_quantity
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            self.hold_stock({instance.product_id: instance.product}, {instance.product_id: 0})
+            adjust_cart_summary(instance.cart_id, -instance.quantity, -instance.product.price * instance.quantity)
+
+    def hold_stock(self, products, targets):
+        """
+        Reserves the cart's new quantities (`targets`) of the products (see products/inventory.py),
+        after the item is written. With reservations off, only checks those quantities against the
+        products' stock, as cart batches do.
+        """
+        if inventory.reservations_enabled():
+            short = inventory.reserve(self.get_cart_id(), products, targets)
+        else:
+            short = {pk: product.stock for pk, product in products.items() if product.stock < targets[pk]}
+        if short:
+            raise serializers.ValidationError({"detail": "Not enough stock for this product."})
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def batch(self, request):
+        """
+        Applies a list of cart operations atomically in a constant number of queries.
+        - Body: `{"operations": [{"op": "add" | "set" | "remove", "product_id": 1, "quantity": 2}, ...]}`.
+        - `add` increments (creating the item if needed), `set` replaces the quantity
+          (0 removes the item), `remove` deletes the item.
+        - Either every operation is applied or none is; the response has one result per operation.
+        """
+        operations = request.data.get('operations')
+        if not operations or not isinstance(operations, list):
+            return Response({"error": "No cart operations provided."}, status=status.HTTP_400_BAD_REQUEST)
+
+        results, plan = CartBatch.parse(operations)
+        if plan is None:
+            return Response({"error": "Some cart operations are invalid.", "results": results},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            batch = CartBatch(self.get_cart_id(), plan)
+            if not batch.validate(results):
+                transaction.set_rollback(True)
+                return Response({"error": "Some cart operations are invalid.", "results": results},
+                                status=status.HTTP_400_BAD_REQUEST)
+            batch.apply()
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
 
+class CartBatch:
+    """
+    Plans and applies a batch of cart operations with set-based queries:
+    one product fetch, one cart-item fetch, the reservation queries, then at most one `bulk_create`,
+    one `bulk_update`, one `DELETE` and one cart summary `UPDATE`.
+    """
+    operations = ('add', 'set', 'remove')
+
+    def __init__(self, cart_id, plan):
+        self.cart_id = cart_id
+        self.plan = plan
+        self.products = {}
+        self.items = {}
+
+    @classmethod
+    def parse(cls, operations):
+        """
+        Validates the raw operations and folds them into one plan entry per product:
+        `{'absolute': bool, 'quantity': int, 'indexes': [...]}`. Returns `(results, plan)`,
+        with `plan` set to None when any operation is malformed.
+        """
+        results = []
+        plan = {}
+        valid = True
+        for index, operation in enumerate(operations):
+            result = {'index': index, 'status': 'ok'}
+            results.append(result)
+            try:
+                op = operation['op']
+                product_id = int(operation['product_id'])
+                quantity = int(operation.get('quantity', 1 if op == 'add' else 0))
+                if op not in cls.operations or quantity < 0 or (op == 'add' and quantity == 0):
+                    raise ValueError
+            except (KeyError, TypeError, ValueError):
+                result.update(status='invalid', detail="Each operation needs an 'op' (add, set or remove), "
+                                                       "an integer 'product_id' and a valid 'quantity'.")
+                valid = False
+                continue
+
+            result.update(op=op, product_id=product_id)
+            entry = plan.setdefault(product_id, {'absolute': False, 'quantity': 0, 'indexes': []})
+            entry['indexes'].append(index)
+            if op == 'add':
+                entry['quantity'] += quantity
+            else:
+                entry['absolute'] = True
+                entry['quantity'] = quantity if op == 'set' else 0
+
+        return results, plan if valid else None
+
+    def validate(self, results):
+        """
+        Loads the products and existing items in two queries and checks every target quantity
+        against stock, reserving it when reservations are on (see products/inventory.py).
+        Marks failing operations in `results`; returns False if any failed.
+        """
+        self.products = Product.objects.filter(id__in=self.plan.keys()).in_bulk()
+        self.items = {
+            item.product_id: item
+            for item in CartItem.objects.select_for_update().filter(cart_id=self.cart_id, product_id__in=self.plan.keys())
+        }
+
+        errors = {}
+        for product_id, entry in self.plan.items():
+            item = self.items.get(product_id)
+            current = item.quantity if item else 0
+            entry['target'] = entry['quantity'] if entry['absolute'] else current + entry['quantity']
+            if product_id not in self.products:
+                errors[product_id] = ('not_found', f"Product with ID {product_id} not found.")
 
-class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+        # Found products are checked even when others are missing, so the report covers every line.
+        targets = {product_id: entry['target'] for product_id, entry in self.plan.items() if product_id in self.products}
+        if targets:
+            if inventory.reservations_enabled():
+                short = inventory.reserve(self.cart_id, self.products, targets)
+            else:
+                short = {product_id: self.products[product_id].stock for product_id, target in targets.items()
+                         if target > self.products[product_id].stock}
+            for product_id, available in short.items():
+                errors[product_id] = ('insufficient_stock', f"Not enough stock for product {self.products[product_id].name}. "
+                                                            f"Available: {available}, Requested: {targets[product_id]}")
+
+        for product_id, entry in self.plan.items():
+            error = errors.get(product_id)
+            for index in entry['indexes']:
+                if error:
+                    results[index].update(status=error[0], detail=error[1])
+                else:
+                    results[index]['quantity'] = entry['target']
+        return not errors
+
+    def apply(self):
+        to_create, to_update, to_delete = [], [], []
+        quantity_delta, subtotal_delta = 0, Decimal('0.00')
+        for product_id, entry in self.plan.items():
+            item = self.items.get(product_id)
+            change = entry['target'] - (item.quantity if item else 0)
+            quantity_delta += change
+            subtotal_delta += self.products[product_id].price * change
+            if entry['target'] == 0:
+                if item is not None:
+                    to_delete.append(item.pk)
+            elif item is None:
+                to_create.append(CartItem(cart_id=self.cart_id, product_id=product_id, quantity=entry['target']))
+            else:
+                # Relative adds stay relative in SQL so a concurrent writer's change is not lost.
+                item.quantity = entry['quantity'] if entry['absolute'] else F('quantity') + entry['quantity']
+                to_update.append(item)
+
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity'])
+        if to_delete:
+            CartItem.objects.filter(pk__in=to_delete).delete()
+        adjust_cart_summary(self.cart_id, quantity_delta, subtotal_delta)
+
+
+class OrderViewSet(ConditionalGetMixin, StreamingListMixin, FastListMixin, SparseFieldsetMixin, EagerLoadingViewSetMixin,
+                   viewsets.ReadOnlyModelViewSet):
     """
     A ViewSet for a user's orders.
     - This is a ReadOnlyModelViewSet as orders are created via the checkout process,
       not directly through this endpoint.
     - Allows authenticated users to view their own orders.
+    - Supports sparse fieldsets (`?fields=`, `?expand=items.product`) and streaming (`?stream=true`).
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    last_modified_fields = ('updated_at', 'items__product__updated_at')
+    pagination_class = KeysetOrPageNumberPagination
+    ordering = ['-ordered_at']
 
     def get_queryset(self):
         """
@@ -147,8 +749,18 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
         """
         return Order.objects.filter(user=self.request.user)
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Paginated order history with totals and item counts only, without nested items.
+        """
+        queryset = self.get_queryset().only('id', 'total_price', 'item_count', 'status', 'ordered_at')
+        page = self.paginate_queryset(queryset)
+        serializer = OrderSummarySerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
-class OrderItemViewSet(viewsets.ReadOnlyModelViewSet):
+class OrderItemViewSet(EagerLoadingViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     A ViewSet for viewing items within a specific order.
     - ReadOnlyModelViewSet to prevent direct creation/modification.
@@ -168,63 +780,251 @@ class OrderItemViewSet(viewsets.ReadOnlyModelViewSet):
 
 # ----------------- Custom API Views -----------------
 
+class CheckoutValidationError(Exception):
+    """
+    Raised inside the checkout transaction when one or more lines cannot be fulfilled.
+    Carries the per-line report so the view can return it after the rollback.
+    """
+
+    def __init__(self, lines):
+        super().__init__("Some order items could not be checked out.")
+        self.lines = lines
+
+
 class CheckoutView(APIView):
+    """
+    Turns a list of `{product, quantity}` lines into an Order in a constant number of queries.
+    - Prices always come from `Product.price`; any client-sent price is ignored.
+    - Totals are computed with `Decimal`, so they match the stored prices exactly.
+    - With inventory reservations (`INVENTORY_RESERVATIONS`, see products/inventory.py) the units the buyer's
+      cart holds are checked out without touching the product rows; only a shortfall is taken
+      from the stock counters.
+    - Without them, all products are locked with one `SELECT ... FOR UPDATE`, in id order so
+      concurrent checkouts always acquire row locks in the same order and cannot deadlock, and
+      stock is decremented with a single conditional `UPDATE` built from `F()` expressions.
+    - Order items are written with a single `bulk_create`.
+    - Rejected checkouts return a per-line report under `lines`.
+    - Once committed, the order is queued for post-processing (stock reconciliation, the move to
+      `processing`, the confirmation email) on the order pipeline (see products/pipeline.py).
+    - With an `Idempotency-Key` header, a retried checkout returns the first one's order instead of
+      placing another (see products/idempotency.py).
+    """
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         order_items_data = request.data.get('order_items')
 
-        if not order_items_data:
+        if not order_items_data or not isinstance(order_items_data, list):
             return Response({"error": "No order items provided."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Calculate total price correctly from the received data
-        try:
-            # Convert price to float before summing to ensure correct calculation
-            total_price = sum(item['quantity'] * float(item['price']) for item in order_items_data)
-        except (TypeError, ValueError):
-            return Response({"error": "Invalid price or quantity format in order items."}, status=status.HTTP_400_BAD_REQUEST)
-
         try:
+            lines = self.collect_lines(order_items_data)
             with transaction.atomic():
-                # Create the Order instance. 'total_price' is now a field on the Order model.
+                if inventory.reservations_enabled():
+                    products = self.consume_reservations(get_cart_id(request.user), lines)
+                else:
+                    products = self.lock_products(lines)
+                    self.decrement_stock(lines)
+
                 order = Order.objects.create(
                     user=request.user,
-                    total_price=total_price, # Pass the calculated total_price to the model's field
+                    item_count=sum(lines.values()),
+                    total_price=sum(
+                        (products[product_id].price * quantity for product_id, quantity in lines.items()),
+                        Decimal('0.00'),
+                    ),
                 )
 
-                for item_data in order_items_data:
-                    try:
-                        product = Product.objects.get(id=item_data['product'])
-                    except Product.DoesNotExist:
-                        # Rollback transaction if any product is not found
-                        raise ValueError(f"Product with ID {item_data['product']} not found.")
-
-                    # Create OrderItem
-                    OrderItem.objects.create(
+                OrderItem.objects.bulk_create([
+                    OrderItem(
                         order=order,
-                        product=product,
-                        quantity=item_data['quantity'],
-                        price=item_data['price'], # Use the price sent by frontend (or product.price if validated)
-                        product_name=product.name # Store name for historical record
+                        product=products[product_id],
+                        quantity=quantity,
+                        price=products[product_id].price,
+                        product_name=products[product_id].name # Store name for historical record
                     )
+                    for product_id, quantity in lines.items()
+                ])
 
-                    # Update product stock (ensure stock is sufficient)
-                    if product.stock < item_data['quantity']:
-                        raise ValueError(f"Not enough stock for product {product.name}. Available: {product.stock}, Requested: {item_data['quantity']}")
-                    product.stock -= item_data['quantity']
-                    product.save()
+                # Stock is updated in bulk, which bypasses the model signals. Both hooks run after the
+                # order exists, so their failures are only logged: a submit that fails leaves the
+                # order pending, for `manage.py process_orders --requeue-pending --pending-for`.
+                transaction.on_commit(catalog_cache.invalidate_catalog, robust=True)
+                # (A lambda, not a partial: Django names robust hooks by `__qualname__` when logging their errors.)
+                order_ids = [order.pk]
+                transaction.on_commit(lambda: order_pipeline.submit_orders(order_ids), robust=True)
 
+            order = OrderSerializer.setup_eager_loading(Order.objects.filter(pk=order.pk)).get()
             serializer = OrderSerializer(order)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+        except CheckoutValidationError as e:
+            return Response({"error": str(e), "lines": e.lines}, status=status.HTTP_400_BAD_REQUEST)
         except ValueError as e:
-            # Catch custom validation errors (e.g., product not found, insufficient stock)
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             # Catch any other unexpected errors
-            print(f"Checkout unexpected error: {e}") # Log the full error for debugging
+            logger.exception("Checkout unexpected error")
             return Response({"error": "An internal server error occurred during checkout.", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @staticmethod
+    def collect_lines(order_items_data):
+        """
+        Validates the raw order lines and merges repeated products into a single
+        `{product_id: quantity}` line, since an order can hold each product only once.
+        """
+        lines = {}
+        report = []
+        for index, item_data in enumerate(order_items_data):
+            try:
+                product_id = int(item_data['product'])
+                quantity = int(item_data['quantity'])
+                if quantity <= 0:
+                    raise ValueError
+            except (KeyError, TypeError, ValueError):
+                report.append({
+                    "index": index,
+                    "status": "invalid",
+                    "detail": "Each order item needs an integer 'product' and a positive integer 'quantity'.",
+                })
+                continue
+            lines[product_id] = lines.get(product_id, 0) + quantity
+
+        if report:
+            raise CheckoutValidationError(report)
+        return lines
+
+    @staticmethod
+    def lock_products(lines):
+        """
+        Locks every product in the order with one query, in a stable id order,
+        and checks that each one exists and has enough stock.
+        """
+        products = Product.objects.select_for_update().filter(id__in=lines.keys()).order_by('id').in_bulk()
+        CheckoutView.check_lines(lines, products, {product_id: product.stock for product_id, product in products.items()})
+        return products
+
+    @staticmethod
+    def consume_reservations(cart_id, lines):
+        """
+        Loads the products without locking them and checks the lines out of the cart's
+        reservations, taking any shortfall from the stock counters.
+        """
+        products = Product.objects.filter(id__in=lines.keys()).in_bulk()
+        if products.keys() != lines.keys():
+            CheckoutView.check_lines(lines, products, inventory.available_stock(products))
+        short = inventory.consume(cart_id, products, lines)
+        if short:
+            raise CheckoutValidationError(CheckoutView.line_report(lines, products, {**lines, **short}))
+        return products
+
+    @staticmethod
+    def check_lines(lines, products, available):
+        report = CheckoutView.line_report(lines, products, available)
+        if any(line["status"] != "ok" for line in report):
+            raise CheckoutValidationError(report)
+
+    @staticmethod
+    def line_report(lines, products, available):
+        """
+        One entry per line: `not_found`, `insufficient_stock` (with the units `available`) or `ok`.
+        """
+        report = []
+        for product_id, quantity in lines.items():
+            product = products.get(product_id)
+            if product is None:
+                report.append({
+                    "product": product_id,
+                    "quantity": quantity,
+                    "status": "not_found",
+                    "detail": f"Product with ID {product_id} not found.",
+                })
+            elif available[product_id] < quantity:
+                report.append({
+                    "product": product_id,
+                    "quantity": quantity,
+                    "status": "insufficient_stock",
+                    "available": available[product_id],
+                    "detail": f"Not enough stock for product {product.name}. Available: {available[product_id]}, Requested: {quantity}",
+                })
+            else:
+                report.append({
+                    "product": product_id,
+                    "quantity": quantity,
+                    "status": "ok",
+                    "unit_price": str(product.price),
+                    "line_total": str(product.price * quantity),
+                })
+        return report
+
+    @staticmethod
+    def decrement_stock(lines):
+        """
+        Decrements stock for every product in one conditional UPDATE.
+        The `stock >= quantity` guard makes overselling impossible even without the row locks.
+        """
+        in_stock = Q()
+        new_stock = []
+        for product_id, quantity in lines.items():
+            in_stock |= Q(id=product_id, stock__gte=quantity)
+            new_stock.append(When(id=product_id, then=F('stock') - quantity))
+
+        updated = Product.objects.filter(in_stock).update(
+            stock=Case(*new_stock, default=F('stock')),
+            updated_at=timezone.now(),
+        )
+        if updated != len(lines):
+            raise ValueError("Stock changed during checkout. Please try again.")
+
+
+class CatalogCacheStatsView(TokenClaimsAuthenticationMixin, APIView):
+    """
+    Reports catalog cache hit/miss counters and the current generation.
+    - Admin users only; `DELETE` resets the counters.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(catalog_cache.get_stats())
+
+    def delete(self, request):
+        catalog_cache.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class DatabaseStatsView(TokenClaimsAuthenticationMixin, APIView):
+    """
+    Reports connection management per database alias for this worker process: persistent-connection
+    settings, connections set up, and pool utilization when a psycopg pool is configured.
+    - Admin users only; `DELETE` resets the counters.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(dbstats.get_stats())
+
+    def delete(self, request):
+        dbstats.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class OrderPipelineStatsView(TokenClaimsAuthenticationMixin, APIView):
+    """
+    Reports the order pipeline's queue depth per stage and, for this worker process, per-stage job
+    counts, retries and latencies (queue wait, batch run time, checkout to last stage).
+    - Admin users only; `DELETE` resets the counters.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(order_pipeline.get_pipeline().get_stats())
+
+    def delete(self, request):
+        order_pipeline.get_pipeline().metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class ProtectedView(APIView):
     """
     A simple view to test if a user is authenticated with a JWT token.